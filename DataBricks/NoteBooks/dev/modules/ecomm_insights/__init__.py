@@ -0,0 +1,6 @@
+"""Shared Python helpers for the ecomm-app-insights Databricks notebooks.
+
+The notebooks under ``modules/`` add the parent directory to ``sys.path`` and
+import from this package, so the same code runs in Databricks Repos and in a
+local-mode Spark session.
+"""
@@ -0,0 +1,251 @@
+"""Timed benchmark of the report notebooks against a local Spark + Delta lake.
+
+Seeds the bronze tables at a chosen scale factor, builds silver and gold the
+way the pipeline notebooks do, then runs every named report of
+``setup/3_create_reports`` and ``setup/4_create_reports`` and records wall
+time, files and bytes scanned, shuffle and spill bytes. Results are compared
+with a stored baseline so layout or schema changes that slow a report down
+show up as regressions.
+
+Runs offline on a single machine::
+
+    python -m ecomm_insights.benchmark --scale-factor SF0.01 \\
+        --lake-root /tmp/ecomm-lake --baseline report_baseline.json
+
+Pass ``--update-baseline`` to record the current numbers as the baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from .config import LAKE_ROOT_ENV, layer_path
+from .dimensions import DimensionCache
+from .plan_metrics import dataframe_metrics
+from .report_catalog import REPORT_NOTEBOOKS, load_reports
+
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are timer noise on a laptop
+MIN_REGRESSION_S = 0.1
+DATASET_MARKER = "_benchmark_dataset.json"
+GOLD_TABLES = (
+    "daily_sales",
+    "daily_category_sales",
+    "daily_funnel",
+    "daily_abandoned_products",
+    "sessions",
+    "time_on_site",
+    "pages_per_session",
+    "order_lines",
+    "customer_state",
+)
+
+
+def _register(spark, database, table, path):
+    spark.sql(f"CREATE DATABASE IF NOT EXISTS {database}")
+    spark.sql(f"CREATE TABLE IF NOT EXISTS {database}.{table} USING delta LOCATION '{path}'")
+
+
+def prepare_dataset(spark, scale_factor, seed, lake_dir, as_of):
+    """Seed bronze, build silver and gold under ``lake_dir`` and register the tables.
+
+    The data is only regenerated when the scale factor, seed or date differ
+    from the dataset already in ``lake_dir``.
+    """
+    from .customer_state import refresh_customer_state
+    from .funnel import refresh_funnel
+    from .order_lines import refresh_order_lines
+    from .sales_aggregates import refresh_daily_sales
+    from .sessionize import refresh_sessions
+    from .schemas import with_generated_columns
+    from .seed_generator import TABLES, generate_table, table_row_counts
+    from .session import ship_package
+    from .silver import build_silver
+
+    marker_path = os.path.join(lake_dir, DATASET_MARKER)
+    dataset = {"scale_factor": str(scale_factor), "seed": seed, "as_of": as_of.isoformat()}
+    current = None
+    if os.path.exists(marker_path):
+        with open(marker_path) as handle:
+            current = json.load(handle)
+
+    if current != dataset:
+        ship_package(spark)
+        row_counts = table_row_counts(scale_factor)
+        for table, spec in TABLES.items():
+            (
+                # The tables are created by this write, not by the DDL that declares the generated columns
+                with_generated_columns(generate_table(spark, table, row_counts, seed, as_of=as_of), table)
+                .write.format("delta")
+                .mode("overwrite")
+                .option("overwriteSchema", "true")
+                .partitionBy(*spec.partition_by)
+                .save(layer_path("bronze", table))
+            )
+        build_silver(spark, list(TABLES))
+        refresh_daily_sales(spark, full=True)
+        refresh_funnel(spark, full=True)
+        refresh_order_lines(spark, full=True)
+        refresh_customer_state(spark, full=True)
+        refresh_sessions(spark)
+        with open(marker_path, "w") as handle:
+            json.dump(dataset, handle)
+
+    for table in TABLES:
+        _register(spark, "bronze", table, layer_path("bronze", table))
+        _register(spark, "silver", table, layer_path("silver", table))
+    for table in GOLD_TABLES:
+        _register(spark, "gold", table, layer_path("gold", table))
+
+
+def run_report(spark, report, repeat=3, dimensions=None):
+    """Run one report ``repeat`` times and return its timings and plan metrics.
+
+    Every run starts with an empty Spark cache; with a ``DimensionCache``
+    the dimensions of the report's schema are reloaded into it before the
+    clock starts, so only they are cached.
+    """
+    result = {"name": report.name, "notebook": report.notebook}
+    try:
+        if report.schema:
+            spark.catalog.setCurrentDatabase(report.schema)
+        timings = []
+        for _ in range(repeat):
+            spark.catalog.clearCache()
+            if dimensions is not None:
+                dimensions.invalidate()
+                dimensions.register(report.schema or "silver")
+            df = spark.sql(report.sql)
+            started = time.perf_counter()
+            rows = df.collect()
+            timings.append(time.perf_counter() - started)
+        metrics = dataframe_metrics(df)
+    except Exception as exc:
+        message = str(exc).strip().splitlines()
+        return {**result, "status": "error", "error": message[0] if message else type(exc).__name__}
+    metrics.pop("scans")
+    return {
+        **result,
+        "status": "ok",
+        "rows": len(rows),
+        "wall_s": min(timings),
+        "median_s": statistics.median(timings),
+        **metrics,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return the reports that got slower or scan more than the baseline allows."""
+    previous = {entry["name"]: entry for entry in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None or before.get("status") != "ok":
+            continue
+        if result["status"] != "ok":
+            regressions.append({"name": result["name"], "reason": f"now failing: {result['error']}"})
+            continue
+        slower = result["wall_s"] - before["wall_s"]
+        if slower > MIN_REGRESSION_S and result["wall_s"] > before["wall_s"] * (1 + tolerance):
+            regressions.append(
+                {"name": result["name"], "reason": f"wall time {before['wall_s']:.3f}s -> {result['wall_s']:.3f}s"}
+            )
+        for metric in ("files_read", "bytes_read", "shuffle_bytes"):
+            if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > 0:
+                regressions.append(
+                    {"name": result["name"], "reason": f"{metric} {before[metric]} -> {result[metric]}"}
+                )
+    return regressions
+
+
+def run_benchmark(
+    spark, scale_factor, seed=42, lake_dir=None, as_of=None, repeat=3, notebooks=REPORT_NOTEBOOKS, cache_dimensions=False
+):
+    """Prepare the dataset and run every report; returns the benchmark document.
+
+    With ``cache_dimensions`` the reports join to the broadcast dimension cache
+    of their schema, as they do in the report notebooks.
+    """
+    as_of = as_of or datetime.date(2024, 1, 1)
+    if lake_dir:
+        os.makedirs(lake_dir, exist_ok=True)
+        os.environ[LAKE_ROOT_ENV] = f"file://{os.path.abspath(lake_dir)}"
+    prepare_dataset(spark, scale_factor, seed, lake_dir or ".", as_of)
+    dimensions = DimensionCache(spark) if cache_dimensions else None
+    results = []
+    for report in load_reports(notebooks):
+        results.append(run_report(spark, report, repeat, dimensions))
+    if dimensions is not None:
+        dimensions.release()
+    return {
+        "scale_factor": str(scale_factor),
+        "seed": seed,
+        "cache_dimensions": cache_dimensions,
+        "spark_version": spark.version,
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "results": results,
+    }
+
+
+def _print_results(results):
+    print(f"{'report':<50} {'status':<6} {'wall_s':>8} {'files':>6} {'bytes':>12} {'shuffle':>12}")
+    for result in results:
+        if result["status"] != "ok":
+            print(f"{result['name'][:50]:<50} {'error':<6} {result['error'][:60]}")
+            continue
+        print(
+            f"{result['name'][:50]:<50} {'ok':<6} {result['wall_s']:>8.3f} {result['files_read']:>6} "
+            f"{result['bytes_read']:>12} {result['shuffle_bytes']:>12}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale-factor", default="SF0.01")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--lake-root", default="ecomm-benchmark-lake", help="local directory for the Delta tables")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", help="baseline JSON to compare with (and to write with --update-baseline)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--cache-dimensions", action="store_true", help="join reports to the broadcast dimension cache")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--output", help="write the results JSON here")
+    args = parser.parse_args(argv)
+
+    from .session import get_spark
+
+    spark = get_spark("ecomm-report-benchmark")
+    document = run_benchmark(
+        spark, args.scale_factor, args.seed, args.lake_root, repeat=args.repeat, cache_dimensions=args.cache_dimensions
+    )
+    _print_results(document["results"])
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(document, handle, indent=2)
+
+    if not args.baseline:
+        return 0
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as handle:
+            json.dump(document, handle, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    if baseline.get("scale_factor") != document["scale_factor"]:
+        print(f"Baseline was recorded at {baseline.get('scale_factor')}, not {document['scale_factor']}")
+        return 2
+    if bool(baseline.get("cache_dimensions")) != document["cache_dimensions"]:
+        print(f"Baseline was recorded with cache_dimensions={bool(baseline.get('cache_dimensions'))}")
+        return 2
+    regressions = compare(document["results"], baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['reason']}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""Storage locations shared by the notebooks and helper modules."""
+import os
+
+CATALOG = "ecomm-app-insights-dev-westus-databricks-catalog"
+STORAGE_ACCOUNT = "ecommappinsightsdevadls"
+
+# Point the lake at a local directory (e.g. file:///tmp/lake) for local-mode runs
+LAKE_ROOT_ENV = "ECOMM_LAKE_ROOT"
+
+
+def layer_path(layer, *parts):
+    """Return the storage path of a medallion layer, or of a path inside it."""
+    root = os.environ.get(LAKE_ROOT_ENV)
+    if root:
+        base = f"{root.rstrip('/')}/{layer}"
+    else:
+        base = f"abfss://{layer}@{STORAGE_ACCOUNT}.dfs.core.windows.net"
+    return "/".join([base, *parts])
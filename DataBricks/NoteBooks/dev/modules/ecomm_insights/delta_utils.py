@@ -0,0 +1,41 @@
+"""Small helpers around Delta table metadata and MERGE conditions."""
+
+
+def table_identifier(path):
+    """Return the SQL identifier of the Delta table stored at ``path``."""
+    return f"delta.`{path}`"
+
+
+def describe_detail(spark, path):
+    """Return ``DESCRIBE DETAIL`` of a Delta table as a dict."""
+    return spark.sql(f"DESCRIBE DETAIL {table_identifier(path)}").collect()[0].asDict()
+
+
+def current_version(spark, path):
+    """Return the latest committed version of a Delta table."""
+    return spark.sql(f"DESCRIBE HISTORY {table_identifier(path)} LIMIT 1").collect()[0]["version"]
+
+
+def table_exists(spark, path):
+    """Return whether a Delta table has been committed at ``path``."""
+    try:
+        describe_detail(spark, path)
+    except Exception:
+        return False
+    return True
+
+
+def last_commit_metrics(spark, path):
+    """Return the operation name and metrics of the latest commit of a Delta table."""
+    commit = spark.sql(f"DESCRIBE HISTORY {table_identifier(path)} LIMIT 1").collect()[0]
+    metrics = {key: int(value) for key, value in (commit["operationMetrics"] or {}).items() if value.isdigit()}
+    return {"version": commit["version"], "operation": commit["operation"], **metrics}
+
+
+def in_condition(column, values):
+    """Return ``column IN (values)``; a NULL among the values is matched with ``IS NULL``, which IN never does."""
+    literals = ", ".join(f"'{value}'" for value in values if value is not None)
+    conditions = [f"{column} IN ({literals})"] if literals else []
+    if any(value is None for value in values):
+        conditions.append(f"{column} IS NULL")
+    return conditions[0] if len(conditions) == 1 else f"({' OR '.join(conditions)})"
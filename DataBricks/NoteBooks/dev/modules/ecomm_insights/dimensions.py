@@ -0,0 +1,125 @@
+"""Session-wide cache of the small dimension tables the reports join to.
+
+``DimensionCache.register`` reads ``product_categories``, ``stores`` and
+``products`` of a layer once, keeps them in executor memory and publishes
+each as a temporary view of the same name with a broadcast hint. Temporary
+views take precedence over schema tables, so the unchanged report SQL
+(``JOIN products p ON ...``) joins to the cached copy and Spark broadcasts it
+instead of rescanning and shuffling the dimension for every report.
+
+Each cached copy is pinned to the Delta version it was read at. Every
+lookup (``get``, ``register``, ``refresh``) compares that with the table's
+current version and reloads only the dimensions that have changed since.
+``refresh_views(spark)`` does so for every view a cache of the session has
+published; the report runners (``report_windows``, ``benchmark``) call it
+before each report, so a view never outlives the table version it was read
+at there. Notebook ``%sql`` cells run after a write still need a
+``dimensions.refresh()`` first.
+"""
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import current_version, describe_detail, table_exists
+
+DIMENSIONS = ("product_categories", "stores", "products")
+# Dimensions larger than this are cached but left to the planner to join
+MAX_BROADCAST_MB = 64
+
+# applicationId -> caches that have published views in that session
+_active = {}
+
+
+class DimensionCache:
+    def __init__(self, spark, tables=DIMENSIONS, max_broadcast_mb=MAX_BROADCAST_MB):
+        self.spark = spark
+        self.tables = tuple(tables)
+        self.max_broadcast_bytes = max_broadcast_mb * 1024 * 1024
+        # (layer, table) -> (version, cached DataFrame, hinted DataFrame)
+        self._entries = {}
+        # table -> layer of the published temporary view
+        self._views = {}
+        self.hits = 0
+        self.loads = 0
+
+    def _load(self, layer, table, path, version):
+        cached = self.spark.read.format("delta").option("versionAsOf", version).load(path).cache()
+        cached.count()
+        df = cached
+        if describe_detail(self.spark, path)["sizeInBytes"] <= self.max_broadcast_bytes:
+            df = F.broadcast(cached)
+        self._entries[(layer, table)] = (version, cached, df)
+        self.loads += 1
+        return df
+
+    def get(self, table, layer="silver"):
+        """Return the cached dimension, reloading it if its Delta table has moved on."""
+        path = layer_path(layer, table)
+        version = current_version(self.spark, path)
+        entry = self._entries.get((layer, table))
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[2]
+        self.invalidate(table, layer)
+        return self._load(layer, table, path, version)
+
+    def register(self, layer="silver"):
+        """Publish the dimensions of ``layer`` as broadcast temporary views.
+
+        Returns ``{table: version}`` of the registered views; tables that do
+        not exist in ``layer`` are skipped.
+        """
+        versions = {}
+        for table in self.tables:
+            if not table_exists(self.spark, layer_path(layer, table)):
+                continue
+            self.get(table, layer).createOrReplaceTempView(table)
+            self._views[table] = layer
+            versions[table] = self._entries[(layer, table)][0]
+        caches = _active.setdefault(self.spark.sparkContext.applicationId, [])
+        if versions and self not in caches:
+            caches.append(self)
+        return versions
+
+    def refresh(self):
+        """Re-publish the views whose Delta table has a new version; return ``{table: version}`` of those."""
+        reloaded = {}
+        for table, layer in list(self._views.items()):
+            version = current_version(self.spark, layer_path(layer, table))
+            entry = self._entries.get((layer, table))
+            if entry is not None and entry[0] == version:
+                continue
+            self.get(table, layer).createOrReplaceTempView(table)
+            reloaded[table] = version
+        return reloaded
+
+    def invalidate(self, table=None, layer=None):
+        """Drop cached dimensions, all of them by default."""
+        for key in list(self._entries):
+            if (table is None or key[1] == table) and (layer is None or key[0] == layer):
+                _, cached, _ = self._entries.pop(key)
+                cached.unpersist()
+
+    def release(self):
+        """Drop every cached dimension and its temporary view."""
+        for table in list(self._views):
+            self.spark.catalog.dropTempView(table)
+        self._views.clear()
+        self.invalidate()
+        caches = _active.get(self.spark.sparkContext.applicationId, [])
+        if self in caches:
+            caches.remove(self)
+
+    def stats(self):
+        return {
+            "cached": {f"{layer}.{table}": version for (layer, table), (version, *_) in self._entries.items()},
+            "hits": self.hits,
+            "loads": self.loads,
+        }
+
+
+def refresh_views(spark):
+    """Re-publish the stale dimension views of every cache registered in ``spark``'s session."""
+    reloaded = {}
+    for cache in _active.get(spark.sparkContext.applicationId, []):
+        reloaded.update(cache.refresh())
+    return reloaded
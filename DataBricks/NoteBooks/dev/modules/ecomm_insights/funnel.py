@@ -0,0 +1,164 @@
+"""Cart-to-order funnel metrics per day.
+
+The definitions are those of the original reports: a cart counts as
+converted when its user placed an order and as abandoned otherwise (the
+Shopping Cart Abandonment Rate), and its product counts as not purchased
+when the user never ordered that product (the Products Added to Cart But Not
+Purchased report).
+
+``gold.daily_funnel`` holds carts, cart users, converted and abandoned carts
+and the abandonment rate per cart date; ``gold.daily_abandoned_products``
+holds the carts and quantity of products not purchased per cart date and
+product. Both come from one pass over ``shopping_cart``: the orders are
+collapsed to one row per buyer and the purchases (``orders`` joined to
+``order_items``) to one row per user and product, so every cart row is
+flagged by two equi-joins on unique keys. No ``NOT IN`` subquery is
+involved, so nothing falls back to a nested-loop join.
+
+Like the sales aggregates, a refresh reads the change feeds of the sources
+since the previous refresh and rewrites only the cart dates they affect: the
+dates of changed carts, and the cart dates of every user whose orders
+changed.
+"""
+import time
+
+from pyspark.errors import AnalysisException
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import table_exists
+from .incremental import changes_between, enable_change_feed, last_refresh, record_refresh, source_versions
+from .writer import write_delta
+
+TARGET = "daily_funnel"
+ABANDONED_TARGET = "daily_abandoned_products"
+SOURCES = ("shopping_cart", "orders", "order_items")
+
+
+def _read(spark, path, version):
+    return spark.read.format("delta").option("versionAsOf", version).load(path)
+
+
+def buyers(spark, paths, versions):
+    """Return the ``user_id`` of every user with an order."""
+    return _read(spark, paths["orders"], versions["orders"]).select("user_id").distinct()
+
+
+def purchases(spark, paths, versions):
+    """Return ``(user_id, product_id)`` of every product a user ordered."""
+    orders = _read(spark, paths["orders"], versions["orders"]).select("order_id", "user_id")
+    items = _read(spark, paths["order_items"], versions["order_items"]).select("order_id", "product_id")
+    return items.join(orders, "order_id").select("user_id", "product_id").distinct()
+
+
+def flag_carts(carts, ordered, bought):
+    """Add the ``converted`` (the user ordered) and ``purchased`` (the user ordered the product) flags."""
+    return (
+        carts.join(ordered.withColumn("converted", F.lit(True)), "user_id", "left")
+        .join(bought.withColumn("purchased", F.lit(True)), ["user_id", "product_id"], "left")
+        .fillna(False, ["converted", "purchased"])
+    )
+
+
+def funnel_metrics(flagged):
+    """Return the daily funnel and the daily abandoned products of flagged, unique cart rows."""
+    daily = (
+        flagged.groupBy(F.col("added_at").alias("day"))
+        .agg(
+            F.count(F.lit(1)).alias("carts"),
+            F.countDistinct("user_id").alias("cart_users"),
+            F.sum(F.col("converted").cast("long")).alias("converted_carts"),
+            F.sum((~F.col("converted")).cast("long")).alias("abandoned_carts"),
+        )
+        .withColumn("abandonment_rate", F.col("abandoned_carts") / F.col("carts"))
+    )
+    products = (
+        flagged.where(~F.col("purchased"))
+        .groupBy(F.col("added_at").alias("day"), "product_id")
+        .agg(
+            F.count(F.lit(1)).alias("abandoned_carts"),
+            F.sum("quantity").alias("abandoned_quantity"),
+            F.countDistinct("user_id").alias("users"),
+        )
+    )
+    return daily, products
+
+
+def affected_days(spark, paths, previous, versions, carts):
+    """Return the cart dates whose funnel changes between two refreshes."""
+    days = set()
+    cart_changes = changes_between(spark, paths["shopping_cart"], previous["shopping_cart"], versions["shopping_cart"])
+    if cart_changes is not None:
+        days.update(row[0] for row in cart_changes.select("added_at").distinct().collect())
+
+    users = []
+    order_changes = changes_between(spark, paths["orders"], previous["orders"], versions["orders"])
+    if order_changes is not None:
+        users.append(order_changes.select("user_id"))
+    item_changes = changes_between(spark, paths["order_items"], previous["order_items"], versions["order_items"])
+    if item_changes is not None:
+        orders = _read(spark, paths["orders"], versions["orders"]).select("order_id", "user_id")
+        users.append(item_changes.select("order_id").join(orders, "order_id").select("user_id"))
+    for changed in users:
+        # Every cart of a user whose orders changed can flip, whenever it was added
+        cart_days = carts.join(changed.distinct(), "user_id", "left_semi").select("added_at").distinct()
+        days.update(row[0] for row in cart_days.collect())
+    return sorted(day for day in days if day is not None)
+
+
+def _unique(carts):
+    # Repeated seed runs append the same carts again
+    return carts.dropDuplicates(["cart_id"])
+
+
+def _replace_days(df, path, days):
+    literals = ", ".join(f"DATE'{day.isoformat()}'" for day in days)
+    write_delta(df, path, "overwrite", ("day",), replace_where=f"day IN ({literals})")
+
+
+def refresh_funnel(spark, full=False, bronze_paths=None, gold_root=None):
+    """Build or incrementally refresh the gold funnel tables.
+
+    Returns the refresh mode, the number of rewritten cart dates and the duration.
+    """
+    started = time.perf_counter()
+    paths = bronze_paths or {name: layer_path("bronze", name) for name in SOURCES}
+    gold_root = (gold_root or layer_path("gold")).rstrip("/")
+    targets = {TARGET: f"{gold_root}/{TARGET}", ABANDONED_TARGET: f"{gold_root}/{ABANDONED_TARGET}"}
+    for path in paths.values():
+        enable_change_feed(spark, path)
+    versions = source_versions(spark, paths)
+    previous = last_refresh(spark, TARGET)
+    full = full or set(previous) != set(SOURCES) or not all(table_exists(spark, path) for path in targets.values())
+
+    carts = _read(spark, paths["shopping_cart"], versions["shopping_cart"]).select(
+        "cart_id", "user_id", "product_id", "quantity", "added_at"
+    )
+    days = None
+    if not full:
+        try:
+            days = affected_days(spark, paths, previous, versions, carts)
+        except AnalysisException:
+            # The change feed does not reach back to the last refresh
+            full = True
+
+    ordered = buyers(spark, paths, versions)
+    bought = purchases(spark, paths, versions)
+    if full:
+        daily, products = funnel_metrics(flag_carts(_unique(carts), ordered, bought))
+        for name, df in ((TARGET, daily), (ABANDONED_TARGET, products)):
+            write_delta(df, targets[name], "overwrite", ("day",), overwrite_schema=True)
+    elif days:
+        # Filter before the dedup so the date predicate still prunes the partitions of the scan
+        carts = _unique(carts.where(F.col("added_at").isin(days)))
+        daily, products = funnel_metrics(flag_carts(carts, ordered, bought))
+        _replace_days(daily, targets[TARGET], days)
+        _replace_days(products, targets[ABANDONED_TARGET], days)
+
+    record_refresh(spark, TARGET, versions)
+    return {
+        "mode": "full" if full else "incremental",
+        "days": None if full else len(days),
+        "versions": versions,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,70 @@
+"""Change tracking for incrementally refreshed tables.
+
+Derived tables remember, per source table, the Delta version they were last
+refreshed from (in the ``_refresh_state`` table of their layer). A refresh
+reads the source's change data feed from the next version on, works out
+which keys or partitions the changes touch and rebuilds only those.
+"""
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import current_version, describe_detail, table_exists
+
+STATE_TABLE = "_refresh_state"
+CHANGE_FEED_PROPERTY = "delta.enableChangeDataFeed"
+
+
+def enable_change_feed(spark, path):
+    """Turn on the change data feed of a Delta table if it is not already on."""
+    properties = describe_detail(spark, path)["properties"] or {}
+    if properties.get(CHANGE_FEED_PROPERTY, "false").lower() != "true":
+        spark.sql(f"ALTER TABLE delta.`{path}` SET TBLPROPERTIES ({CHANGE_FEED_PROPERTY} = true)")
+
+
+def source_versions(spark, paths):
+    """Return the current version of every source, keyed like ``paths``."""
+    return {name: current_version(spark, path) for name, path in paths.items()}
+
+
+def last_refresh(spark, target, layer="gold"):
+    """Return ``{source: version}`` the target was last refreshed from, or ``{}``."""
+    state_path = layer_path(layer, STATE_TABLE)
+    if not table_exists(spark, state_path):
+        return {}
+    rows = (
+        spark.read.format("delta")
+        .load(state_path)
+        .where(F.col("target") == target)
+        .groupBy("source")
+        .agg(F.max("version").alias("version"))
+        .collect()
+    )
+    return {row["source"]: row["version"] for row in rows}
+
+
+def record_refresh(spark, target, versions, layer="gold"):
+    """Remember the source versions a refresh of ``target`` has consumed."""
+    rows = [(target, source, version) for source, version in versions.items()]
+    (
+        spark.createDataFrame(rows, "target STRING, source STRING, version LONG")
+        .withColumn("refreshed_at", F.current_timestamp())
+        .write.format("delta")
+        .mode("append")
+        .save(layer_path(layer, STATE_TABLE))
+    )
+
+
+def changes_between(spark, path, after_version, to_version):
+    """Return the change feed rows committed after ``after_version`` up to ``to_version``.
+
+    Returns ``None`` when nothing was committed in between.
+    """
+    if to_version <= after_version:
+        return None
+    return (
+        spark.read.format("delta")
+        .option("readChangeFeed", "true")
+        .option("startingVersion", after_version + 1)
+        .option("endingVersion", to_version)
+        .load(path)
+    )
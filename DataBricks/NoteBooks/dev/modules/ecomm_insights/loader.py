@@ -0,0 +1,112 @@
+"""Seed and CSV loads of the bronze tables as orchestrator tasks.
+
+Generated tables do not read each other (foreign keys are derived from the
+seed and row counts, not from the parent rows), so every ``seed:<table>``
+task is independent. A ``csv:<table>`` task writes to the same Delta table
+as its seed task and waits for it, which avoids conflicting concurrent
+commits to one table; CSV loads of different tables still run side by side.
+
+Both kinds of task tokenize the PII columns (``pii``) of the rows they write.
+
+Seed appends are idempotent Delta writes (``txnAppId``/``txnVersion``): the
+version is fixed when the tasks are built, so a retried ``seed:<table>`` task
+whose append had already committed does not append the table a second time,
+while the next load run appends again as before.
+"""
+import time
+
+from .config import layer_path
+from .ingest import SOURCES, ingest_csv
+from .orchestrator import Task
+from .pii import DEFAULT_METHOD, PII_COLUMNS, Tokenizer
+from .seed_generator import DEFAULT_CHUNK_ROWS, DEFAULT_SEED, TABLES, generate_table
+from .writer import WRITE_LOG_TABLE, write_delta
+
+
+def _txn_version():
+    # Milliseconds, like {{job.start_time.timestamp_ms}} of the load job: increases from one load run to
+    # the next, as Delta skips versions at or below the last one committed for the application id
+    return time.time_ns() // 1_000_000
+
+
+def seed_table(
+    spark,
+    table,
+    row_counts,
+    seed=DEFAULT_SEED,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    as_of=None,
+    pii_method=DEFAULT_METHOD,
+    txn_version=None,
+    **options,
+):
+    """Generate a bronze table on the executors and append it to its Delta table, PII columns tokenized.
+
+    Calls with the same ``txn_version`` append the table at most once
+    (default: a new version per call). For tables with PII columns the
+    result includes the tokenization throughput per column (``pandas``
+    method).
+    """
+    if txn_version is None:
+        txn_version = _txn_version()
+    df = generate_table(spark, table, row_counts, seed, chunk_rows, as_of, **options)
+    tokenizer = None
+    if table in PII_COLUMNS:
+        tokenizer = Tokenizer(spark, method=pii_method)
+        df = tokenizer.tokenize(df, table)
+    written = write_delta(
+        df,
+        layer_path("bronze", table),
+        # Generated partition columns (view_date, visit_date) are computed by Delta and the table's layout applies
+        partition_by=[column for column in TABLES[table].partition_by if column in df.columns],
+        rows=row_counts[table],
+        options={"txnAppId": f"seed_table:{table}", "txnVersion": txn_version},
+        log_path=layer_path("bronze", WRITE_LOG_TABLE),
+    )
+    result = {"table": table, **written}
+    if tokenizer is not None:
+        result["pii"] = tokenizer.throughput(table)
+    return result
+
+
+def load_tasks(
+    spark,
+    row_counts,
+    seed=DEFAULT_SEED,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    as_of=None,
+    load_mode="merge",
+    seed_tables=None,
+    csv_tables=None,
+    pii_method=DEFAULT_METHOD,
+    **options,
+):
+    """Return the seed and CSV load tasks of the bronze tables.
+
+    ``seed_tables`` and ``csv_tables`` default to every generated table and
+    every CSV source; pass an empty list to leave one kind out.
+    """
+    seed_tables = list(TABLES) if seed_tables is None else list(seed_tables)
+    csv_tables = list(SOURCES) if csv_tables is None else list(csv_tables)
+    # Shared by every attempt of a seed task
+    txn_version = _txn_version()
+    tasks = [
+        Task(
+            f"seed:{table}",
+            lambda table=table: seed_table(
+                spark, table, row_counts, seed, chunk_rows, as_of, pii_method, txn_version, **options
+            ),
+            pool=table,
+        )
+        for table in seed_tables
+    ]
+    tasks += [
+        Task(
+            f"csv:{table}",
+            lambda table=table: ingest_csv(spark, table, load_mode, pii_method=pii_method),
+            depends_on=(f"seed:{table}",) if table in seed_tables else (),
+            pool=table,
+        )
+        for table in csv_tables
+    ]
+    return tasks
@@ -0,0 +1,234 @@
+"""Clustering and statistics maintenance for the bronze and silver tables.
+
+The clustering columns of each table are picked from the report notebooks:
+every column a report joins on or filters by counts once for its table, and
+the most used non-partition columns win. For each table the job then
+
+- makes sure Delta keeps file statistics on those columns: statistics cover
+  the first ``delta.dataSkippingNumIndexedCols`` columns of the schema, and
+  the setting is raised when a clustering column lies beyond them (an
+  explicit ``delta.dataSkippingStatsColumns`` list, which would drop the
+  statistics of every other filtered column, is removed),
+- compacts and Z-orders the table on them,
+- collects column statistics for the optimizer,
+- probes one equality lookup per clustering column before and after and
+  records how many files Delta could skip.
+
+Recomputing the statistics of existing files after such a change
+(``ANALYZE TABLE ... COMPUTE DELTA STATISTICS``) needs Databricks Runtime;
+elsewhere the step is reported as skipped, and only the files the Z-order
+rewrites get the new statistics.
+
+Every run appends its before/after numbers to the ``_maintenance_log`` table
+of the layer.
+"""
+import os
+import re
+import time
+from collections import Counter
+
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import describe_detail, table_exists, table_identifier
+from .plan_metrics import dataframe_metrics
+from .report_catalog import load_reports, table_references
+
+LOG_TABLE = "_maintenance_log"
+MAX_CLUSTER_COLUMNS = 3
+STATS_COLUMNS_PROPERTY = "delta.dataSkippingStatsColumns"
+INDEXED_COLUMNS_PROPERTY = "delta.dataSkippingNumIndexedCols"
+DEFAULT_INDEXED_COLUMNS = 32
+
+_KEYWORDS = {"on", "where", "and", "or", "not", "is", "null", "in", "between", "like"}
+_CLAUSE = re.compile(
+    r"\b(ON|WHERE)\b(.*?)(?=\b(?:LEFT|RIGHT|INNER|FULL|CROSS|JOIN|WHERE|GROUP|ORDER|HAVING|LIMIT|UNION)\b|\)|;|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_QUALIFIED = re.compile(r"\b(\w+)\.(\w+)\b")
+_COMPARED = re.compile(r"\b(\w+)\s*(?:=|<>|!=|<=|>=|<|>|\s+IN\b|\s+BETWEEN\b|\s+LIKE\b)", re.IGNORECASE)
+
+
+def report_columns(sql):
+    """Return ``[(table, column)]`` of the join keys and filter columns of one query."""
+    aliases = {}
+    tables = []
+    for reference, alias in table_references(sql):
+        table = reference.rsplit(".", 1)[-1]
+        tables.append(table)
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+
+    used = []
+    for _, clause in _CLAUSE.findall(sql):
+        qualified = _QUALIFIED.findall(clause)
+        for alias, column in qualified:
+            if alias in aliases:
+                used.append((aliases[alias], column))
+        # Unqualified columns can only be attributed when one table is read
+        if len(set(tables)) == 1:
+            bare = _QUALIFIED.sub(" ", clause)
+            used.extend((tables[0], column) for column in _COMPARED.findall(bare) if column.lower() not in _KEYWORDS)
+    return used
+
+
+def clustering_columns(reports=None, max_columns=MAX_CLUSTER_COLUMNS):
+    """Return ``{table: [column, ...]}`` ranked by how many reports join or filter on them."""
+    counts = Counter()
+    for report in reports if reports is not None else load_reports():
+        counts.update(set(report_columns(report.sql)))
+    ranked = {}
+    for (table, column), _ in counts.most_common():
+        columns = ranked.setdefault(table, [])
+        if column not in columns and len(columns) < max_columns:
+            columns.append(column)
+    return ranked
+
+
+def _probe_value(df, column):
+    row = df.select(column).where(F.col(column).isNotNull()).limit(1).collect()
+    return row[0][0] if row else None
+
+
+def skip_ratios(spark, path, columns):
+    """Return the share of files Delta skips for an equality lookup on each column."""
+    df = spark.read.format("delta").load(path)
+    total = describe_detail(spark, path)["numFiles"]
+    ratios = {}
+    for column in columns:
+        value = _probe_value(df, column)
+        if value is None or not total:
+            continue
+        probe = df.where(F.col(column) == value).agg(F.count(F.lit(1)))
+        probe.collect()
+        ratios[column] = round(1 - dataframe_metrics(probe)["files_read"] / total, 4)
+    return ratios
+
+
+def _try(spark, statement):
+    """Run a maintenance statement; return None or the first line of its error."""
+    try:
+        spark.sql(statement)
+    except Exception as exc:
+        message = str(exc).strip().splitlines()
+        return message[0] if message else type(exc).__name__
+    return None
+
+
+def _properties(spark, identifier):
+    return {row["key"]: row["value"] for row in spark.sql(f"SHOW TBLPROPERTIES {identifier}").collect()}
+
+
+def _stats_properties(spark, identifier, schema, columns):
+    """Return the statements that give ``columns`` file statistics without dropping those of other columns."""
+    properties = _properties(spark, identifier)
+    statements = []
+    if STATS_COLUMNS_PROPERTY in properties:
+        statements.append(f"ALTER TABLE {identifier} UNSET TBLPROPERTIES IF EXISTS ('{STATS_COLUMNS_PROPERTY}')")
+    indexed = int(properties.get(INDEXED_COLUMNS_PROPERTY, DEFAULT_INDEXED_COLUMNS))
+    needed = max(schema.index(column) for column in columns) + 1
+    # -1 indexes every column already
+    if 0 <= indexed < needed:
+        statements.append(f"ALTER TABLE {identifier} SET TBLPROPERTIES ('{INDEXED_COLUMNS_PROPERTY}' = '{needed}')")
+    return statements
+
+
+def maintain_table(spark, path, columns, dry_run=False):
+    """Cluster one Delta table on ``columns`` and return its before/after statistics."""
+    started = time.perf_counter()
+    detail = describe_detail(spark, path)
+    schema = spark.read.format("delta").load(path).columns
+    present = set(schema)
+    partition_by = set(detail["partitionColumns"])
+    # Z-ordering on a partition column is not allowed and would not help
+    columns = [column for column in columns if column in present and column not in partition_by]
+    result = {
+        "path": path,
+        "columns": columns,
+        "files_before": detail["numFiles"],
+        "bytes_before": detail["sizeInBytes"],
+        "skip_before": skip_ratios(spark, path, columns),
+    }
+    if dry_run:
+        return result
+
+    identifier = table_identifier(path)
+    errors = {}
+    skipped = {}
+    if columns:
+        for statement in _stats_properties(spark, identifier, schema, columns):
+            errors["stats"] = errors.get("stats") or _try(spark, statement)
+        if "stats" in errors and not errors["stats"]:
+            if "DATABRICKS_RUNTIME_VERSION" in os.environ:
+                errors["stats"] = _try(spark, f"ANALYZE TABLE {identifier} COMPUTE DELTA STATISTICS")
+            else:
+                skipped["stats"] = "COMPUTE DELTA STATISTICS needs Databricks Runtime"
+        errors["optimize"] = _try(spark, f"OPTIMIZE {identifier} ZORDER BY ({', '.join(columns)})")
+        errors["analyze"] = _try(spark, f"ANALYZE TABLE {identifier} COMPUTE STATISTICS FOR COLUMNS {', '.join(columns)}")
+    else:
+        errors["optimize"] = _try(spark, f"OPTIMIZE {identifier}")
+
+    detail = describe_detail(spark, path)
+    return {
+        **result,
+        "files_after": detail["numFiles"],
+        "bytes_after": detail["sizeInBytes"],
+        "skip_after": skip_ratios(spark, path, columns),
+        "errors": {step: error for step, error in errors.items() if error},
+        "skipped": skipped,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _log(spark, layer, table, result):
+    row = {
+        "layer": layer,
+        "table": table,
+        "columns": ",".join(result["columns"]),
+        "files_before": result["files_before"],
+        "files_after": result.get("files_after"),
+        "bytes_before": result["bytes_before"],
+        "bytes_after": result.get("bytes_after"),
+        "skip_before": {key: float(value) for key, value in result["skip_before"].items()},
+        "skip_after": {key: float(value) for key, value in result.get("skip_after", {}).items()},
+        "errors": "; ".join(f"{step}: {error}" for step, error in result.get("errors", {}).items()) or None,
+        "skipped": "; ".join(f"{step}: {reason}" for step, reason in result.get("skipped", {}).items()) or None,
+        "seconds": result.get("seconds"),
+    }
+    schema = (
+        "layer STRING, table STRING, columns STRING, files_before LONG, files_after LONG, bytes_before LONG, "
+        "bytes_after LONG, skip_before MAP<STRING, DOUBLE>, skip_after MAP<STRING, DOUBLE>, errors STRING, "
+        "skipped STRING, seconds DOUBLE"
+    )
+    (
+        spark.createDataFrame([row], schema)
+        .withColumn("maintained_at", F.current_timestamp())
+        .write.format("delta")
+        .mode("append")
+        # Logs written before the skipped column was added get it on the next run
+        .option("mergeSchema", "true")
+        .save(layer_path(layer, LOG_TABLE))
+    )
+
+
+def run_maintenance(spark, layers=("bronze", "silver"), tables=None, reports=None, dry_run=False):
+    """Maintain every table the reports join or filter on, in each layer.
+
+    ``tables`` restricts the run; tables that do not exist in a layer are
+    skipped. Returns one result per maintained table.
+    """
+    plan = clustering_columns(reports)
+    results = []
+    for layer in layers:
+        for table, columns in sorted(plan.items()):
+            if tables and table not in tables:
+                continue
+            path = layer_path(layer, table)
+            if not table_exists(spark, path):
+                continue
+            result = maintain_table(spark, path, columns, dry_run)
+            if not dry_run:
+                _log(spark, layer, table, result)
+            results.append({"layer": layer, "table": table, **result})
+    return results
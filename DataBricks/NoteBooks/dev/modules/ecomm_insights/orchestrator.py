@@ -0,0 +1,179 @@
+"""Run table loads as a dependency graph on one SparkSession.
+
+Each load is a ``Task`` with the names of the tasks it waits for. Tasks
+whose dependencies have finished are submitted to a thread pool, so loads of
+unrelated tables run concurrently and share the cluster through Spark's
+scheduler instead of queueing behind each other's Delta commits. A failing
+task is retried up to ``retries`` times; tasks that depend on a task that
+still failed are skipped.
+
+Every task's Spark jobs run in a scheduler pool named after the task
+(``spark.scheduler.pool``), so with the FAIR scheduler a large table does not
+starve the small ones.
+"""
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RETRIES = 1
+DEFAULT_RETRY_DELAY_S = 5.0
+
+
+@dataclass
+class Task:
+    name: str
+    run: Callable
+    depends_on: tuple = ()
+    # Overrides the retries of ``run_tasks`` when set
+    retries: int = None
+    pool: str = None
+
+
+@dataclass
+class TaskResult:
+    name: str
+    status: str
+    attempts: int = 0
+    seconds: float = 0.0
+    result: object = None
+    error: str = None
+    started_at: float = None
+    finished_at: float = None
+    depends_on: tuple = field(default_factory=tuple)
+
+
+def topological_order(tasks):
+    """Return the task names in dependency order; raise ValueError on unknown or cyclic dependencies."""
+    by_name = {task.name: task for task in tasks}
+    if len(by_name) != len(tasks):
+        raise ValueError("Task names must be unique")
+    for task in tasks:
+        unknown = set(task.depends_on) - set(by_name)
+        if unknown:
+            raise ValueError(f"Task {task.name!r} depends on unknown tasks {sorted(unknown)}")
+
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Dependency cycle: {' -> '.join([*path, name])}")
+        state[name] = "visiting"
+        for dependency in by_name[name].depends_on:
+            visit(dependency, [*path, name])
+        state[name] = "done"
+        order.append(name)
+
+    for task in tasks:
+        visit(task.name, [])
+    return order
+
+
+def _attempt(spark, task, retries, retry_delay_s):
+    result = TaskResult(task.name, "failed", depends_on=tuple(task.depends_on), started_at=time.time())
+    if spark is not None:
+        # Local properties are per thread, so this only affects the jobs of this task
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", task.pool or task.name)
+        spark.sparkContext.setJobDescription(task.name)
+    started = time.perf_counter()
+    try:
+        for attempt in range(1, retries + 2):
+            result.attempts = attempt
+            try:
+                result.result = task.run()
+                result.status = "succeeded"
+                result.error = None
+                break
+            except Exception:
+                result.error = traceback.format_exc(limit=3)
+                if attempt <= retries:
+                    time.sleep(retry_delay_s * attempt)
+    finally:
+        if spark is not None:
+            spark.sparkContext.setLocalProperty("spark.scheduler.pool", None)
+            spark.sparkContext.setJobDescription(None)
+    result.seconds = time.perf_counter() - started
+    result.finished_at = time.time()
+    return result
+
+
+def run_tasks(
+    tasks,
+    spark=None,
+    max_workers=DEFAULT_MAX_WORKERS,
+    retries=DEFAULT_RETRIES,
+    retry_delay_s=DEFAULT_RETRY_DELAY_S,
+    log=print,
+):
+    """Run ``tasks`` as soon as their dependencies succeed; return a ``TaskResult`` per task.
+
+    Results are in dependency order. Pass ``log=None`` to silence the
+    per-task progress lines.
+    """
+    order = topological_order(tasks)
+    by_name = {task.name: task for task in tasks}
+    results = {}
+    running = {}
+
+    def ready(name):
+        return all(
+            results.get(dependency) is not None and results[dependency].status == "succeeded"
+            for dependency in by_name[name].depends_on
+        )
+
+    def blocked(name):
+        return any(
+            results.get(dependency) is not None and results[dependency].status != "succeeded"
+            for dependency in by_name[name].depends_on
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load") as pool:
+        while len(results) < len(order):
+            for name in order:
+                if name in results or name in running.values():
+                    continue
+                if blocked(name):
+                    depends_on = tuple(by_name[name].depends_on)
+                    failed = [
+                        dependency
+                        for dependency in depends_on
+                        if results.get(dependency) is not None and results[dependency].status != "succeeded"
+                    ]
+                    results[name] = TaskResult(
+                        name, "skipped", error=f"upstream failed: {', '.join(failed)}", depends_on=depends_on
+                    )
+                    if log:
+                        log(f"{name}: skipped, {results[name].error}")
+                elif ready(name):
+                    task = by_name[name]
+                    task_retries = retries if task.retries is None else task.retries
+                    running[pool.submit(_attempt, spark, task, task_retries, retry_delay_s)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[running.pop(future)] = result
+                if log:
+                    log(f"{result.name}: {result.status} in {result.seconds:.1f}s ({result.attempts} attempt(s))")
+    return [results[name] for name in order]
+
+
+def summary(results):
+    """Return the wall-clock time of a run next to the sum and the longest of its task times."""
+    started = [result.started_at for result in results if result.started_at is not None]
+    finished = [result.finished_at for result in results if result.finished_at is not None]
+    return {
+        "tasks": len(results),
+        "succeeded": sum(result.status == "succeeded" for result in results),
+        "failed": [result.name for result in results if result.status == "failed"],
+        "skipped": [result.name for result in results if result.status == "skipped"],
+        "wall_seconds": max(finished) - min(started) if started else 0.0,
+        "task_seconds": sum(result.seconds for result in results),
+        "slowest_seconds": max((result.seconds for result in results), default=0.0),
+    }
@@ -0,0 +1,237 @@
+"""Gold-layer order-line fact table, pre-joined and kept current with MERGE.
+
+``gold.order_lines`` has one row per order item with the attributes the
+sales reports used to join in every time: the order's date, status and user,
+the user's name and store location, the product with its category, and the
+coupon of the product. It is partitioned by ``order_date``, so the reports
+become single-table scans without join shuffles.
+
+The store and coupon columns follow the joins of the reports they replace
+(``users.user_id = stores.store_id`` and ``products.product_id =
+coupons.coupon_id``), so the reports return the same numbers as before, with
+the rows repeated seed runs append to bronze counted once.
+
+A refresh reads the change feeds of the seven sources since the last refresh
+and maps every change to the order items it affects:
+
+- changed order items directly,
+- changed orders, users and stores through the order items of their orders,
+- changed products, categories and coupons through the order items of their
+  products.
+
+The affected lines are rebuilt from the sources and MERGEd on
+``order_item_id``; lines whose item or order is gone are deleted. The MERGE
+condition lists the old and new order dates of the affected lines, so Delta
+only scans those partitions. The category reassignments of
+``setup/4_create_reports`` are product changes and are picked up the same way.
+"""
+import time
+
+from pyspark.errors import AnalysisException
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import table_exists
+from .incremental import changes_between, enable_change_feed, last_refresh, record_refresh, source_versions
+from .writer import write_delta
+
+TARGET = "order_lines"
+SOURCES = ("orders", "order_items", "products", "product_categories", "users", "stores", "coupons")
+COLUMNS = (
+    "order_item_id",
+    "order_id",
+    "order_date",
+    "order_status",
+    "user_id",
+    "username",
+    "store_location",
+    "product_id",
+    "product_name",
+    "category_id",
+    "category_name",
+    "category_groupname",
+    "coupon_code",
+    "coupon_discount",
+    "quantity",
+    "price",
+    "sales",
+)
+
+
+def _read(spark, path, version):
+    return spark.read.format("delta").option("versionAsOf", version).load(path)
+
+
+def _union(frames):
+    union = frames[0]
+    for other in frames[1:]:
+        union = union.unionByName(other)
+    return union.distinct()
+
+
+def order_lines(spark, paths, versions, items=None):
+    """Return the order lines at ``versions``, optionally for the ``order_item_id`` of ``items`` only."""
+    # Repeated seed runs append the same rows again; one row per key keeps the lines and the MERGE source unique
+    lines = (
+        _read(spark, paths["order_items"], versions["order_items"])
+        .select("order_item_id", "order_id", "product_id", "quantity", "price")
+        .dropDuplicates(["order_item_id"])
+    )
+    if items is not None:
+        lines = lines.join(items, "order_item_id", "left_semi")
+    orders = (
+        _read(spark, paths["orders"], versions["orders"])
+        .select("order_id", "order_date", F.col("status").alias("order_status"), "user_id")
+        .dropDuplicates(["order_id"])
+    )
+    users = _read(spark, paths["users"], versions["users"]).select("user_id", "username").dropDuplicates(["user_id"])
+    stores = (
+        _read(spark, paths["stores"], versions["stores"])
+        .select(F.col("store_id").alias("user_id"), "store_location")
+        .dropDuplicates(["user_id"])
+    )
+    products = (
+        _read(spark, paths["products"], versions["products"])
+        .select("product_id", "product_name", "category_id")
+        .dropDuplicates(["product_id"])
+    )
+    categories = (
+        _read(spark, paths["product_categories"], versions["product_categories"])
+        .select("category_id", "category_name", "category_groupname")
+        .dropDuplicates(["category_id"])
+    )
+    coupons = (
+        _read(spark, paths["coupons"], versions["coupons"])
+        .select(F.col("coupon_id").alias("product_id"), "coupon_code", F.col("discount").alias("coupon_discount"))
+        .dropDuplicates(["product_id"])
+    )
+    # Stores, products, categories and coupons are small; broadcasting them keeps the fact rows where they are.
+    # Users grow with the scale factor (10M at SF100), so AQE picks their join strategy
+    return (
+        lines.join(orders, "order_id")
+        .join(users, "user_id", "left")
+        .join(F.broadcast(stores), "user_id", "left")
+        .join(F.broadcast(products), "product_id", "left")
+        .join(F.broadcast(categories), "category_id", "left")
+        .join(F.broadcast(coupons), "product_id", "left")
+        .withColumn("sales", F.col("price") * F.col("quantity"))
+        .select(*COLUMNS)
+    )
+
+
+def affected_items(spark, paths, previous, versions):
+    """Return the ``order_item_id`` touched by source changes between two refreshes, or None."""
+    changes = {name: changes_between(spark, paths[name], previous[name], versions[name]) for name in SOURCES}
+    items = _read(spark, paths["order_items"], versions["order_items"]).select(
+        "order_item_id", "order_id", "product_id"
+    )
+    keys = []
+
+    if changes["order_items"] is not None:
+        # Pre-images included: an item can be deleted or moved to another order
+        keys.append(changes["order_items"].select("order_item_id"))
+
+    order_ids = []
+    if changes["orders"] is not None:
+        order_ids.append(changes["orders"].select("order_id"))
+    user_ids = []
+    if changes["users"] is not None:
+        user_ids.append(changes["users"].select("user_id"))
+    if changes["stores"] is not None:
+        user_ids.append(changes["stores"].select(F.col("store_id").alias("user_id")))
+    if user_ids:
+        orders = _read(spark, paths["orders"], versions["orders"]).select("order_id", "user_id")
+        order_ids.append(orders.join(_union(user_ids), "user_id", "left_semi").select("order_id"))
+    if order_ids:
+        keys.append(items.join(_union(order_ids), "order_id", "left_semi").select("order_item_id"))
+
+    product_ids = []
+    if changes["products"] is not None:
+        product_ids.append(changes["products"].select("product_id"))
+    if changes["product_categories"] is not None:
+        products = _read(spark, paths["products"], versions["products"]).select("product_id", "category_id")
+        product_ids.append(
+            products.join(changes["product_categories"].select("category_id"), "category_id", "left_semi").select(
+                "product_id"
+            )
+        )
+    if changes["coupons"] is not None:
+        product_ids.append(changes["coupons"].select(F.col("coupon_id").alias("product_id")))
+    if product_ids:
+        keys.append(items.join(_union(product_ids), "product_id", "left_semi").select("order_item_id"))
+
+    if not keys:
+        return None
+    return _union(keys).where(F.col("order_item_id").isNotNull())
+
+
+def merge_lines(spark, path, lines, keys):
+    """MERGE rebuilt ``lines`` into the table at ``path``; delete the ``keys`` without a line.
+
+    Returns the number of affected order items and order dates.
+    """
+    keys = keys.cache()
+    current = spark.read.format("delta").load(path).join(keys, "order_item_id", "left_semi")
+    dates = _union([current.select("order_date"), lines.select("order_date")])
+    dates = sorted(row[0] for row in dates.collect() if row[0] is not None)
+    source = keys.join(lines, "order_item_id", "left").withColumn("_deleted", F.col("order_id").isNull())
+    source.createOrReplaceTempView("_order_lines_changes")
+
+    condition = "t.order_item_id = s.order_item_id"
+    if dates:
+        # order_date is the partition column: only the old and new dates of the affected lines are scanned
+        literals = ", ".join(f"DATE'{date.isoformat()}'" for date in dates)
+        condition += f" AND t.order_date IN ({literals})"
+    assignments = ", ".join(f"{column} = s.{column}" for column in COLUMNS)
+    values = ", ".join(f"s.{column}" for column in COLUMNS)
+    spark.sql(
+        f"""
+        MERGE INTO delta.`{path}` AS t
+        USING _order_lines_changes AS s
+        ON {condition}
+        WHEN MATCHED AND s._deleted THEN DELETE
+        WHEN MATCHED THEN UPDATE SET {assignments}
+        WHEN NOT MATCHED AND NOT s._deleted THEN INSERT ({", ".join(COLUMNS)}) VALUES ({values})
+        """
+    )
+    affected = keys.count()
+    keys.unpersist()
+    return affected, len(dates)
+
+
+def refresh_order_lines(spark, full=False, bronze_paths=None, target_path=None):
+    """Build or incrementally refresh ``gold.order_lines``.
+
+    Returns the refresh mode, the number of merged order items and order
+    dates, and the duration.
+    """
+    started = time.perf_counter()
+    paths = bronze_paths or {name: layer_path("bronze", name) for name in SOURCES}
+    target_path = target_path or layer_path("gold", TARGET)
+    for path in paths.values():
+        enable_change_feed(spark, path)
+    versions = source_versions(spark, paths)
+    previous = last_refresh(spark, TARGET)
+    full = full or set(previous) != set(SOURCES) or not table_exists(spark, target_path)
+
+    items = dates = None
+    if not full:
+        try:
+            keys = affected_items(spark, paths, previous, versions)
+            if keys is not None:
+                items, dates = merge_lines(spark, target_path, order_lines(spark, paths, versions, keys), keys)
+        except AnalysisException:
+            # The change feed does not reach back to the last refresh
+            full = True
+
+    if full:
+        write_delta(order_lines(spark, paths, versions), target_path, "overwrite", ("order_date",), overwrite_schema=True)
+
+    record_refresh(spark, TARGET, versions)
+    return {
+        "mode": "full" if full else "incremental",
+        "items": None if full else items or 0,
+        "dates": None if full else dates or 0,
+        "versions": versions,
+        "seconds": time.perf_counter() - started,
+    }
@@ -0,0 +1,94 @@
+"""Read scan and shuffle metrics from an executed Spark plan.
+
+Walks the JVM physical plan of a query after it has run, descending into
+adaptive query stages and subqueries, and sums the SQL metrics of file scans
+and shuffle exchanges. Works in local mode and on classic Databricks
+clusters; it needs the py4j gateway, so not on Spark Connect.
+"""
+from py4j.protocol import Py4JError
+
+
+def _seq(seq):
+    return [seq.apply(i) for i in range(seq.size())]
+
+
+def _children(node):
+    name = node.getClass().getSimpleName()
+    if name == "AdaptiveSparkPlanExec":
+        return [node.executedPlan()]
+    if name.endswith("QueryStageExec"):
+        return [node.plan()]
+    return _seq(node.children()) + _seq(node.subqueries())
+
+
+def _metric(node, key):
+    value = node.metrics().get(key)
+    return value.get().value() if value.isDefined() else 0
+
+
+def _partition_filters(node):
+    """Return the partition columns and partition filters (as SQL) of a file scan."""
+    try:
+        columns = list(node.relation().partitionSchema().fieldNames())
+        filters = [expression.sql() for expression in _seq(node.partitionFilters())]
+    except Py4JError:
+        # Scans of other sources do not expose their relation
+        return [], []
+    return columns, filters
+
+
+def walk(plan):
+    """Yield every node of a physical plan once."""
+    seen = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        node_id = node.id()
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        yield node
+        stack.extend(_children(node))
+
+
+def plan_metrics(plan):
+    """Return scan, shuffle and spill totals of an executed physical plan."""
+    result = {
+        "files_read": 0,
+        "bytes_read": 0,
+        "partitions_read": 0,
+        "rows_read": 0,
+        "shuffle_bytes": 0,
+        "shuffle_records": 0,
+        "spill_bytes": 0,
+        "scans": [],
+    }
+    for node in walk(plan):
+        name = node.getClass().getSimpleName()
+        if "Scan" in name and node.metrics().contains("numFiles"):
+            partition_columns, partition_filters = _partition_filters(node)
+            scan = {
+                "node": node.nodeName(),
+                "files": _metric(node, "numFiles"),
+                "bytes": _metric(node, "filesSize"),
+                "partitions": _metric(node, "numPartitions"),
+                "rows": _metric(node, "numOutputRows"),
+                "partition_columns": partition_columns,
+                "partition_filters": partition_filters,
+            }
+            result["scans"].append(scan)
+            result["files_read"] += scan["files"]
+            result["bytes_read"] += scan["bytes"]
+            result["partitions_read"] += scan["partitions"]
+            result["rows_read"] += scan["rows"]
+        elif name == "ShuffleExchangeExec":
+            result["shuffle_bytes"] += _metric(node, "shuffleBytesWritten")
+            result["shuffle_records"] += _metric(node, "shuffleRecordsWritten")
+        if node.metrics().contains("spillSize"):
+            result["spill_bytes"] += _metric(node, "spillSize")
+    return result
+
+
+def dataframe_metrics(df):
+    """Return ``plan_metrics`` of a DataFrame that has already been executed."""
+    return plan_metrics(df._jdf.queryExecution().executedPlan())
@@ -0,0 +1,304 @@
+"""Per-query execution metrics from a query listener, stored in a Delta table.
+
+``enable_query_metrics(spark)`` registers a ``QueryExecutionListener`` with
+the session (through the py4j callback server), so every query the notebook
+runs, ``%sql`` cells included, is recorded when it finishes: its duration,
+and the file, byte, partition and shuffle totals of ``plan_metrics`` read
+from the executed plan while it is still at hand.
+
+Queries are tagged with the Spark job description, which ``tag()`` sets
+around a block of code and the orchestrator sets to the task name. The
+listener only sees the query, not the execution it ran as, so the tag is
+resolved on ``flush()``: the SQL status store links each execution to the
+metric accumulators of its plan, its jobs and its stages. The tag is the
+``spark.job.description`` property the jobs were submitted with; the
+description of the execution itself falls back to the call site
+(``collect at ...``), so queries run without a description (or without a
+job) keep a NULL tag and are summarized by their function. The stages
+are then read from the Spark UI REST API for their spill and for task skew
+(longest over median task run time). Without a reachable UI those columns
+stay empty.
+
+``flush()`` appends the records to ``gold/_query_metrics``;
+``create_summary_view`` ranks the tags per day by time and by bytes read and
+shuffled. Works in local mode and on classic Databricks clusters; like
+``plan_metrics`` it needs the py4j gateway, so not on Spark Connect.
+"""
+import datetime
+import json
+import threading
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from py4j.protocol import Py4JError
+from pyspark.java_gateway import ensure_callback_server_started
+
+from .config import layer_path
+from .plan_metrics import _seq, plan_metrics, walk
+
+METRICS_TABLE = "_query_metrics"
+SUMMARY_VIEW = "gold.query_metrics_summary"
+JOB_DESCRIPTION = "spark.job.description"
+# A stage is skewed when its longest task runs this many times its median task, for at least MIN_SKEW_TASK_MS
+SKEW_RATIO = 5.0
+MIN_SKEW_TASK_MS = 1000
+
+# Queries of the flush itself are dropped instead of recorded
+_FLUSH_TAG = "query_metrics.flush"
+_REST_TIMEOUT_S = 10
+_SCHEMA = (
+    "captured_at TIMESTAMP, app_id STRING, execution_id LONG, tag STRING, function STRING, status STRING, "
+    "error STRING, duration_ms DOUBLE, files_read LONG, bytes_read LONG, partitions_read LONG, rows_read LONG, "
+    "scans INT, pruned_scans INT, shuffle_bytes LONG, shuffle_records LONG, spill_bytes LONG, stages INT, "
+    "memory_spill_bytes LONG, disk_spill_bytes LONG, max_task_ms LONG, median_task_ms LONG, skew_ratio DOUBLE, "
+    "skewed_stages INT"
+)
+_STAGE_COLUMNS = (
+    "stages",
+    "memory_spill_bytes",
+    "disk_spill_bytes",
+    "max_task_ms",
+    "median_task_ms",
+    "skew_ratio",
+    "skewed_stages",
+)
+
+_enabled = {}
+
+
+class QueryMetricsListener:
+    """py4j implementation of ``QueryExecutionListener`` that keeps one record per query."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = []
+
+    def _capture(self, function, qe, duration_ns, error):
+        record = {
+            "captured_at": datetime.datetime.now(),
+            "function": function,
+            "status": "failed" if error else "succeeded",
+            "error": error,
+            "duration_ms": None if duration_ns is None else duration_ns / 1e6,
+            "_accumulator": None,
+            "scans": 0,
+            "pruned_scans": 0,
+        }
+        try:
+            plan = qe.executedPlan()
+            metrics = plan_metrics(plan)
+            scans = metrics.pop("scans")
+            record.update(metrics)
+            record["scans"] = len(scans)
+            record["pruned_scans"] = sum(1 for scan in scans if scan["partition_filters"])
+            # Any SQL metric of the plan identifies the execution in the status store
+            for node in walk(plan):
+                if node.metrics().size():
+                    record["_accumulator"] = node.metrics().values().head().id()
+                    break
+        except Py4JError:
+            # Plans of failed queries may not be available
+            pass
+        with self._lock:
+            self._records.append(record)
+
+    def onSuccess(self, funcName, qe, durationNs):
+        self._capture(funcName, qe, durationNs, None)
+
+    def onFailure(self, funcName, qe, exception):
+        self._capture(funcName, qe, None, exception.toString())
+
+    def drain(self):
+        """Return and forget the records captured so far."""
+        with self._lock:
+            records, self._records = self._records, []
+        return records
+
+    class Java:
+        implements = ["org.apache.spark.sql.util.QueryExecutionListener"]
+
+
+def _job_description(spark, job_ids):
+    """Return the ``spark.job.description`` the first of ``job_ids`` was submitted with, or None."""
+    store = spark.sparkContext._jsc.sc().statusStore()
+    for job_id in job_ids:
+        try:
+            description = store.job(job_id).description()
+        except Py4JError:
+            # The job has been evicted from the status store
+            continue
+        if description.isDefined():
+            return description.get()
+    return None
+
+
+def _executions(spark, accumulators):
+    """Return ``{accumulator id: (execution id, job description, stage ids)}`` for the given accumulators."""
+    store = spark._jsparkSession.sharedState().statusStore()
+    found = {}
+    pending = set(accumulators)
+    count = store.executionsCount()
+    # Newest executions first; the records of one flush are among the latest
+    offset = count
+    while pending and offset > 0:
+        length = min(50, offset)
+        offset -= length
+        for execution in reversed(_seq(store.executionsList(offset, length))):
+            ids = {metric.accumulatorId() for metric in _seq(execution.metrics())}
+            matched = pending & ids
+            if not matched:
+                continue
+            stages = sorted(_seq(execution.stages().toSeq()))
+            description = _job_description(spark, sorted(_seq(execution.jobs().keys().toSeq())))
+            for accumulator in matched:
+                found[accumulator] = (execution.executionId(), description, stages)
+            pending -= matched
+            if not pending:
+                break
+    return found
+
+
+def _rest(url):
+    try:
+        with urllib.request.urlopen(url, timeout=_REST_TIMEOUT_S) as response:
+            return json.load(response)
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def stage_metrics(spark, stage_ids):
+    """Return spill and task skew of completed stages from the Spark UI REST API, or None without a UI."""
+    ui = spark.sparkContext.uiWebUrl
+    if not ui:
+        return None
+    base = f"{ui.rstrip('/')}/api/v1/applications/{spark.sparkContext.applicationId}/stages"
+    result = dict.fromkeys(_STAGE_COLUMNS, 0)
+    result["skew_ratio"] = None
+    result["max_task_ms"] = result["median_task_ms"] = None
+    for stage_id in stage_ids:
+        attempts = _rest(f"{base}/{stage_id}")
+        if attempts is None:
+            continue
+        for attempt in attempts:
+            if attempt["status"] != "COMPLETE":
+                continue
+            result["stages"] += 1
+            result["memory_spill_bytes"] += attempt["memoryBytesSpilled"]
+            result["disk_spill_bytes"] += attempt["diskBytesSpilled"]
+            summary = _rest(f"{base}/{stage_id}/{attempt['attemptId']}/taskSummary?quantiles=0.5,1.0")
+            if not summary:
+                continue
+            median, longest = summary["executorRunTime"]
+            ratio = longest / median if median > 0 else None
+            if ratio is not None and (result["skew_ratio"] is None or ratio > result["skew_ratio"]):
+                # Reported for the most skewed stage of the query
+                result["skew_ratio"] = ratio
+                result["max_task_ms"] = int(longest)
+                result["median_task_ms"] = int(median)
+            if ratio is not None and ratio >= SKEW_RATIO and longest >= MIN_SKEW_TASK_MS:
+                result["skewed_stages"] += 1
+    return result
+
+
+class QueryMetrics:
+    """Records the queries of a session and appends them to a Delta metrics table on ``flush``."""
+
+    def __init__(self, spark, path=None):
+        self.spark = spark
+        self.path = path or layer_path("gold", METRICS_TABLE)
+        self.listener = QueryMetricsListener()
+        self._registered = False
+
+    def enable(self):
+        if not self._registered:
+            ensure_callback_server_started(self.spark.sparkContext._gateway)
+            self.spark._jsparkSession.listenerManager().register(self.listener)
+            self._registered = True
+        return self
+
+    def disable(self):
+        if self._registered:
+            self.spark._jsparkSession.listenerManager().unregister(self.listener)
+            self._registered = False
+
+    @contextmanager
+    def tag(self, name):
+        """Tag the queries run in this thread inside the block with ``name``."""
+        context = self.spark.sparkContext
+        previous = context.getLocalProperty(JOB_DESCRIPTION)
+        context.setJobDescription(name)
+        try:
+            yield
+        finally:
+            context.setJobDescription(previous)
+
+    def collect(self):
+        """Wait for the listener to catch up and return the captured records with their tags and stage metrics."""
+        # The listener is called from the listener bus; wait until it has seen every finished query
+        self.spark.sparkContext._jsc.sc().listenerBus().waitUntilEmpty()
+        records = self.listener.drain()
+        executions = _executions(self.spark, [r["_accumulator"] for r in records if r["_accumulator"] is not None])
+        app_id = self.spark.sparkContext.applicationId
+        rows = []
+        for record in records:
+            execution_id, tag, stages = executions.get(record.pop("_accumulator"), (None, None, []))
+            if tag == _FLUSH_TAG:
+                continue
+            record.update(app_id=app_id, execution_id=execution_id, tag=tag)
+            record.update(stage_metrics(self.spark, stages) or dict.fromkeys(_STAGE_COLUMNS))
+            rows.append(record)
+        return rows
+
+    def flush(self):
+        """Append the captured records to the metrics table; return the number written."""
+        rows = self.collect()
+        if rows:
+            with self.tag(_FLUSH_TAG):
+                self.spark.createDataFrame(rows, _SCHEMA).write.format("delta").mode("append").save(self.path)
+        return len(rows)
+
+
+def enable_query_metrics(spark, path=None):
+    """Start recording the queries of ``spark``; return its ``QueryMetrics``.
+
+    Calling it again on the same session returns the recorder already
+    registered, so re-running a notebook cell does not record twice.
+    """
+    key = (spark.sparkContext.applicationId, path)
+    if key not in _enabled:
+        _enabled[key] = QueryMetrics(spark, path)
+    return _enabled[key].enable()
+
+
+def summary_sql(path):
+    return f"""
+        SELECT
+          CAST(captured_at AS DATE) AS run_date,
+          COALESCE(tag, function) AS tag,
+          COUNT(*) AS queries,
+          SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) AS failed,
+          SUM(duration_ms) / 1000 AS total_seconds,
+          MAX(duration_ms) / 1000 AS max_seconds,
+          SUM(files_read) AS files_read,
+          SUM(bytes_read) AS bytes_read,
+          SUM(partitions_read) AS partitions_read,
+          SUM(scans - pruned_scans) AS unpruned_scans,
+          SUM(shuffle_bytes) AS shuffle_bytes,
+          SUM(spill_bytes + COALESCE(disk_spill_bytes, 0)) AS spill_bytes,
+          MAX(skew_ratio) AS max_skew_ratio,
+          SUM(skewed_stages) AS skewed_stages,
+          RANK() OVER (PARTITION BY CAST(captured_at AS DATE) ORDER BY SUM(duration_ms) DESC) AS time_rank,
+          RANK() OVER (
+            PARTITION BY CAST(captured_at AS DATE) ORDER BY SUM(bytes_read) + SUM(shuffle_bytes) DESC
+          ) AS cost_rank
+        FROM delta.`{path}`
+        GROUP BY CAST(captured_at AS DATE), COALESCE(tag, function)
+    """
+
+
+def create_summary_view(spark, path=None, name=SUMMARY_VIEW, temporary=False):
+    """Create a view with per-day and per-tag totals of the metrics table, ranked by time and cost."""
+    kind = "TEMPORARY VIEW" if temporary else "VIEW"
+    spark.sql(f"CREATE OR REPLACE {kind} {name} AS {summary_sql(path or layer_path('gold', METRICS_TABLE))}")
+    return spark.table(name)
@@ -0,0 +1,109 @@
+"""Sampled what-if reassignments, written with a single MERGE.
+
+The what-if cells of ``setup/4_create_reports`` used to pick random rows with
+``ORDER BY RAND() LIMIT n`` and pair them up with ``ROW_NUMBER() OVER
+(ORDER BY ...)``; both sort the whole table in one task. Here
+
+- rows are picked with a Bernoulli ``sample`` sized to return about ``n``
+  rows, which every task evaluates on its own split; duplicate keys are
+  dropped from the sample only, so the table is never shuffled,
+- each picked row gets its new value from a hash of its key and the seed, so
+  the assignment needs no ordering or numbering and is reproducible,
+- the updates are applied with one MERGE whose condition lists the partition
+  values (and, for small samples, the keys) of the picked rows, so Delta only
+  rewrites the files that can contain them.
+"""
+import math
+import random
+import time
+
+from pyspark.sql import functions as F
+
+from .delta_utils import current_version, describe_detail, in_condition, last_commit_metrics
+
+# Up to this many sampled keys are listed in the MERGE condition for file skipping
+MAX_PRUNE_KEYS = 10_000
+
+
+def sample_rows(df, n, seed, key=None):
+    """Return about ``n`` random rows of ``df`` without sorting it, one per ``key`` if given."""
+    total = df.count()
+    if n <= 0 or total == 0:
+        return df.limit(0)
+    # Oversample by a few standard deviations so the sample rarely comes up short
+    fraction = min(1.0, (n + 3 * math.sqrt(n) + 10) / total)
+    sample = df.sample(fraction=fraction, seed=seed)
+    if key is not None:
+        # Only the sample is shuffled to drop duplicate keys, not the whole table
+        sample = sample.dropDuplicates([key])
+    return sample.limit(n)
+
+
+def sample_values(df, column, n, seed=None):
+    """Return up to ``n`` distinct random values of ``column``."""
+    return [row[0] for row in sample_rows(df.select(column).distinct(), n, seed).collect()]
+
+
+def assign(df, key, column, values, seed):
+    """Add ``column`` set to one of ``values``, picked by a hash of ``key``."""
+    choices = F.array(*[F.lit(value) for value in values])
+    index = (F.pmod(F.xxhash64(F.col(key), F.lit(seed)), F.lit(len(values))) + 1).cast("int")
+    return df.withColumn(column, F.element_at(choices, index))
+
+
+def reassign(spark, path, key, column, values, n, seed=None):
+    """Set ``column`` of about ``n`` random rows of a Delta table to one of ``values``.
+
+    Returns the number of sampled and updated rows and the files the MERGE
+    rewrote, together with the seed so the run can be repeated.
+    """
+    if not values:
+        raise ValueError("values must not be empty")
+    started = time.perf_counter()
+    seed = random.randrange(2**31) if seed is None else seed
+    version = current_version(spark, path)
+    partition_by = describe_detail(spark, path)["partitionColumns"]
+
+    target = spark.read.format("delta").option("versionAsOf", version).load(path)
+    # One row per key: rows appended twice would make several source rows match one target row
+    rows = target.select(key, *partition_by).where(F.col(key).isNotNull())
+    picked = sample_rows(rows, n, seed, key)
+    updates = assign(picked, key, column, values, seed).cache()
+    sampled = updates.count()
+    if sampled == 0:
+        updates.unpersist()
+        return {"path": path, "seed": seed, "sampled": 0, "rows_updated": 0, "files_rewritten": 0}
+
+    condition = f"t.{key} = s.{key}"
+    for partition in partition_by:
+        present = [row[0] for row in updates.select(partition).distinct().collect()]
+        condition += f" AND {in_condition(f't.{partition}', present)}"
+    if sampled <= MAX_PRUNE_KEYS:
+        # Lets Delta skip files by the min/max statistics of the key column
+        keys = [row[0] for row in updates.select(key).collect()]
+        condition += f" AND {in_condition(f't.{key}', keys)}"
+
+    view = f"_reassign_{path.rstrip('/').rsplit('/', 1)[-1]}"
+    updates.createOrReplaceTempView(view)
+    spark.sql(
+        f"""
+        MERGE INTO delta.`{path}` AS t
+        USING {view} AS s
+        ON {condition}
+        WHEN MATCHED THEN UPDATE SET t.{column} = s.{column}
+        """
+    )
+    spark.catalog.dropTempView(view)
+    updates.unpersist()
+
+    metrics = last_commit_metrics(spark, path)
+    return {
+        "path": path,
+        "seed": seed,
+        "version": metrics["version"],
+        "sampled": sampled,
+        "rows_updated": metrics.get("numTargetRowsUpdated", 0),
+        "files_rewritten": metrics.get("numTargetFilesRemoved", 0),
+        "files_added": metrics.get("numTargetFilesAdded", 0),
+        "seconds": time.perf_counter() - started,
+    }
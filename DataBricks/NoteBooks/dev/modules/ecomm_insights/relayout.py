@@ -0,0 +1,154 @@
+"""Online re-layout of Delta tables whose partition column is too fine-grained.
+
+A table partitioned by a near-unique key (``order_items`` by ``order_id``)
+gets one directory and one tiny file per key, so every scan is dominated by
+listing and small-file reads. ``migrate_layout`` rewrites such a table in
+place into a coarser layout. The rewrite reads a fixed snapshot and commits
+a single overwrite, so readers keep querying the old snapshot until the new
+one is committed and never have to stop. ``apply_layout`` only rewrites a
+table whose partition columns differ from its layout and Z-orders the rest,
+so it is safe to run on every set-up.
+"""
+import time
+from dataclasses import dataclass
+
+from pyspark.sql import functions as F
+
+from .delta_utils import current_version, describe_detail, table_identifier
+
+try:
+    from delta.exceptions import ConcurrentModificationException
+except ImportError:  # pragma: no cover - delta-spark is not installed
+    ConcurrentModificationException = None
+
+# A partition column is too fine-grained when it is close to unique or when
+# it produces more directories than a listing can handle cheaply.
+MAX_DISTINCT_RATIO = 0.1
+MAX_PARTITIONS = 10_000
+MAX_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class Layout:
+    partition_by: tuple = ()
+    zorder_by: tuple = ()
+
+
+LAYOUTS = {
+    "order_items": {
+        # One unpartitioned table, clustered on the join key used by every report
+        "zorder": Layout(zorder_by=("order_id",)),
+    },
+}
+
+
+def partition_profile(spark, path):
+    """Return row, partition and file statistics of a Delta table."""
+    detail = describe_detail(spark, path)
+    columns = list(detail["partitionColumns"])
+    aggregates = [F.count(F.lit(1)).alias("rows")]
+    if columns:
+        aggregates.append(F.countDistinct(*columns).alias("partitions"))
+    stats = spark.read.format("delta").load(path).agg(*aggregates).collect()[0]
+    partitions = stats["partitions"] if columns else 1
+    return {
+        "path": path,
+        "partition_columns": columns,
+        "rows": stats["rows"],
+        "partitions": partitions,
+        "num_files": detail["numFiles"],
+        "size_bytes": detail["sizeInBytes"],
+        "avg_file_bytes": detail["sizeInBytes"] // max(detail["numFiles"], 1),
+        "too_fine": bool(columns)
+        and (partitions > MAX_PARTITIONS or partitions > stats["rows"] * MAX_DISTINCT_RATIO),
+    }
+
+
+def _best_of(repeat, action):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def scan_benchmark(spark, path, lookup=None, repeat=3):
+    """Time a full scan and, optionally, a point lookup of a Delta table.
+
+    ``lookup`` is a ``(column, value)`` pair. Both queries are run through the
+    ``noop`` sink so the timing covers the scan and not a result transfer.
+    """
+    detail = describe_detail(spark, path)
+    df = spark.read.format("delta").load(path)
+    result = {
+        "num_files": detail["numFiles"],
+        "size_bytes": detail["sizeInBytes"],
+        "full_scan_s": _best_of(repeat, lambda: df.write.format("noop").mode("overwrite").save()),
+    }
+    if lookup:
+        column, value = lookup
+        point = df.where(F.col(column) == value)
+        result["point_lookup_s"] = _best_of(repeat, lambda: point.write.format("noop").mode("overwrite").save())
+    return result
+
+
+def _is_concurrent_commit(exc):
+    if ConcurrentModificationException is not None and isinstance(exc, ConcurrentModificationException):
+        return True
+    return "Concurrent" in type(exc).__name__ or "ConcurrentAppendException" in str(exc)
+
+
+def migrate_layout(spark, path, layout, lookup_column=None, dry_run=False):
+    """Rewrite the Delta table at ``path`` into ``layout``.
+
+    Returns the before/after scan benchmark. The overwrite is retried from
+    the latest snapshot if a concurrent writer commits first; old files stay
+    available for time travel until the table is vacuumed.
+    """
+    lookup = None
+    if lookup_column:
+        value = spark.read.format("delta").load(path).select(lookup_column).limit(1).collect()
+        lookup = (lookup_column, value[0][0]) if value else None
+    report = {"path": path, "layout": layout, "before": scan_benchmark(spark, path, lookup)}
+    if dry_run:
+        return report
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        version = current_version(spark, path)
+        df = spark.read.format("delta").option("versionAsOf", version).load(path)
+        try:
+            (
+                df.write.format("delta")
+                .mode("overwrite")
+                .option("overwriteSchema", "true")
+                .partitionBy(*layout.partition_by)
+                .save(path)
+            )
+            break
+        except Exception as exc:
+            if attempt == MAX_ATTEMPTS or not _is_concurrent_commit(exc):
+                raise
+
+    if layout.zorder_by:
+        spark.sql(f"OPTIMIZE {table_identifier(path)} ZORDER BY ({', '.join(layout.zorder_by)})")
+
+    report["source_version"] = version
+    report["after"] = scan_benchmark(spark, path, lookup)
+    return report
+
+
+def apply_layout(spark, path, layout):
+    """Bring the Delta table at ``path`` into ``layout`` and return what was done.
+
+    A table still partitioned differently (``order_items`` by ``order_id``)
+    is rewritten with ``migrate_layout``, as ``OPTIMIZE`` cannot Z-order on a
+    partition column; a table already in the layout is only Z-ordered.
+    """
+    partition_by = tuple(describe_detail(spark, path)["partitionColumns"])
+    if partition_by != tuple(layout.partition_by):
+        return {"path": path, "action": "migrate", "report": migrate_layout(spark, path, layout)}
+    if layout.zorder_by:
+        spark.sql(f"OPTIMIZE {table_identifier(path)} ZORDER BY ({', '.join(layout.zorder_by)})")
+        return {"path": path, "action": "zorder"}
+    return {"path": path, "action": None}
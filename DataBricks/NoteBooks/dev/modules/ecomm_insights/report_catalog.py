@@ -0,0 +1,155 @@
+"""Extract the named report queries from the report notebooks.
+
+A report is the first read-only SQL cell after a markdown cell; its name is
+the markdown heading (``###Daily Sales Report: ...`` gives ``Daily Sales
+Report``). Set-up and what-if cells (``USE``, ``CREATE VIEW``, ``MERGE``) and
+ad-hoc ``SELECT`` cells after the first one are not reports, but the last
+``USE SCHEMA`` before a report is kept so it can run in the right schema.
+"""
+import os
+import re
+from dataclasses import dataclass
+
+MODULES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_NOTEBOOKS = (
+    os.path.join(MODULES_DIR, "setup", "3_create_reports.py"),
+    os.path.join(MODULES_DIR, "setup", "4_create_reports.sql"),
+)
+
+_SEPARATOR = re.compile(r"^(?:#|--) COMMAND -+$", re.MULTILINE)
+_MAGIC = re.compile(r"^(?:#|--) MAGIC ?")
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_USE_SCHEMA = re.compile(r"^\s*use\s+schema\s+`?([\w-]+)`?", re.IGNORECASE)
+_KEYWORDS = {
+    "on", "where", "join", "left", "right", "inner", "outer", "full", "cross", "semi", "anti", "natural",
+    "lateral", "group", "order", "having", "window", "limit", "union", "select", "using", "as", "and", "or",
+}
+# The alias is any word after the table that is not the keyword of the next clause (``FROM a JOIN b``)
+_REF = (
+    r"((?:`?\w+`?\.)?`?\w+`?)"
+    rf"(?:\s+(?:AS\s+)?(?!(?:{'|'.join(sorted(_KEYWORDS))})\b)(\w+))?"
+)
+_TABLE_REF = re.compile(rf"\b(?:FROM|JOIN)\s+{_REF}", re.IGNORECASE)
+# Further tables of a comma join (``FROM a, b``)
+_NEXT_REF = re.compile(rf"\s*,\s*{_REF}", re.IGNORECASE)
+_CTE = re.compile(r"(?:\bWITH|,)\s*(\w+)\s+AS\s*\(", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Report:
+    name: str
+    sql: str
+    notebook: str
+    schema: str = None
+
+
+def _cells(text):
+    """Yield ``(language, source)`` for every cell of a notebook export."""
+    default = "sql" if text.startswith("-- Databricks notebook source") else "python"
+    for raw in _SEPARATOR.split(text):
+        lines = [line for line in raw.strip("\n").splitlines() if not line.endswith("Databricks notebook source")]
+        if lines and all(_MAGIC.match(line) for line in lines):
+            lines = [_MAGIC.sub("", line, count=1) for line in lines]
+            if lines[0].startswith("%"):
+                language = lines[0][1:].strip()
+                yield language, "\n".join(lines[1:]).strip()
+                continue
+        yield default, "\n".join(lines).strip()
+
+
+def _strip_comments(sql):
+    return "\n".join(line for line in sql.splitlines() if not line.strip().startswith("--")).strip()
+
+
+def _cte_ends(sql):
+    """Return ``{name: position}`` of the end of every CTE body."""
+    ends = {}
+    for match in _CTE.finditer(sql):
+        depth = 1
+        position = match.end()
+        while position < len(sql) and depth:
+            depth += {"(": 1, ")": -1}.get(sql[position], 0)
+            position += 1
+        ends.setdefault(match.group(1).lower(), position)
+    return ends
+
+
+def _references(sql):
+    for match in _TABLE_REF.finditer(sql):
+        yield match.start(1), match.group(1), match.group(2)
+        position = match.end()
+        while True:
+            following = _NEXT_REF.match(sql, position)
+            if not following:
+                break
+            yield following.start(1), following.group(1), following.group(2)
+            position = following.end()
+
+
+def table_references(sql):
+    """Return ``[(table, alias)]`` of the tables a query reads, without its CTE names.
+
+    ``table`` keeps a schema qualifier if the query has one; ``alias`` is
+    None when the table is not aliased. A name refers to a CTE only after
+    the CTE's body, so ``WITH orders AS (SELECT ... FROM orders)`` still
+    reads the ``orders`` table.
+    """
+    ctes = _cte_ends(sql)
+    references = []
+    for position, table, alias in _references(sql):
+        table = table.replace("`", "")
+        if table.lower() in _KEYWORDS or position >= ctes.get(table.lower(), len(sql) + 1):
+            continue
+        references.append((table, alias or None))
+    return references
+
+
+def _heading(markdown):
+    """Return the report name of a markdown cell, or None for plain notes."""
+    for line in markdown.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            return line.lstrip("#").split(":", 1)[0].strip()
+        if ":" in line:
+            return line.split(":", 1)[0].strip()
+        return None
+    return None
+
+
+def extract_reports(path):
+    """Return the reports of one notebook in notebook order."""
+    with open(path) as handle:
+        text = handle.read()
+    notebook = os.path.basename(path)
+    reports = []
+    heading = None
+    schema = None
+    for language, source in _cells(text):
+        if language == "md":
+            heading = _heading(source) or heading
+            continue
+        sql = _strip_comments(source)
+        use = _USE_SCHEMA.match(sql)
+        if use:
+            schema = use.group(1)
+            continue
+        # Some SQL cells are mislabelled %python; only the statement matters
+        if language in ("sql", "python") and heading and _READ_ONLY.match(sql):
+            reports.append(Report(heading, sql.rstrip().rstrip(";"), notebook, schema))
+            heading = None
+    return reports
+
+
+def load_reports(paths=REPORT_NOTEBOOKS):
+    """Return the reports of all report notebooks with unique names."""
+    reports = []
+    seen = {}
+    for path in paths:
+        for report in extract_reports(path):
+            seen[report.name] = seen.get(report.name, 0) + 1
+            if seen[report.name] > 1:
+                report = Report(f"{report.name} ({report.notebook})", report.sql, report.notebook, report.schema)
+            reports.append(report)
+    return reports
@@ -0,0 +1,151 @@
+"""Time-series reports restricted to a date window, with a pruning check.
+
+The time-series reports of ``setup/3_create_reports`` and
+``setup/4_create_reports`` aggregate the whole history of their table. Here
+each of them is declared once with its source, its date partition column and
+its measures, and rendered for a ``[start, end]`` window as
+
+    SELECT <period> AS period, <measures>
+    FROM <source>
+    WHERE <date column> >= DATE'<start>' AND <date column> <= DATE'<end>'
+    GROUP BY <period>
+
+The filter compares the raw partition column with literals, which Spark turns
+into a partition filter; coarser grains are computed with ``DATE_TRUNC`` in
+the grouping only, where they cannot get in the way of pruning.
+``check_pruning`` reads the partition filters and the number of partitions
+each scan read from the executed plan (``plan_metrics``), so a dashboard
+over the last 7 days can be shown to read at most 7 date partitions.
+The sales trend is read from silver ``order_items`` and ``orders`` (the
+``order_history`` table of the notebook cell has no product or price columns);
+the profitability report has no window form, as no table records a cost yet.
+"""
+import datetime
+from dataclasses import dataclass
+
+from .dimensions import refresh_views
+from .plan_metrics import dataframe_metrics
+
+GRAINS = ("day", "week", "month", "quarter", "year")
+
+
+@dataclass(frozen=True)
+class TimeSeriesReport:
+    schema: str
+    # FROM clause, joins included
+    source: str
+    # Partition column of the fact table, qualified when the source joins
+    date_column: str
+    # (alias, SQL expression)
+    measures: tuple
+    grain: str = "day"
+
+
+TIME_SERIES_REPORTS = {
+    "Sales Reports": TimeSeriesReport(
+        "silver",
+        "order_items JOIN orders ON order_items.order_id = orders.order_id "
+        "JOIN products ON order_items.product_id = products.product_id",
+        "orders.order_date",
+        (
+            ("number_of_orders", "COUNT(DISTINCT orders.order_id)"),
+            ("total_sales", "SUM(order_items.quantity * order_items.price)"),
+        ),
+    ),
+    "Daily Sales Report": TimeSeriesReport(
+        "silver", "gold.daily_sales", "order_date", (("total_sales", "SUM(total_sales)"),)
+    ),
+    "Monthly Sales Report": TimeSeriesReport(
+        "silver", "gold.daily_sales", "order_date", (("total_sales", "SUM(total_sales)"),), "month"
+    ),
+    "User Growth Over Time": TimeSeriesReport("bronze", "users", "created_at", (("new_users", "COUNT(user_id)"),)),
+    "Revenue Over Time": TimeSeriesReport("bronze", "orders", "order_date", (("total_revenue", "SUM(total)"),)),
+}
+
+
+def _date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(str(value))
+
+
+def last_days(days, as_of=None):
+    """Return ``(start, end)`` of the ``days`` days up to and including ``as_of`` (default today)."""
+    end = _date(as_of or datetime.date.today())
+    return end - datetime.timedelta(days=days - 1), end
+
+
+def window_days(start, end):
+    return (_date(end) - _date(start)).days + 1
+
+
+def window_filter(column, start, end):
+    """Return a prunable filter on a date partition column: raw column against literals, no functions."""
+    return f"{column} >= DATE'{_date(start).isoformat()}' AND {column} <= DATE'{_date(end).isoformat()}'"
+
+
+def _period(column, grain):
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain {grain!r}; expected one of {GRAINS}")
+    if grain == "day":
+        return column
+    return f"CAST(DATE_TRUNC('{grain.upper()}', {column}) AS DATE)"
+
+
+def window_sql(name, start, end, grain=None):
+    """Return the SQL of a time-series report over ``[start, end]``, grouped by ``grain``."""
+    report = TIME_SERIES_REPORTS[name]
+    period = _period(report.date_column, grain or report.grain)
+    measures = ", ".join(f"{expression} AS {alias}" for alias, expression in report.measures)
+    return (
+        f"SELECT {period} AS period, {measures}\n"
+        f"FROM {report.source}\n"
+        f"WHERE {window_filter(report.date_column, start, end)}\n"
+        f"GROUP BY {period}\n"
+        "ORDER BY period"
+    )
+
+
+def window_report(spark, name, start, end, grain=None):
+    """Return a time-series report over ``[start, end]`` as a DataFrame, run in the report's schema."""
+    current = spark.catalog.currentDatabase()
+    spark.catalog.setCurrentDatabase(TIME_SERIES_REPORTS[name].schema)
+    # The report may join a cached dimension view (products); reload it if its table has moved on
+    refresh_views(spark)
+    try:
+        # Resolved here, so the schema can be switched back right away
+        return spark.sql(window_sql(name, start, end, grain))
+    finally:
+        spark.catalog.setCurrentDatabase(current)
+
+
+def check_pruning(df, column, max_partitions, strict=True):
+    """Check that every scan partitioned on ``column`` filters it and reads at most ``max_partitions``.
+
+    Call after ``df`` has run, so the scan metrics are filled in. Returns all
+    scans with a ``pruned`` flag, None for tables not partitioned on
+    ``column``; with ``strict`` a scan that is not pruned raises RuntimeError.
+    """
+    column = column.rsplit(".", 1)[-1]
+    scans = dataframe_metrics(df)["scans"]
+    for scan in scans:
+        if column not in scan["partition_columns"]:
+            scan["pruned"] = None
+            continue
+        filtered = any(column in expression for expression in scan["partition_filters"])
+        scan["pruned"] = filtered and scan["partitions"] <= max_partitions
+    if strict:
+        unpruned = [scan["node"] for scan in scans if scan["pruned"] is False]
+        if unpruned:
+            raise RuntimeError(f"Scans not pruned to {max_partitions} {column} partitions: {unpruned}")
+    return scans
+
+
+def run_window_report(spark, name, start, end, grain=None, strict=True):
+    """Run a time-series report over a window and verify its partition pruning.
+
+    Returns the collected result, as a DataFrame that does not rerun the
+    query, and the checked scans.
+    """
+    df = window_report(spark, name, start, end, grain)
+    rows = df.collect()
+    scans = check_pruning(df, TIME_SERIES_REPORTS[name].date_column, window_days(start, end), strict)
+    return spark.createDataFrame(rows, df.schema), scans
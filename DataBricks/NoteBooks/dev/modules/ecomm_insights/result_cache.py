@@ -0,0 +1,270 @@
+"""Report result cache keyed on the query text and the versions of its tables.
+
+A cached result is stored as Parquet under ``gold/_result_cache/<key>``,
+where the key hashes the normalized SQL together with the current Delta
+version of every table the query reads. A lookup therefore costs one
+``DESCRIBE HISTORY`` per input table and one file-existence check; as soon
+as any input table commits a new version the key changes and the report is
+recomputed.
+
+The ``_index`` Delta table next to the results records size, creation time,
+last use and hit count of every entry. When the cache grows beyond
+``max_bytes`` or ``max_entries`` the least recently used results are
+deleted.
+
+The input tables are taken from the analyzed plan of the query rather than
+its text, so CTEs that shadow a table, comma joins, subqueries and
+temporary views (the dimension cache reads its Delta tables by path) all
+resolve to the tables Spark actually scans. Queries that read anything but
+Delta tables are run directly and counted as bypassed.
+"""
+import hashlib
+import json
+import re
+import time
+
+from pyspark.sql import functions as F
+
+from .config import layer_path
+from .delta_utils import table_exists
+from .report_catalog import load_reports
+
+CACHE_DIR = "_result_cache"
+INDEX_TABLE = "_index"
+DEFAULT_MAX_MB = 2048
+DEFAULT_MAX_ENTRIES = 500
+
+_INDEX_SCHEMA = (
+    "key STRING, sql STRING, versions STRING, bytes LONG, rows LONG, compute_seconds DOUBLE, "
+    "created_at TIMESTAMP, last_used_at TIMESTAMP, hits LONG"
+)
+# String literals are kept as written; comments and runs of whitespace are not
+_TOKEN = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|--[^\n]*|\s+")
+# Plan leaves that read no table
+_NO_INPUT = {"OneRowRelation", "LocalRelation", "Range", "CTERelationRef"}
+
+
+def normalize_sql(sql):
+    """Return ``sql`` without comments, with single spaces and lower-case outside string literals."""
+    parts = []
+    position = 0
+    for match in _TOKEN.finditer(sql):
+        parts.append(sql[position:match.start()].lower())
+        parts.append(match.group(1) or " ")
+        position = match.end()
+    parts.append(sql[position:].lower())
+    return re.sub(r" +", " ", "".join(parts)).strip().rstrip(";").strip()
+
+
+def _leaf_table(node):
+    kind = node.getClass().getSimpleName()
+    if kind in _NO_INPUT:
+        return ""
+    if kind == "LogicalRelation":
+        catalog_table = node.catalogTable()
+        if catalog_table.isDefined():
+            return catalog_table.get().identifier().quotedString()
+        relation = node.relation()
+        if relation.getClass().getSimpleName() == "HadoopFsRelation":
+            paths = relation.location().rootPaths()
+            if paths.size() == 1:
+                return f"delta.`{paths.head().toString()}`"
+        return None
+    if kind == "HiveTableRelation":
+        return node.tableMeta().identifier().quotedString()
+    if kind == "DataSourceV2Relation" and node.catalog().isDefined() and node.identifier().isDefined():
+        return f"`{node.catalog().get().name()}`.{node.identifier().get().toString()}"
+    return None
+
+
+def plan_tables(spark, sql):
+    """Return the tables the analyzed plan of ``sql`` reads, or None if it reads anything else.
+
+    Tables in the catalog are returned by their quoted name, tables read by
+    path as ``delta.`<path>```.
+    """
+    tables = set()
+    pending = [spark.sql(sql)._jdf.queryExecution().analyzed()]
+    while pending:
+        node = pending.pop()
+        children = node.children()
+        if children.isEmpty():
+            table = _leaf_table(node)
+            if table is None:
+                return None
+            if table:
+                tables.add(table)
+        # Scalar and IN subqueries are expressions, not children
+        for nodes in (children, node.subqueries()):
+            pending.extend(nodes.apply(index) for index in range(nodes.size()))
+    return sorted(tables)
+
+
+class ResultCache:
+    def __init__(self, spark, root=None, max_mb=DEFAULT_MAX_MB, max_entries=DEFAULT_MAX_ENTRIES):
+        self.spark = spark
+        self.root = (root or layer_path("gold", CACHE_DIR)).rstrip("/")
+        self.index_path = f"{self.root}/{INDEX_TABLE}"
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        # key -> hits since the last flush
+        self._touched = {}
+
+    def _fs_path(self, path):
+        jvm_path = self.spark._jvm.org.apache.hadoop.fs.Path(path)
+        return jvm_path, jvm_path.getFileSystem(self.spark._jsc.hadoopConfiguration())
+
+    def _exists(self, path):
+        jvm_path, fs = self._fs_path(path)
+        return fs.exists(jvm_path)
+
+    def _size(self, path):
+        jvm_path, fs = self._fs_path(path)
+        return fs.getContentSummary(jvm_path).getLength()
+
+    def _delete(self, path):
+        jvm_path, fs = self._fs_path(path)
+        fs.delete(jvm_path, True)
+
+    def input_versions(self, sql):
+        """Return ``{table: version}`` of the tables ``sql`` reads, or None if one is not a Delta table."""
+        tables = plan_tables(self.spark, sql)
+        if tables is None:
+            return None
+        versions = {}
+        for name in tables:
+            try:
+                versions[name] = self.spark.sql(f"DESCRIBE HISTORY {name} LIMIT 1").collect()[0]["version"]
+            except Exception:
+                return None
+        return versions
+
+    def key(self, sql):
+        """Return ``(key, versions)`` of a query, or ``(None, None)`` when it cannot be cached."""
+        versions = self.input_versions(sql)
+        if not versions:
+            return None, None
+        payload = json.dumps({"sql": normalize_sql(sql), "versions": versions}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32], versions
+
+    def sql(self, sql):
+        """Return the result of ``sql``, from the cache when its inputs have not changed."""
+        key, versions = self.key(sql)
+        if key is None:
+            self.bypassed += 1
+            return self.spark.sql(sql)
+        path = f"{self.root}/{key}"
+        if self._exists(f"{path}/_SUCCESS"):
+            self.hits += 1
+            self._touched[key] = self._touched.get(key, 0) + 1
+            return self.spark.read.parquet(path)
+
+        self.misses += 1
+        started = time.perf_counter()
+        self.spark.sql(sql).write.mode("overwrite").parquet(path)
+        result = self.spark.read.parquet(path)
+        self._record(key, sql, versions, self._size(path), result.count(), time.perf_counter() - started)
+        self.evict()
+        return result
+
+    def report(self, name):
+        """Run a named report of the report notebooks through the cache."""
+        for report in load_reports():
+            if report.name != name:
+                continue
+            current = self.spark.catalog.currentDatabase()
+            if report.schema:
+                self.spark.catalog.setCurrentDatabase(report.schema)
+            try:
+                return self.sql(report.sql)
+            finally:
+                self.spark.catalog.setCurrentDatabase(current)
+        raise KeyError(f"Unknown report {name!r}")
+
+    def _record(self, key, sql, versions, size, rows, seconds):
+        entry = (
+            self.spark.createDataFrame(
+                [(key, sql, json.dumps(versions, sort_keys=True), size, rows, seconds, None, None, 0)], _INDEX_SCHEMA
+            )
+            .withColumn("created_at", F.current_timestamp())
+            .withColumn("last_used_at", F.current_timestamp())
+        )
+        if not table_exists(self.spark, self.index_path):
+            entry.write.format("delta").mode("overwrite").save(self.index_path)
+            return
+        entry.createOrReplaceTempView("_result_cache_entry")
+        self.spark.sql(
+            f"""
+            MERGE INTO delta.`{self.index_path}` AS t
+            USING _result_cache_entry AS s
+            ON t.key = s.key
+            WHEN MATCHED THEN UPDATE SET *
+            WHEN NOT MATCHED THEN INSERT *
+            """
+        )
+
+    def flush(self):
+        """Write the last-use time and hit counts of this session to the index."""
+        if not self._touched or not table_exists(self.spark, self.index_path):
+            return
+        touched = self.spark.createDataFrame(list(self._touched.items()), "key STRING, hits LONG")
+        touched.createOrReplaceTempView("_result_cache_touched")
+        self.spark.sql(
+            f"""
+            MERGE INTO delta.`{self.index_path}` AS t
+            USING _result_cache_touched AS s
+            ON t.key = s.key
+            WHEN MATCHED THEN UPDATE SET t.hits = t.hits + s.hits, t.last_used_at = current_timestamp()
+            """
+        )
+        self._touched = {}
+
+    def evict(self):
+        """Delete least recently used results until the cache fits its limits; return the evicted keys."""
+        if not table_exists(self.spark, self.index_path):
+            return []
+        self.flush()
+        entries = (
+            self.spark.read.format("delta")
+            .load(self.index_path)
+            .select("key", "bytes", "last_used_at")
+            .orderBy(F.desc("last_used_at"))
+            .collect()
+        )
+        kept_bytes = 0
+        evicted = []
+        for position, entry in enumerate(entries):
+            kept_bytes += entry["bytes"] or 0
+            if position >= self.max_entries or kept_bytes > self.max_bytes:
+                evicted.append(entry["key"])
+        if evicted:
+            for key in evicted:
+                self._delete(f"{self.root}/{key}")
+            keys = ", ".join(f"'{key}'" for key in evicted)
+            self.spark.sql(f"DELETE FROM delta.`{self.index_path}` WHERE key IN ({keys})")
+        return evicted
+
+    def clear(self):
+        """Delete every cached result and the index."""
+        self._delete(self.root)
+        self._touched = {}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        summary = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "entries": 0,
+            "bytes": 0,
+        }
+        if table_exists(self.spark, self.index_path):
+            row = self.spark.read.format("delta").load(self.index_path).agg(
+                F.count(F.lit(1)).alias("entries"), F.sum("bytes").alias("bytes")
+            ).collect()[0]
+            summary.update(entries=row["entries"], bytes=row["bytes"] or 0)
+        return summary
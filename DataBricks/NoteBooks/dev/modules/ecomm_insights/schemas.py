@@ -0,0 +1,241 @@
+"""Column definitions of the bronze tables, shared by the DDL and the loaders.
+
+Each table is declared once here as ``(name, SQL type)`` pairs, plus the
+generation expression of Delta generated columns. The ``CREATE TABLE``
+statements of ``setup/1_create_schema_table``, the ``StructType`` of the
+seed generator and of the CSV readers, and the column casts of the silver
+build are all derived from it, so a column added here reaches every writer
+at once instead of drifting into a schema mismatch on the next append.
+"""
+import re
+from dataclasses import dataclass
+
+from pyspark.sql.types import (
+    BooleanType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    IntegerType,
+    LongType,
+    StringType,
+    StructField,
+    StructType,
+    TimestampType,
+)
+
+from pyspark.sql import functions as F
+
+from .config import layer_path
+
+CHANGE_FEED = (("delta.enableChangeDataFeed", "true"),)
+
+_SIMPLE_TYPES = {
+    "STRING": StringType,
+    "INT": IntegerType,
+    "BIGINT": LongType,
+    "DOUBLE": DoubleType,
+    "BOOLEAN": BooleanType,
+    "DATE": DateType,
+    "TIMESTAMP": TimestampType,
+}
+_DECIMAL = re.compile(r"DECIMAL\((\d+),\s*(\d+)\)")
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    # (name, SQL type) or (name, SQL type, generation expression)
+    columns: tuple
+    partition_by: tuple = ()
+    properties: tuple = ()
+
+
+TABLES = {
+    "users": TableSchema(
+        (("user_id", "STRING"), ("username", "STRING"), ("password", "STRING"), ("email", "STRING"),
+         ("created_at", "DATE")),
+        ("created_at",),
+    ),
+    "products": TableSchema(
+        (("product_id", "STRING"), ("product_name", "STRING"), ("product_description", "STRING"),
+         ("category_id", "STRING"), ("price", "DECIMAL(10,2)"), ("created_at", "DATE")),
+        ("created_at",),
+        CHANGE_FEED,
+    ),
+    "product_categories": TableSchema(
+        (("category_id", "STRING"), ("category_name", "STRING"), ("category_groupname", "STRING")),
+        properties=CHANGE_FEED,
+    ),
+    "shopping_cart": TableSchema(
+        (("cart_id", "STRING"), ("user_id", "STRING"), ("product_id", "STRING"), ("quantity", "INT"),
+         ("added_at", "DATE")),
+        ("added_at",),
+        CHANGE_FEED,
+    ),
+    "orders": TableSchema(
+        (("order_id", "STRING"), ("user_id", "STRING"), ("order_date", "DATE"), ("total", "DECIMAL(10,2)"),
+         ("status", "STRING"), ("tracking_number", "STRING"), ("shipping_date", "DATE")),
+        ("order_date",),
+        CHANGE_FEED,
+    ),
+    "order_items": TableSchema(
+        (("order_item_id", "STRING"), ("order_id", "STRING"), ("product_id", "STRING"), ("quantity", "INT"),
+         ("price", "DECIMAL(10,2)")),
+        properties=CHANGE_FEED,
+    ),
+    "payments": TableSchema(
+        (("payment_id", "STRING"), ("order_id", "STRING"), ("user_id", "STRING"), ("amount", "DECIMAL(10,2)"),
+         ("payment_date", "DATE"), ("payment_method", "STRING"), ("credit_card_id", "STRING")),
+        ("payment_date",),
+    ),
+    "credit_cards": TableSchema(
+        (("credit_card_id", "STRING"), ("user_id", "STRING"), ("card_number", "STRING"), ("expiry_date", "DATE"),
+         ("cvv", "STRING")),
+    ),
+    "coupons": TableSchema(
+        (("coupon_id", "STRING"), ("coupon_code", "STRING"), ("discount", "DECIMAL(10,2)"), ("expiry_date", "DATE")),
+    ),
+    "stores": TableSchema(
+        (("store_id", "STRING"), ("store_name", "STRING"), ("store_location", "STRING")),
+    ),
+    "order_history": TableSchema(
+        (("order_id", "STRING"), ("user_id", "STRING"), ("order_date", "DATE"), ("order_status", "STRING"),
+         ("total_amount", "DECIMAL(10,2)")),
+        ("order_date",),
+    ),
+    "product_views": TableSchema(
+        (("view_id", "STRING"), ("user_id", "STRING"), ("product_id", "STRING"), ("viewed_at", "TIMESTAMP"),
+         ("view_date", "DATE", "CAST(viewed_at AS DATE)")),
+        ("view_date",),
+    ),
+    "user_sessions": TableSchema(
+        (("session_id", "STRING"), ("user_id", "STRING"), ("session_start", "TIMESTAMP"),
+         ("session_end", "TIMESTAMP"), ("session_date", "DATE", "CAST(session_start AS DATE)")),
+        ("session_date",),
+    ),
+    "page_visits": TableSchema(
+        (("visit_id", "STRING"), ("user_id", "STRING"), ("page_url", "STRING"), ("visited_at", "TIMESTAMP"),
+         ("visit_date", "DATE", "CAST(visited_at AS DATE)")),
+        ("visit_date",),
+    ),
+}
+
+
+def data_type(sql_type):
+    """Return the Spark ``DataType`` of a SQL type name such as ``DECIMAL(10,2)``."""
+    name = sql_type.strip().upper()
+    if name in _SIMPLE_TYPES:
+        return _SIMPLE_TYPES[name]()
+    decimal = _DECIMAL.fullmatch(name)
+    if decimal:
+        return DecimalType(int(decimal.group(1)), int(decimal.group(2)))
+    raise ValueError(f"Unsupported column type {sql_type!r}")
+
+
+def columns(table, generated=True):
+    """Return ``((name, SQL type), ...)`` of a table, without its generated columns unless ``generated``."""
+    return tuple((column[0], column[1]) for column in TABLES[table].columns if generated or len(column) == 2)
+
+
+def struct_type(table, generated=True):
+    """Return the ``StructType`` of a table; every column is nullable, as in the DDL."""
+    return StructType([StructField(name, data_type(sql_type), True) for name, sql_type in columns(table, generated)])
+
+
+def with_generated_columns(df, table):
+    """Add the generated columns of ``table`` to ``df``, computed by Spark with their generation expression.
+
+    Only for tables written without the DDL (a local benchmark lake); Delta
+    computes them itself on tables created by ``create_table_ddl``.
+    """
+    return df.withColumns(
+        {column[0]: F.expr(column[2]).cast(column[1]) for column in TABLES[table].columns if len(column) == 3}
+    )
+
+
+def create_table_ddl(table, location=None, layer="bronze", replace=False):
+    """Return the ``CREATE TABLE IF NOT EXISTS`` (or ``CREATE OR REPLACE TABLE``) statement of a table at ``location``."""
+    spec = TABLES[table]
+    definitions = []
+    for column in spec.columns:
+        definition = f"  {column[0]} {column[1]}"
+        if len(column) == 3:
+            definition += f" GENERATED ALWAYS AS ({column[2]})"
+        definitions.append(definition)
+    create = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    lines = [f"{create} {table} (", ",\n".join(definitions), ")", "USING delta"]
+    if spec.partition_by:
+        lines.append(f"PARTITIONED BY ({', '.join(spec.partition_by)})")
+    lines.append(f"LOCATION '{location or layer_path(layer, table)}'")
+    if spec.properties:
+        lines.append(f"TBLPROPERTIES ({', '.join(f'{key} = {value}' for key, value in spec.properties)})")
+    return "\n".join(lines)
+
+
+def layout_mismatches(spark, table):
+    """Return how an existing table of the current schema differs from the registry in types and partitioning.
+
+    Columns the table lacks are not a mismatch: ``ensure_table`` adds them.
+    """
+    spec = TABLES[table]
+    present = {field.name: field.dataType for field in spark.table(table).schema.fields}
+    mismatches = [
+        f"{name} is {present[name].simpleString()}, not {sql_type}"
+        for name, sql_type in columns(table)
+        if name in present and present[name] != data_type(sql_type)
+    ]
+    partition_by = tuple(spark.sql(f"DESCRIBE DETAIL {table}").collect()[0]["partitionColumns"])
+    if partition_by != tuple(spec.partition_by):
+        mismatches.append(f"partitioned by {partition_by}, not {tuple(spec.partition_by)}")
+    mismatches.extend(
+        f"{column[0]} is not generated" for column in spec.columns if len(column) == 3 and column[0] not in present
+    )
+    return mismatches
+
+
+def migrate_table(spark, table, location=None, layer="bronze"):
+    """Rewrite an existing table of the current schema whose types or partitioning differ from the registry.
+
+    The table is replaced by the registry DDL (generated columns and
+    partitioning included) and its rows of the last version are appended
+    again, cast to the registry types; columns the registry does not know are
+    dropped, missing ones become NULL. Readers see an empty table between the
+    two commits, so run it during set-up. Returns the mismatches that were
+    fixed, or None when the table is missing or already matches.
+    """
+    if not spark.catalog.tableExists(table):
+        return None
+    mismatches = layout_mismatches(spark, table)
+    if not mismatches:
+        return None
+    path = location or layer_path(layer, table)
+    version = spark.sql(f"DESCRIBE HISTORY {table} LIMIT 1").collect()[0]["version"]
+    spark.sql(create_table_ddl(table, location, layer, replace=True))
+    old = spark.read.format("delta").option("versionAsOf", version).load(path)
+    rows = old.select(
+        *[
+            (F.col(name) if name in old.columns else F.lit(None)).cast(data_type(sql_type)).alias(name)
+            for name, sql_type in columns(table, generated=False)
+        ]
+    )
+    # Delta computes the generated columns, and the partition columns derived from them, on append
+    rows.write.format("delta").mode("append").save(path)
+    return mismatches
+
+
+def ensure_table(spark, table, location=None, layer="bronze"):
+    """Create a table of the current schema if it is missing and add the registry columns it lacks.
+
+    Returns the names of the added columns. Generated columns cannot be added
+    to an existing table and are left out. Raises ValueError when the table
+    exists with other column types or partitioning (see ``migrate_table``).
+    """
+    spark.sql(create_table_ddl(table, location, layer))
+    mismatches = layout_mismatches(spark, table)
+    if mismatches:
+        raise ValueError(f"{table} differs from the schema registry ({'; '.join(mismatches)}); run migrate_table")
+    present = {field.name for field in spark.table(table).schema.fields}
+    missing = [(name, sql_type) for name, sql_type in columns(table, generated=False) if name not in present]
+    if missing:
+        added = ", ".join(f"{name} {sql_type}" for name, sql_type in missing)
+        spark.sql(f"ALTER TABLE {table} ADD COLUMNS ({added})")
+    return [name for name, _ in missing]
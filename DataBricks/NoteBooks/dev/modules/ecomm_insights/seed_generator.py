@@ -0,0 +1,508 @@
+"""Executor-side synthetic data generator for the bronze tables.
+
+Rows are produced on the executors in fixed-size chunks of the row index
+range. Each chunk seeds its own Faker and ``random.Random`` from
+``(seed, table, chunk start)``, so a table is reproducible for a given seed
+regardless of cluster size, and the driver never holds the data.
+
+The rows of a chunk are collected column by column into Arrow record batches
+of ``batch_rows`` rows with the table's fixed Arrow types (``decimal128``,
+``date32``, ...) and handed to Spark through ``mapInArrow``. Spark copies the
+batches into the writer as they are, instead of pickling every row and
+converting its ``Decimal`` and ``date`` values one by one, and an executor
+never holds more than one batch of a chunk.
+"""
+import datetime
+import hashlib
+import random
+import uuid
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable
+
+from pyspark.sql.types import StructType
+
+from .schemas import TABLES as SCHEMAS
+from .schemas import struct_type
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_BATCH_ROWS = 10_000
+
+# TPC-style sizing: scale factor 1 has 100k users and every other table is
+# sized from its parent through these ratios, so SF10 is exactly 10x SF1.
+USERS_PER_SCALE_FACTOR = 100_000
+DEFAULT_RATIOS = {
+    "orders_per_user": 5,
+    "items_per_order": 3,
+    "payments_per_order": 1,
+    "carts_per_user": 2,
+    "credit_cards_per_user": 1,
+    "products_per_user": 0.2,
+    "coupons_per_user": 0.01,
+    "stores_per_user": 0.01,
+    "visits_per_user": 4,
+    "page_visits_per_visit": 6,
+    "product_views_per_visit": 2,
+}
+PRODUCT_CATEGORIES = 100
+
+# Zipf exponents for foreign keys: a few heavy users place most orders and a
+# few hot products dominate carts and order lines. 0 draws keys uniformly.
+DEFAULT_USER_SKEW = 0.8
+DEFAULT_PRODUCT_SKEW = 1.1
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    schema: StructType
+    partition_by: tuple
+    row: Callable
+
+
+def stable_seed(seed, table, index):
+    """Return a 64-bit integer derived from the seed, table name and index."""
+    digest = hashlib.blake2b(f"{seed}:{table}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def random_uuid(rng):
+    """Return a UUID4 string drawn from ``rng`` instead of ``os.urandom``."""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def random_money(rng, max_cents):
+    return Decimal(rng.randrange(1, max_cents)).scaleb(-2)
+
+
+def random_date(rng, as_of, days_back=0, days_ahead=0):
+    return as_of + datetime.timedelta(days=rng.randint(-days_back, days_ahead))
+
+
+def zipf_rank(u, n, skew):
+    """Map ``u`` in ``[0, 1)`` to a rank in ``[0, n)`` with P(rank) ~ 1 / (rank + 1) ** skew.
+
+    Uses the inverse CDF of the continuous power law on ``[1, n + 1)``;
+    ``skew = 0`` is uniform.
+    """
+    if skew == 0:
+        rank = int(u * n)
+    elif skew == 1:
+        rank = int((n + 1) ** u) - 1
+    else:
+        exponent = 1 - skew
+        rank = int((((n + 1) ** exponent - 1) * u + 1) ** (1 / exponent)) - 1
+    return min(max(rank, 0), n - 1)
+
+
+# Ranks are scattered over the parent index range with a multiplicative hash,
+# so the hot keys are not simply the first rows the generator wrote.
+_SCATTER_PRIME = 2**61 - 1
+
+
+@dataclass(frozen=True)
+class GenerationContext:
+    """Everything a row function needs to derive keys shared across tables.
+
+    Values another table must agree on (ids, order users, dates and prices)
+    are pure functions of ``(seed, name, index)`` rather than draws from the
+    chunk's ``rng``, so parents and children can be generated independently.
+    """
+
+    seed: int
+    as_of: datetime.date
+    row_counts: dict
+    user_skew: float = DEFAULT_USER_SKEW
+    product_skew: float = DEFAULT_PRODUCT_SKEW
+    referential: bool = True
+
+    def entity_id(self, table, index):
+        digest = hashlib.blake2b(f"{self.seed}:{table}:id:{index}".encode(), digest_size=16).digest()
+        return str(uuid.UUID(bytes=digest, version=4))
+
+    def unit(self, name, index):
+        return stable_seed(self.seed, name, index) / 2**64
+
+    def children_per(self, parent, child):
+        return max(1, self.row_counts[child] // self.row_counts[parent])
+
+    def pick(self, parent, skew, name, index):
+        """Return the parent row index drawn for row ``index`` of ``name``."""
+        n = self.row_counts[parent]
+        rank = zipf_rank(self.unit(name, index), n, skew)
+        return rank * _SCATTER_PRIME % n
+
+    def foreign_key(self, parent, skew, name, index):
+        if self.referential:
+            return self.entity_id(parent, self.pick(parent, skew, name, index))
+        # Unmatched keys, as the original Faker cells produced
+        return self.entity_id(f"{parent}:unmatched:{name}", index)
+
+    def product_price(self, product):
+        return Decimal(1 + int(self.unit("products.price", product) * 999_999)).scaleb(-2)
+
+    def order_date(self, order):
+        return self.as_of - datetime.timedelta(days=int(self.unit("orders.order_date", order) * 365))
+
+    def order_user(self, order):
+        return self.pick("users", self.user_skew, "orders.user_id", order)
+
+    def order_item(self, item):
+        """Return ``(product index, quantity)`` of an order item."""
+        product = self.pick("products", self.product_skew, "order_items.product_id", item)
+        quantity = 1 + int(self.unit("order_items.quantity", item) * 10)
+        return product, quantity
+
+    def visit_user(self, visit):
+        return self.pick("users", self.user_skew, "visits.user_id", visit)
+
+    def event_time(self, visit, position):
+        """Return the timestamp of the ``position``-th page event of a browsing visit.
+
+        Visits start at a random second of the last 365 days and their events
+        are 5 seconds to 5 minutes apart.
+        """
+        day = self.as_of - datetime.timedelta(days=int(self.unit("visits.date", visit) * 365))
+        seconds = int(self.unit("visits.start", visit) * 86_400)
+        for step in range(position):
+            seconds += 5 + int(self.unit("visits.gap", visit * 1_000 + step) * 295)
+        return datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(seconds=seconds)
+
+    def order_total(self, order):
+        per_order = self.children_per("orders", "order_items")
+        total = Decimal(0)
+        for item in range(order * per_order, (order + 1) * per_order):
+            product, quantity = self.order_item(item)
+            total += self.product_price(product) * quantity
+        return total
+
+
+def _users_row(fake, rng, ctx, i):
+    return (
+        ctx.entity_id("users", i),
+        fake.user_name(),
+        fake.password(),
+        fake.email(),
+        random_date(rng, ctx.as_of, days_back=365),
+    )
+
+
+def _products_row(fake, rng, ctx, i):
+    return (
+        ctx.entity_id("products", i),
+        fake.catch_phrase(),
+        fake.text(),
+        ctx.foreign_key("product_categories", 0, "products.category_id", i),
+        ctx.product_price(i),
+        random_date(rng, ctx.as_of, days_back=365),
+    )
+
+
+def _product_categories_row(fake, rng, ctx, i):
+    # Category groups are only delivered by the CSV extracts
+    return (ctx.entity_id("product_categories", i), fake.catch_phrase(), None)
+
+
+def _shopping_cart_row(fake, rng, ctx, i):
+    return (
+        ctx.entity_id("shopping_cart", i),
+        ctx.foreign_key("users", ctx.user_skew, "shopping_cart.user_id", i),
+        ctx.foreign_key("products", ctx.product_skew, "shopping_cart.product_id", i),
+        rng.randint(1, 10),
+        random_date(rng, ctx.as_of, days_back=365),
+    )
+
+
+def _orders_row(fake, rng, ctx, i):
+    order_date = ctx.order_date(i)
+    status = rng.choice(("Processing", "Shipped", "Delivered"))
+    shipping_date = None if status == "Processing" else order_date + datetime.timedelta(days=rng.randint(0, 7))
+    if ctx.referential:
+        user_id = ctx.entity_id("users", ctx.order_user(i))
+    else:
+        user_id = ctx.foreign_key("users", ctx.user_skew, "orders.user_id", i)
+    return (
+        ctx.entity_id("orders", i),
+        user_id,
+        order_date,
+        ctx.order_total(i),
+        status,
+        random_uuid(rng),
+        shipping_date,
+    )
+
+
+def _order_items_row(fake, rng, ctx, i):
+    product, quantity = ctx.order_item(i)
+    order = min(i // ctx.children_per("orders", "order_items"), ctx.row_counts["orders"] - 1)
+    if ctx.referential:
+        order_id = ctx.entity_id("orders", order)
+        product_id = ctx.entity_id("products", product)
+    else:
+        order_id = ctx.foreign_key("orders", 0, "order_items.order_id", i)
+        product_id = ctx.foreign_key("products", 0, "order_items.product_id", i)
+    return (
+        ctx.entity_id("order_items", i),
+        order_id,
+        product_id,
+        quantity,
+        ctx.product_price(product),
+    )
+
+
+def _payments_row(fake, rng, ctx, i):
+    per_order = ctx.children_per("orders", "payments")
+    order = min(i // per_order, ctx.row_counts["orders"] - 1)
+    user = ctx.order_user(order)
+    amount = (ctx.order_total(order) / per_order).quantize(Decimal("0.01"))
+    if ctx.referential:
+        order_id = ctx.entity_id("orders", order)
+        user_id = ctx.entity_id("users", user)
+        credit_card_id = ctx.entity_id("credit_cards", user % ctx.row_counts["credit_cards"])
+    else:
+        order_id = ctx.foreign_key("orders", 0, "payments.order_id", i)
+        user_id = ctx.foreign_key("users", 0, "payments.user_id", i)
+        credit_card_id = ctx.foreign_key("credit_cards", 0, "payments.credit_card_id", i)
+    return (
+        ctx.entity_id("payments", i),
+        order_id,
+        user_id,
+        amount,
+        ctx.order_date(order),
+        rng.choice(("Credit Card", "Debit Card", "PayPal")),
+        credit_card_id,
+    )
+
+
+def _credit_cards_row(fake, rng, ctx, i):
+    # Card i belongs to user i modulo the user count, which is what payments assume
+    if ctx.referential:
+        user_id = ctx.entity_id("users", i % ctx.row_counts["users"])
+    else:
+        user_id = ctx.foreign_key("users", 0, "credit_cards.user_id", i)
+    return (
+        ctx.entity_id("credit_cards", i),
+        user_id,
+        fake.credit_card_number(card_type=None),
+        random_date(rng, ctx.as_of, days_ahead=5 * 365),
+        # A string, like the token it is replaced with on load
+        str(rng.randint(100, 999)),
+    )
+
+
+def _coupons_row(fake, rng, ctx, i):
+    return (
+        ctx.entity_id("coupons", i),
+        fake.lexify(text="????????", letters="ABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890"),
+        random_money(rng, 10_000),
+        random_date(rng, ctx.as_of, days_ahead=365),
+    )
+
+
+def _stores_row(fake, rng, ctx, i):
+    return (ctx.entity_id("stores", i), fake.company(), fake.address().replace("\n", ", "))
+
+
+_PAGES = ("/", "/search", "/category", "/product", "/cart", "/checkout", "/account")
+
+
+def _page_visits_row(fake, rng, ctx, i):
+    per_visit = ctx.children_per("visits", "page_visits")
+    visit = min(i // per_visit, ctx.row_counts["visits"] - 1)
+    visited_at = ctx.event_time(visit, i % per_visit)
+    page = rng.choice(_PAGES)
+    if page == "/product":
+        page = f"/product/{ctx.foreign_key('products', ctx.product_skew, 'page_visits.product_id', i)}"
+    if ctx.referential:
+        user_id = ctx.entity_id("users", ctx.visit_user(visit))
+    else:
+        user_id = ctx.foreign_key("users", 0, "page_visits.user_id", i)
+    return (
+        ctx.entity_id("page_visits", i),
+        user_id,
+        page,
+        visited_at,
+    )
+
+
+def _product_views_row(fake, rng, ctx, i):
+    per_visit = ctx.children_per("visits", "product_views")
+    visit = min(i // per_visit, ctx.row_counts["visits"] - 1)
+    # Spread the views over the page events of the visit, a few seconds after each
+    pages = ctx.children_per("visits", "page_visits")
+    viewed_at = ctx.event_time(visit, (i % per_visit) * pages // per_visit) + datetime.timedelta(seconds=2)
+    if ctx.referential:
+        user_id = ctx.entity_id("users", ctx.visit_user(visit))
+    else:
+        user_id = ctx.foreign_key("users", 0, "product_views.user_id", i)
+    return (
+        ctx.entity_id("product_views", i),
+        user_id,
+        ctx.foreign_key("products", ctx.product_skew, "product_views.product_id", i),
+        viewed_at,
+    )
+
+
+_ROWS = {
+    "users": _users_row,
+    "products": _products_row,
+    "product_categories": _product_categories_row,
+    "shopping_cart": _shopping_cart_row,
+    "orders": _orders_row,
+    "order_items": _order_items_row,
+    "payments": _payments_row,
+    "credit_cards": _credit_cards_row,
+    "coupons": _coupons_row,
+    "stores": _stores_row,
+    "page_visits": _page_visits_row,
+    "product_views": _product_views_row,
+}
+
+# Rows are tuples in the column order of the schema registry. Generated columns (visit_date, view_date) are
+# left out: Delta computes them on write in the session time zone, which a date taken in Python would not match
+TABLES = {
+    name: TableSpec(struct_type(name, generated=False), SCHEMAS[name].partition_by, row) for name, row in _ROWS.items()
+}
+
+
+def parse_scale_factor(value):
+    """Parse a scale factor written as ``10``, ``0.5`` or ``SF10``."""
+    text = str(value).strip().upper()
+    if text.startswith("SF"):
+        text = text[2:]
+    scale_factor = float(text)
+    if scale_factor <= 0:
+        raise ValueError(f"Scale factor must be positive, got {value!r}")
+    return scale_factor
+
+
+def table_row_counts(scale_factor, **ratios):
+    """Return the row count of every generated table at ``scale_factor``.
+
+    Users scale linearly with the scale factor; orders and browsing visits
+    are sized per user, order items and payments per order, page visits and
+    product views per visit. ``ratios`` overrides entries of
+    ``DEFAULT_RATIOS``.
+    """
+    unknown = set(ratios) - set(DEFAULT_RATIOS)
+    if unknown:
+        raise ValueError(f"Unknown ratios: {sorted(unknown)}")
+    ratios = {**DEFAULT_RATIOS, **ratios}
+    users = max(1, round(USERS_PER_SCALE_FACTOR * parse_scale_factor(scale_factor)))
+    orders = users * ratios["orders_per_user"]
+    visits = users * ratios["visits_per_user"]
+
+    def per_user(name):
+        return max(1, round(users * ratios[name]))
+
+    return {
+        "users": users,
+        "products": per_user("products_per_user"),
+        "product_categories": PRODUCT_CATEGORIES,
+        "shopping_cart": per_user("carts_per_user"),
+        "orders": orders,
+        "order_items": orders * ratios["items_per_order"],
+        "payments": orders * ratios["payments_per_order"],
+        "credit_cards": per_user("credit_cards_per_user"),
+        "coupons": per_user("coupons_per_user"),
+        "stores": per_user("stores_per_user"),
+        "page_visits": visits * ratios["page_visits_per_visit"],
+        "product_views": visits * ratios["product_views_per_visit"],
+        # Not a table: the browsing visits page_visits and product_views belong to
+        "visits": visits,
+    }
+
+
+def chunk_ranges(rows, chunk_rows):
+    """Split ``[0, rows)`` into ``(start, end)`` index ranges."""
+    return [(start, min(start + chunk_rows, rows)) for start in range(0, rows, chunk_rows)]
+
+
+def generate_chunk(table, ctx, start, end):
+    """Yield the rows of ``table`` with indexes ``[start, end)``."""
+    from faker import Faker
+
+    chunk_seed = stable_seed(ctx.seed, table, start)
+    fake = Faker()
+    fake.seed_instance(chunk_seed)
+    rng = random.Random(chunk_seed)
+    row = TABLES[table].row
+    for i in range(start, end):
+        yield row(fake, rng, ctx, i)
+
+
+def record_batches(table, ctx, start, end, batch_rows=DEFAULT_BATCH_ROWS):
+    """Yield the rows of ``table`` with indexes ``[start, end)`` as Arrow record batches."""
+    import pyarrow as pa
+    from pyspark.sql.pandas.types import to_arrow_schema
+
+    schema = to_arrow_schema(TABLES[table].schema)
+    columns = [[] for _ in schema]
+
+    def flush():
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+        for values in columns:
+            values.clear()
+        return batch
+
+    for row in generate_chunk(table, ctx, start, end):
+        for values, value in zip(columns, row):
+            values.append(value)
+        if len(columns[0]) >= batch_rows:
+            yield flush()
+    if columns[0]:
+        yield flush()
+
+
+def generate_table(
+    spark,
+    table,
+    row_counts,
+    seed=DEFAULT_SEED,
+    chunk_rows=DEFAULT_CHUNK_ROWS,
+    as_of=None,
+    user_skew=DEFAULT_USER_SKEW,
+    product_skew=DEFAULT_PRODUCT_SKEW,
+    referential=True,
+    batch_rows=DEFAULT_BATCH_ROWS,
+):
+    """Return a DataFrame of synthetic rows for a bronze table.
+
+    ``row_counts`` is the output of ``table_row_counts``; the table's own
+    entry sets its size and the parent entries bound its foreign keys. Each
+    chunk of ``chunk_rows`` rows becomes one Spark partition and is generated
+    on an executor. Dates are relative to ``as_of`` (default today), so pass
+    it explicitly to reproduce a dataset on a later day.
+
+    With ``referential`` every foreign key points at a row of the parent
+    table generated with the same seed and row counts, drawn with Zipf skew
+    ``user_skew``/``product_skew``; without it foreign keys match nothing.
+
+    Rows reach Spark as Arrow batches of at most ``batch_rows`` rows.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {sorted(TABLES)}")
+    ctx = GenerationContext(
+        seed=seed,
+        as_of=as_of or datetime.date.today(),
+        row_counts=dict(row_counts),
+        user_skew=user_skew,
+        product_skew=product_skew,
+        referential=referential,
+    )
+    rows = ctx.row_counts[table]
+    chunks = len(chunk_ranges(rows, chunk_rows))
+
+    def generate_partition(batches):
+        # One chunk index per partition; the range is derived from it
+        for batch in batches:
+            for chunk in batch.column(0).to_pylist():
+                start = chunk * chunk_rows
+                yield from record_batches(table, ctx, start, min(start + chunk_rows, rows), batch_rows)
+
+    return (
+        spark.range(0, chunks, numPartitions=max(chunks, 1))
+        .mapInArrow(generate_partition, TABLES[table].schema)
+    )
@@ -0,0 +1,53 @@
+"""SparkSession helpers."""
+import os
+import shutil
+import tempfile
+
+from pyspark.sql import SparkSession
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Comma-separated local Delta jars, for machines that cannot reach Maven
+SPARK_JARS_ENV = "ECOMM_SPARK_JARS"
+
+
+def get_spark(app_name="ecomm-insights", master="local[*]"):
+    """Return the active SparkSession, or start a local one with Delta Lake.
+
+    On Databricks the notebook's session is returned unchanged. Locally the
+    Delta jars come from ``$ECOMM_SPARK_JARS`` when set and are otherwise
+    resolved by ``delta-spark`` through the Ivy cache.
+    """
+    active = SparkSession.getActiveSession()
+    if active is not None:
+        return active
+    builder = (
+        SparkSession.builder.appName(app_name)
+        .master(master)
+        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
+        .config("spark.sql.catalog.spark_catalog", "org.apache.spark.sql.delta.catalog.DeltaCatalog")
+        .config("spark.ui.showConsoleProgress", "false")
+    )
+    jars = os.environ.get(SPARK_JARS_ENV)
+    if jars:
+        return builder.config("spark.jars", jars).getOrCreate()
+    from delta import configure_spark_with_delta_pip
+
+    return configure_spark_with_delta_pip(builder).getOrCreate()
+
+
+def ship_package(spark):
+    """Zip this package and add it to the executors' Python path.
+
+    Notebooks import the package from the repo checkout on the driver only;
+    code that runs inside executor tasks (generators, UDFs) needs it there too.
+    """
+    staging = tempfile.mkdtemp(prefix="ecomm_insights_")
+    archive = shutil.make_archive(
+        os.path.join(staging, "ecomm_insights"),
+        "zip",
+        root_dir=os.path.dirname(PACKAGE_DIR),
+        base_dir=os.path.basename(PACKAGE_DIR),
+    )
+    spark.sparkContext.addPyFile(archive)
+    return archive
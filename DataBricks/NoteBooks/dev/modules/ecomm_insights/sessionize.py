@@ -0,0 +1,169 @@
+"""Sessions built from timestamped page visits and product views.
+
+The events of each user are ordered by time; an event more than
+``gap_minutes`` after the previous one starts a new session. Only a
+per-user window is involved, so the work is spread over the users instead of
+sorting the whole event history.
+
+Three gold tables are written, all partitioned by the session start date:
+
+- ``gold.sessions``: one row per session with its start, end, duration and
+  page/product view counts,
+- ``gold.time_on_site``: sessions, seconds on site and page views per user
+  and day,
+- ``gold.pages_per_session``: the distribution of pages and duration per
+  session per day.
+
+A refresh for a date range re-reads the events from one day before to one
+day after the range, so sessions that run over midnight at either end keep
+all their events (up to a day's worth), keeps the sessions that start in the
+range and replaces only those dates.
+"""
+import datetime
+import time
+
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+from .config import layer_path
+from .delta_utils import table_exists
+from .writer import write_delta
+
+SESSION_GAP_MINUTES = 30
+SESSIONS_TABLE = "sessions"
+TIME_ON_SITE_TABLE = "time_on_site"
+PAGES_PER_SESSION_TABLE = "pages_per_session"
+
+# Event sources: table -> (timestamp column, date partition column, event kind)
+EVENT_SOURCES = {
+    "page_visits": ("visited_at", "visit_date", "page"),
+    "product_views": ("viewed_at", "view_date", "product"),
+}
+
+
+def read_events(spark, start=None, end=None, layer="silver"):
+    """Return ``(user_id, event_time, kind)`` of every event between two dates."""
+    frames = []
+    for table, (column, day, kind) in EVENT_SOURCES.items():
+        path = layer_path(layer, table)
+        if not table_exists(spark, path):
+            continue
+        df = spark.read.format("delta").load(path)
+        # The date partition column prunes the scan; the timestamp bounds are exact
+        if start is not None:
+            df = df.where(F.col(day) >= F.lit(start).cast("date"))
+        if end is not None:
+            df = df.where(F.col(day) <= F.lit(end).cast("date"))
+        df = df.select("user_id", F.col(column).cast("timestamp").alias("event_time"), F.lit(kind).alias("kind"))
+        if start is not None:
+            df = df.where(F.col("event_time") >= F.lit(start).cast("timestamp"))
+        if end is not None:
+            df = df.where(F.col("event_time") < F.date_add(F.lit(end).cast("date"), 1).cast("timestamp"))
+        frames.append(df.where(F.col("user_id").isNotNull() & F.col("event_time").isNotNull()))
+    if not frames:
+        return None
+    events = frames[0]
+    for other in frames[1:]:
+        events = events.unionByName(other)
+    return events
+
+
+def sessionize(events, gap_minutes=SESSION_GAP_MINUTES):
+    """Group events into sessions and return one row per session."""
+    by_user = Window.partitionBy("user_id").orderBy("event_time", "kind")
+    gap = F.col("event_time").cast("long") - F.lag(F.col("event_time").cast("long")).over(by_user)
+    new_session = F.when(gap.isNull() | (gap > gap_minutes * 60), 1).otherwise(0)
+    numbered = events.withColumn("_new", new_session).withColumn(
+        "_session", F.sum("_new").over(by_user.rowsBetween(Window.unboundedPreceding, Window.currentRow))
+    )
+    return (
+        numbered.groupBy("user_id", "_session")
+        .agg(
+            F.min("event_time").alias("session_start"),
+            F.max("event_time").alias("session_end"),
+            F.count(F.lit(1)).alias("events"),
+            F.sum(F.when(F.col("kind") == "page", 1).otherwise(0)).alias("page_views"),
+            F.sum(F.when(F.col("kind") == "product", 1).otherwise(0)).alias("product_views"),
+        )
+        .select(
+            # Stable across rebuilds: a session is identified by its user and first event
+            F.sha2(F.concat_ws("|", "user_id", F.col("session_start").cast("string")), 256)
+            .substr(1, 32)
+            .alias("session_id"),
+            "user_id",
+            "session_start",
+            "session_end",
+            (F.col("session_end").cast("long") - F.col("session_start").cast("long")).alias("duration_seconds"),
+            "events",
+            "page_views",
+            "product_views",
+            F.to_date("session_start").alias("session_date"),
+        )
+    )
+
+
+def time_on_site(sessions):
+    return sessions.groupBy("session_date", "user_id").agg(
+        F.count(F.lit(1)).alias("sessions"),
+        F.sum("duration_seconds").alias("seconds"),
+        F.sum("page_views").alias("page_views"),
+        F.sum("product_views").alias("product_views"),
+    )
+
+
+def pages_per_session(sessions):
+    return sessions.groupBy("session_date").agg(
+        F.count(F.lit(1)).alias("sessions"),
+        F.sum("page_views").alias("page_views"),
+        F.avg("page_views").alias("avg_pages"),
+        F.percentile_approx("page_views", 0.5).alias("median_pages"),
+        F.percentile_approx("page_views", 0.9).alias("p90_pages"),
+        F.avg("duration_seconds").alias("avg_seconds"),
+        F.percentile_approx("duration_seconds", 0.5).alias("median_seconds"),
+    )
+
+
+def _write(df, path, start, end):
+    condition = []
+    if start is not None:
+        condition.append(f"session_date >= DATE'{start}'")
+    if end is not None:
+        condition.append(f"session_date <= DATE'{end}'")
+    write_delta(
+        df,
+        path,
+        "overwrite",
+        ("session_date",),
+        replace_where=" AND ".join(condition) or None,
+        overwrite_schema=not condition,
+    )
+
+
+def refresh_sessions(spark, start=None, end=None, gap_minutes=SESSION_GAP_MINUTES, layer="silver"):
+    """Rebuild the sessions of the dates between ``start`` and ``end`` (all dates by default).
+
+    Returns the number of sessions written and the duration.
+    """
+    started = time.perf_counter()
+    # Sessions starting before the range can run into it, and sessions of its last day out of it; read a day
+    # more on both sides (and at least one gap after it) and keep the sessions by their start date
+    read_from = None if start is None else datetime.date.fromisoformat(str(start)) - datetime.timedelta(days=1)
+    read_to = None
+    if end is not None:
+        read_to = datetime.date.fromisoformat(str(end)) + datetime.timedelta(days=1 + gap_minutes // (24 * 60))
+    events = read_events(spark, read_from, read_to, layer)
+    if events is None:
+        return {"sessions": 0, "seconds": time.perf_counter() - started}
+
+    sessions = sessionize(events, gap_minutes)
+    if start is not None:
+        sessions = sessions.where(F.col("session_date") >= F.lit(start).cast("date"))
+    if end is not None:
+        sessions = sessions.where(F.col("session_date") <= F.lit(end).cast("date"))
+    sessions = sessions.cache()
+    count = sessions.count()
+    _write(sessions, layer_path("gold", SESSIONS_TABLE), start, end)
+    _write(time_on_site(sessions), layer_path("gold", TIME_ON_SITE_TABLE), start, end)
+    _write(pages_per_session(sessions), layer_path("gold", PAGES_PER_SESSION_TABLE), start, end)
+    sessions.unpersist()
+    return {"sessions": count, "seconds": time.perf_counter() - started}
@@ -0,0 +1,295 @@
+"""Per-day sketches for approximate distinct counts and top-N lists.
+
+``gold.daily_sketches`` holds one HyperLogLog sketch per metric and day (and
+per dimension value, for metrics such as viewers per product), built with
+``hll_sketch_agg``. Weekly, monthly or all-time distinct counts merge the
+daily sketches with ``hll_union_agg`` instead of re-shuffling the raw rows;
+the estimate has a relative standard error of about ``1.04 / sqrt(2**lg_k)``.
+
+``gold.daily_top_items`` keeps the heaviest ``capacity`` items of each day
+together with the weight of the first item that was cut off (``residual``).
+Summing the kept weights over a date range gives a lower bound for every
+item; an item cannot be heavier than that plus the residuals of the days on
+which it was cut off, which is the error bound reported with each top item.
+"""
+import math
+from dataclasses import dataclass
+
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+from .config import layer_path
+from .delta_utils import table_exists
+from .writer import write_delta
+
+SKETCH_TABLE = "daily_sketches"
+TOP_ITEMS_TABLE = "daily_top_items"
+DEFAULT_LG_K = 12
+DEFAULT_TOP_CAPACITY = 1000
+# Two standard errors, about 95% confidence
+CONFIDENCE_SIGMAS = 2
+
+
+@dataclass(frozen=True)
+class DistinctMetric:
+    source: str
+    day: str
+    value: str
+    dimension: str = None
+    # Layer of the source; the layer passed to the build when None
+    layer: str = None
+
+
+@dataclass(frozen=True)
+class TopMetric:
+    source: str
+    day: str
+    item: str
+    # Summed per item; rows are counted when None
+    weight: str = None
+    layer: str = None
+
+
+DISTINCT_METRICS = {
+    "orders": DistinctMetric("orders", "order_date", "order_id"),
+    "buyers": DistinctMetric("orders", "order_date", "user_id"),
+    "carts": DistinctMetric("shopping_cart", "added_at", "cart_id"),
+    "cart_users": DistinctMetric("shopping_cart", "added_at", "user_id"),
+    # Sessions are built by ``sessionize`` into the gold layer
+    "session_users": DistinctMetric("sessions", "session_date", "user_id", layer="gold"),
+    "sessions": DistinctMetric("sessions", "session_date", "session_id", layer="gold"),
+    "viewers": DistinctMetric("product_views", "view_date", "user_id"),
+    "product_viewers": DistinctMetric("product_views", "view_date", "user_id", "product_id"),
+}
+
+TOP_METRICS = {
+    "products_sold": TopMetric("order_items", "order_date", "product_id", "quantity"),
+    "products_viewed": TopMetric("product_views", "view_date", "product_id"),
+}
+
+# Sources without a date of their own take it from their parent table
+_DAY_FROM = {"order_items": ("orders", "order_id", "order_date")}
+
+
+def relative_error(lg_k=DEFAULT_LG_K):
+    """Return the relative standard error of an HLL sketch with ``2**lg_k`` buckets."""
+    return 1.04 / math.sqrt(2**lg_k)
+
+
+def _source_paths(metric, layer):
+    layer = metric.layer or layer
+    paths = [layer_path(layer, metric.source)]
+    if metric.source in _DAY_FROM:
+        paths.append(layer_path(layer, _DAY_FROM[metric.source][0]))
+    return paths
+
+
+def _check_sources(spark, metrics, layer):
+    # A missing source would silently leave its metrics empty in every report
+    missing = sorted(
+        {path for metric in metrics for path in _source_paths(metric, layer) if not table_exists(spark, path)}
+    )
+    if missing:
+        raise RuntimeError(f"Sketch sources do not exist: {', '.join(missing)}; build them first")
+
+
+def _read_source(spark, metric, layer):
+    path, *parent_path = _source_paths(metric, layer)
+    df = spark.read.format("delta").load(path)
+    if parent_path:
+        _, key, day = _DAY_FROM[metric.source]
+        df = df.join(spark.read.format("delta").load(parent_path[0]).select(key, day), key)
+    return df
+
+
+def _date_range(column, start, end):
+    # Event columns are timestamps; compare their day so ``end`` includes the whole day
+    day = F.col(column).cast("date")
+    condition = F.lit(True)
+    if start is not None:
+        condition = condition & (day >= F.lit(start).cast("date"))
+    if end is not None:
+        condition = condition & (day <= F.lit(end).cast("date"))
+    return condition
+
+
+def _replace_where(start, end):
+    parts = []
+    if start is not None:
+        parts.append(f"day >= DATE'{start}'")
+    if end is not None:
+        parts.append(f"day <= DATE'{end}'")
+    return " AND ".join(parts)
+
+
+def daily_sketches(spark, start=None, end=None, layer="silver", lg_k=DEFAULT_LG_K):
+    """Return the HLL sketch of every distinct metric per day and dimension value.
+
+    Raises RuntimeError when a source table of a metric does not exist.
+    """
+    frames = []
+    _check_sources(spark, DISTINCT_METRICS.values(), layer)
+    for name, metric in DISTINCT_METRICS.items():
+        source = _read_source(spark, metric, layer)
+        dimension = F.col(metric.dimension).cast("string") if metric.dimension else F.lit(None).cast("string")
+        frames.append(
+            source.where(_date_range(metric.day, start, end))
+            .select(F.col(metric.day).cast("date").alias("day"), dimension.alias("dimension"), F.col(metric.value))
+            .groupBy("day", "dimension")
+            .agg(F.hll_sketch_agg(metric.value, lg_k).alias("sketch"), F.count(F.lit(1)).alias("rows"))
+            .select(F.lit(name).alias("metric"), "day", "dimension", "sketch", F.lit(lg_k).alias("lg_k"), "rows")
+        )
+    return _union(frames)
+
+
+def daily_top_items(spark, start=None, end=None, layer="silver", capacity=DEFAULT_TOP_CAPACITY):
+    """Return the ``capacity`` heaviest items of every top metric per day, with the cut-off residual."""
+    frames = []
+    _check_sources(spark, TOP_METRICS.values(), layer)
+    for name, metric in TOP_METRICS.items():
+        source = _read_source(spark, metric, layer)
+        weight = F.sum(metric.weight).cast("long") if metric.weight else F.count(F.lit(1))
+        ranked = (
+            source.where(_date_range(metric.day, start, end))
+            .groupBy(F.col(metric.day).cast("date").alias("day"), F.col(metric.item).cast("string").alias("item"))
+            .agg(weight.alias("weight"))
+            .withColumn("_rank", F.row_number().over(Window.partitionBy("day").orderBy(F.desc("weight"), "item")))
+            .where(F.col("_rank") <= capacity + 1)
+        )
+        # Weight of the first item that did not make the cut, 0 when nothing was cut
+        residual = F.max(F.when(F.col("_rank") == capacity + 1, F.col("weight"))).over(Window.partitionBy("day"))
+        frames.append(
+            ranked.withColumn("residual", F.coalesce(residual, F.lit(0)))
+            .where(F.col("_rank") <= capacity)
+            .select(F.lit(name).alias("metric"), "day", "item", "weight", "residual")
+        )
+    return _union(frames)
+
+
+def _union(frames):
+    if not frames:
+        return None
+    union = frames[0]
+    for other in frames[1:]:
+        union = union.unionByName(other)
+    return union
+
+
+def _write(df, path, start, end):
+    condition = _replace_where(start, end)
+    write_delta(df, path, "overwrite", ("day",), replace_where=condition or None, overwrite_schema=not condition)
+
+
+def refresh_sketches(spark, start=None, end=None, layer="silver", lg_k=DEFAULT_LG_K, capacity=DEFAULT_TOP_CAPACITY):
+    """Rebuild the daily sketches for the days between ``start`` and ``end`` (all days by default).
+
+    Returns the number of rows written to each sketch table.
+    """
+    written = {}
+    for table, df in (
+        (SKETCH_TABLE, daily_sketches(spark, start, end, layer, lg_k)),
+        (TOP_ITEMS_TABLE, daily_top_items(spark, start, end, layer, capacity)),
+    ):
+        if df is None:
+            written[table] = 0
+            continue
+        df = df.cache()
+        written[table] = df.count()
+        _write(df, layer_path("gold", table), start, end)
+        df.unpersist()
+    return written
+
+
+def _period(grain):
+    if grain == "day":
+        return F.col("day")
+    if grain in ("week", "month", "year"):
+        return F.date_trunc(grain, "day").cast("date")
+    if grain == "all":
+        return F.lit(None).cast("date")
+    raise ValueError(f"Unknown grain {grain!r}; expected day, week, month, year or all")
+
+
+def _sketches(spark, metrics, start, end):
+    return (
+        spark.read.format("delta")
+        .load(layer_path("gold", SKETCH_TABLE))
+        .where(F.col("metric").isin(list(metrics)) & _date_range("day", start, end))
+    )
+
+
+def approx_distinct(spark, metric, grain="day", start=None, end=None, by_dimension=False):
+    """Return the approximate distinct count of ``metric`` per period, with its 95% bounds."""
+    keys = ["period", "dimension"] if by_dimension else ["period"]
+    rse = relative_error()
+    return (
+        _sketches(spark, [metric], start, end)
+        .withColumn("period", _period(grain))
+        .groupBy(*keys)
+        .agg(F.hll_sketch_estimate(F.hll_union_agg("sketch", True)).alias("estimate"))
+        .withColumn("relative_error", F.lit(CONFIDENCE_SIGMAS * rse))
+        .withColumn("lower", F.floor(F.col("estimate") * (1 - CONFIDENCE_SIGMAS * rse)).cast("long"))
+        .withColumn("upper", F.ceil(F.col("estimate") * (1 + CONFIDENCE_SIGMAS * rse)).cast("long"))
+        .orderBy(*keys)
+    )
+
+
+def approx_overlap(spark, first, second, start=None, end=None):
+    """Estimate how many values two distinct metrics over the same domain share.
+
+    The intersection is derived as ``|A| + |B| - |A ∪ B|``, so its absolute
+    error is bounded by the errors of all three estimates together.
+    """
+    sketches = _sketches(spark, [first, second], start, end)
+    estimates = (
+        sketches.groupBy("metric")
+        .agg(F.hll_sketch_estimate(F.hll_union_agg("sketch", True)).alias("estimate"))
+        .collect()
+    )
+    counts = {row["metric"]: row["estimate"] for row in estimates}
+    union = sketches.agg(F.hll_sketch_estimate(F.hll_union_agg("sketch", True))).collect()[0][0] or 0
+    a, b = counts.get(first, 0), counts.get(second, 0)
+    return {
+        first: a,
+        second: b,
+        "union": union,
+        "overlap": max(0, a + b - union),
+        "error": math.ceil(CONFIDENCE_SIGMAS * relative_error() * (a + b + union)),
+    }
+
+
+def approx_rate(spark, numerator, denominator, start=None, end=None):
+    """Return the ratio of two approximate distinct counts with its 95% bounds."""
+    estimates = (
+        _sketches(spark, [numerator, denominator], start, end)
+        .groupBy("metric")
+        .agg(F.hll_sketch_estimate(F.hll_union_agg("sketch", True)).alias("estimate"))
+        .collect()
+    )
+    counts = {row["metric"]: row["estimate"] for row in estimates}
+    if not counts.get(denominator):
+        return {"rate": None, "lower": None, "upper": None}
+    rate = counts.get(numerator, 0) / counts[denominator]
+    margin = CONFIDENCE_SIGMAS * relative_error()
+    return {"rate": rate, "lower": rate * (1 - margin) / (1 + margin), "upper": rate * (1 + margin) / (1 - margin)}
+
+
+def approx_top(spark, metric, n=10, start=None, end=None):
+    """Return the ``n`` heaviest items of ``metric`` with their guaranteed weight and error bound.
+
+    ``weight`` never overcounts; the true weight is at most ``weight + max_error``.
+    """
+    items = (
+        spark.read.format("delta")
+        .load(layer_path("gold", TOP_ITEMS_TABLE))
+        .where((F.col("metric") == metric) & _date_range("day", start, end))
+    )
+    total_residual = items.select("day", "residual").distinct().agg(F.sum("residual")).collect()[0][0] or 0
+    return (
+        items.groupBy("item")
+        .agg(F.sum("weight").alias("weight"), F.sum("residual").alias("_covered"))
+        .withColumn("max_error", F.lit(total_residual) - F.col("_covered"))
+        .drop("_covered")
+        .orderBy(F.desc("weight"), "item")
+        .limit(n)
+    )
@@ -0,0 +1,157 @@
+"""Streaming ingestion of the bronze CSV drops into the bronze Delta tables.
+
+Each entity gets one streaming query that picks up new files under
+``bronze/data/<entity>`` with the explicit schema from ``ingest.SOURCES``
+and appends them to the bronze table. The Delta sink plus the query's
+checkpoint make every file land exactly once, even across restarts.
+
+PII columns are tokenized in the stream (``pii``) before they reach the sink.
+
+On Databricks the source is Auto Loader (``cloudFiles``); elsewhere the
+plain file-stream source is used, so the same pipeline runs locally against
+a directory standing in for ADLS.
+"""
+import datetime
+import os
+import threading
+
+from pyspark.sql import functions as F
+from pyspark.sql.streaming import StreamingQueryListener
+
+from .config import layer_path
+from .ingest import SOURCES
+from .pii import DEFAULT_METHOD, tokenize
+
+QUERY_PREFIX = "bronze_"
+
+
+def on_databricks():
+    return "DATABRICKS_RUNTIME_VERSION" in os.environ
+
+
+class IngestProgressListener(StreamingQueryListener):
+    """Collects throughput and latency of every bronze micro-batch.
+
+    Latency is the time from the modification of the oldest file in a batch
+    to the end of the batch, i.e. how stale the data was when it landed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = []
+
+    def onQueryStarted(self, event):
+        pass
+
+    def onQueryProgress(self, event):
+        progress = event.progress
+        if not (progress.name or "").startswith(QUERY_PREFIX) or progress.numInputRows == 0:
+            return
+        finished = datetime.datetime.fromisoformat(progress.timestamp.replace("Z", "+00:00"))
+        finished += datetime.timedelta(milliseconds=progress.batchDuration)
+        observed = progress.observedMetrics.get("ingest")
+        oldest_file = observed["oldest_file"] if observed is not None else None
+        latency = None
+        if oldest_file is not None:
+            if oldest_file.tzinfo is None:
+                oldest_file = oldest_file.astimezone()
+            latency = (finished - oldest_file).total_seconds()
+        batch = {
+            "table": progress.name[len(QUERY_PREFIX):],
+            "batch_id": progress.batchId,
+            "finished_at": finished,
+            "rows": progress.numInputRows,
+            "files": observed["files"] if observed is not None else None,
+            "input_rows_per_s": progress.inputRowsPerSecond,
+            "processed_rows_per_s": progress.processedRowsPerSecond,
+            "batch_ms": progress.batchDuration,
+            "latency_s": latency,
+        }
+        with self._lock:
+            self.batches.append(batch)
+
+    def onQueryIdle(self, event):
+        pass
+
+    def to_frame(self, spark):
+        """Return the collected micro-batch metrics as a DataFrame."""
+        with self._lock:
+            batches = list(self.batches)
+        return spark.createDataFrame(
+            batches,
+            "table STRING, batch_id LONG, finished_at TIMESTAMP, rows LONG, files LONG, "
+            "input_rows_per_s DOUBLE, processed_rows_per_s DOUBLE, batch_ms LONG, latency_s DOUBLE",
+        )
+
+    def onQueryTerminated(self, event):
+        pass
+
+
+def read_bronze_stream(
+    spark, table, source_dir, use_auto_loader=None, max_files_per_trigger=None, pii_method=DEFAULT_METHOD
+):
+    """Return a streaming DataFrame of the CSV files dropped for ``table``, PII columns tokenized."""
+    source = SOURCES[table]
+    if use_auto_loader is None:
+        use_auto_loader = on_databricks()
+    if use_auto_loader:
+        reader = spark.readStream.format("cloudFiles").option("cloudFiles.format", "csv")
+        if max_files_per_trigger:
+            reader = reader.option("cloudFiles.maxFilesPerTrigger", max_files_per_trigger)
+    else:
+        reader = spark.readStream.format("csv")
+        if max_files_per_trigger:
+            reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+    df = reader.schema(source.schema).option("header", "true").option("pathGlobFilter", "*.csv").load(source_dir)
+    return (
+        tokenize(df, table, pii_method=pii_method)
+        .withColumn("_file_path", F.col("_metadata.file_path"))
+        .withColumn("_file_modification_time", F.col("_metadata.file_modification_time"))
+        .observe(
+            "ingest",
+            F.count(F.lit(1)).alias("rows"),
+            F.approx_count_distinct("_file_path").alias("files"),
+            F.min("_file_modification_time").alias("oldest_file"),
+        )
+        .drop("_file_path", "_file_modification_time")
+    )
+
+
+def start_bronze_stream(
+    spark,
+    table,
+    source_root=None,
+    target_path=None,
+    checkpoint_root=None,
+    trigger=None,
+    use_auto_loader=None,
+    max_files_per_trigger=None,
+    pii_method=DEFAULT_METHOD,
+):
+    """Start the streaming load of one bronze table and return the query.
+
+    ``trigger`` is passed to ``DataStreamWriter.trigger``, e.g.
+    ``{"processingTime": "1 minute"}`` for a continuous pipeline or
+    ``{"availableNow": True}`` to drain the backlog and stop.
+    """
+    source = SOURCES[table]
+    source_dir = f"{(source_root or layer_path('bronze', 'data')).rstrip('/')}/{source.directory}"
+    checkpoint = f"{(checkpoint_root or layer_path('bronze', '_checkpoints')).rstrip('/')}/{table}"
+    writer = (
+        read_bronze_stream(spark, table, source_dir, use_auto_loader, max_files_per_trigger, pii_method)
+        .writeStream.format("delta")
+        .queryName(f"{QUERY_PREFIX}{table}")
+        .outputMode("append")
+        .option("checkpointLocation", checkpoint)
+        .partitionBy(*source.partition_by)
+    )
+    if trigger:
+        writer = writer.trigger(**trigger)
+    return writer.start(target_path or layer_path("bronze", table))
+
+
+def start_bronze_streams(spark, tables=None, listener=None, **options):
+    """Start one streaming query per bronze table; returns ``{table: query}``."""
+    if listener is not None:
+        spark.streams.addListener(listener)
+    return {table: start_bronze_stream(spark, table, **options) for table in (tables or SOURCES)}
@@ -0,0 +1,147 @@
+"""Delta writes sized to a target file size.
+
+A bare ``df.write`` produces one file per task and partition value it
+touches: a small aggregate after a 200-partition shuffle becomes hundreds of
+tiny files per date, and one large CSV becomes a few oversized ones.
+``write_delta`` estimates the size of the input, repartitions it on the
+partition columns into ``size / target_file_mb`` tasks (so every partition
+value is written by one task) and caps files at the number of rows of one
+target-sized file with ``maxRecordsPerFile``. Delta's optimized writes and
+auto compaction can be switched on instead of or on top of that.
+
+Every write returns, and optionally appends to a ``_write_log`` table, the
+number of files, bytes and rows Delta committed. A failed log append (two
+first writes racing to create the log) is returned as ``log_error`` instead
+of raised, as the data write has committed by then.
+"""
+import math
+import time
+
+from pyspark.sql import functions as F
+
+from .delta_utils import last_commit_metrics, table_identifier
+
+DEFAULT_TARGET_FILE_MB = 128
+WRITE_LOG_TABLE = "_write_log"
+AUTO_COMPACT_PROPERTY = "delta.autoOptimize.autoCompact"
+
+# Statistics of plans Spark cannot size (Python sources, UDFs) are unusable
+_UNKNOWN_SIZE = 2**62
+
+
+def row_bytes(df):
+    """Return Spark's estimate of the in-memory size of one row of ``df``."""
+    return max(1, df._jdf.schema().defaultSize())
+
+
+def estimate_bytes(df, rows=None):
+    """Estimate the size of ``df`` from ``rows`` when known, otherwise from the optimizer statistics.
+
+    Returns None when neither gives a usable number.
+    """
+    if rows is not None:
+        return rows * row_bytes(df)
+    size = int(str(df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes()))
+    return size if 0 < size < _UNKNOWN_SIZE else None
+
+
+def output_files(size_bytes, target_file_mb=DEFAULT_TARGET_FILE_MB):
+    return max(1, math.ceil(size_bytes / (target_file_mb * 1024 * 1024)))
+
+
+def _enable_auto_compact(spark, path):
+    identifier = table_identifier(path)
+    properties = {row["key"]: row["value"] for row in spark.sql(f"SHOW TBLPROPERTIES {identifier}").collect()}
+    if properties.get(AUTO_COMPACT_PROPERTY) != "true":
+        spark.sql(f"ALTER TABLE {identifier} SET TBLPROPERTIES ('{AUTO_COMPACT_PROPERTY}' = 'true')")
+
+
+def write_delta(
+    df,
+    path,
+    mode="append",
+    partition_by=(),
+    rows=None,
+    target_file_mb=DEFAULT_TARGET_FILE_MB,
+    optimize_write=False,
+    auto_compact=False,
+    repartition=True,
+    replace_where=None,
+    overwrite_schema=False,
+    options=None,
+    log_path=None,
+):
+    """Write ``df`` to the Delta table at ``path`` in files of about ``target_file_mb``.
+
+    ``rows`` is the expected row count when the caller knows it (Spark
+    cannot size Python-generated data); otherwise the optimizer's estimate is
+    used, and the layout is left alone when there is none. With
+    ``optimize_write`` Delta shuffles the data itself and the repartition is
+    skipped; pass ``repartition=False`` when ``df`` is already laid out.
+    Returns the estimate, the layout and the commit's file, byte and
+    row counts.
+    """
+    spark = df.sparkSession
+    started = time.perf_counter()
+    partition_by = tuple(partition_by)
+    estimated = estimate_bytes(df, rows)
+    files = None
+    writer_options = dict(options or {})
+    if estimated is not None:
+        files = output_files(estimated, target_file_mb)
+        # One target-sized file holds this many rows; larger partition values are split
+        writer_options["maxRecordsPerFile"] = max(1, (target_file_mb * 1024 * 1024) // row_bytes(df))
+        if repartition and not optimize_write:
+            df = df.repartition(files, *[F.col(column) for column in partition_by])
+    if optimize_write:
+        writer_options["optimizeWrite"] = "true"
+    if replace_where:
+        writer_options["replaceWhere"] = replace_where
+    if overwrite_schema:
+        writer_options["overwriteSchema"] = "true"
+
+    writer = df.write.format("delta").mode(mode)
+    if partition_by:
+        writer = writer.partitionBy(*partition_by)
+    for key, value in writer_options.items():
+        writer = writer.option(key, value)
+    writer.save(path)
+    if auto_compact:
+        _enable_auto_compact(spark, path)
+
+    commit = last_commit_metrics(spark, path)
+    result = {
+        "path": path,
+        "mode": mode,
+        "operation": commit["operation"],
+        "version": commit["version"],
+        "estimated_bytes": estimated,
+        "target_files": files,
+        "files": commit.get("numFiles", commit.get("numAddedFiles")),
+        "bytes": commit.get("numOutputBytes", commit.get("numAddedBytes")),
+        "rows": commit.get("numOutputRows"),
+        "removed_files": commit.get("numRemovedFiles"),
+        "seconds": time.perf_counter() - started,
+    }
+    if log_path:
+        try:
+            log_write(spark, result, log_path)
+        except Exception as exc:
+            # The data is committed: failing here would make a retry write it again
+            result["log_error"] = str(exc)
+    return result
+
+
+def log_write(spark, result, log_path):
+    """Append one ``write_delta`` result to a write log table."""
+    schema = (
+        "path STRING, mode STRING, operation STRING, version LONG, estimated_bytes LONG, target_files INT, "
+        "files LONG, bytes LONG, rows LONG, removed_files LONG, seconds DOUBLE"
+    )
+    (
+        spark.createDataFrame([result], schema)
+        .withColumn("written_at", F.current_timestamp())
+        .write.format("delta")
+        .mode("append")
+        .save(log_path)
+    )
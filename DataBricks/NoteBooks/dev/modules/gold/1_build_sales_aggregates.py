@@ -0,0 +1,29 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold daily sales aggregates
+# MAGIC Maintains `gold.daily_sales` (one row per order date) and `gold.daily_category_sales` (one row per order date and category) from the bronze `orders`, `order_items`, `products` and `product_categories` tables. The first run builds them in full; later runs read the change data feed of the sources since the previous run and rewrite only the order dates those changes touch. The sales reports in `setup/3_create_reports` read these tables.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.sales_aggregates import refresh_daily_sales
+
+dbutils.widgets.dropdown("full_refresh", "false", ["true", "false"])
+
+full_refresh = dbutils.widgets.get("full_refresh") == "true"
+
+# COMMAND ----------
+
+# Refresh the aggregates from the bronze change feeds
+print(refresh_daily_sales(spark, full=full_refresh))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.daily_sales USING delta LOCATION '{layer_path('gold', 'daily_sales')}'")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.daily_category_sales USING delta LOCATION '{layer_path('gold', 'daily_category_sales')}'")
@@ -0,0 +1,101 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold daily sketches
+# MAGIC Maintains `gold.daily_sketches` (one HyperLogLog sketch per distinct-count metric and day) and `gold.daily_top_items` (the heaviest items per day with the cut-off weight) from the silver tables and `gold.sessions`, so run `gold/4_build_sessions` first; a missing source table fails the refresh. The cells below answer the distinct-count, conversion, abandonment and top-N reports of `setup/3_create_reports` and `setup/4_create_reports` approximately, by merging the small daily sketches instead of rescanning the raw rows. Each number comes with its error bound.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.sketches import (
+    SKETCH_TABLE,
+    TOP_ITEMS_TABLE,
+    approx_distinct,
+    approx_overlap,
+    approx_rate,
+    approx_top,
+    refresh_sketches,
+)
+
+dbutils.widgets.text("start_date", "")
+dbutils.widgets.text("end_date", "")
+dbutils.widgets.dropdown("grain", "day", ["day", "week", "month", "year", "all"])
+
+start_date = dbutils.widgets.get("start_date") or None
+end_date = dbutils.widgets.get("end_date") or None
+grain = dbutils.widgets.get("grain")
+
+# COMMAND ----------
+
+# Rebuild the sketches of the selected days (all days when no dates are set)
+print(refresh_sketches(spark, start_date, end_date))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{SKETCH_TABLE} USING delta LOCATION '{layer_path('gold', SKETCH_TABLE)}'")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{TOP_ITEMS_TABLE} USING delta LOCATION '{layer_path('gold', TOP_ITEMS_TABLE)}'")
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Number of orders (approximate)
+
+# COMMAND ----------
+
+display(approx_distinct(spark, "orders", grain, start_date, end_date))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Users who viewed each product (approximate)
+
+# COMMAND ----------
+
+display(approx_distinct(spark, "product_viewers", grain, start_date, end_date, by_dimension=True))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Sessions (approximate)
+
+# COMMAND ----------
+
+display(approx_distinct(spark, "sessions", grain, start_date, end_date))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Conversion Rate (approximate)
+# MAGIC Users with an order over users with a session.
+
+# COMMAND ----------
+
+print(approx_rate(spark, "buyers", "session_users", start_date, end_date))
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Shopping Cart Abandonment Rate (approximate)
+# MAGIC Share of users with a cart who never ordered, the definition of `gold.daily_funnel`; the sketches count users, not carts, and only orders of the selected days.
+
+# COMMAND ----------
+
+overlap = approx_overlap(spark, "cart_users", "buyers", start_date, end_date)
+print(overlap)
+if overlap["cart_users"]:
+    print("abandonment_rate:", 1 - overlap["overlap"] / overlap["cart_users"])
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Top-Selling Products (approximate)
+# MAGIC `weight` is a guaranteed lower bound on the quantity sold; the true quantity is at most `weight + max_error`.
+
+# COMMAND ----------
+
+display(approx_top(spark, "products_sold", 10, start_date, end_date))
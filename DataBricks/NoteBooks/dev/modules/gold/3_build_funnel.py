@@ -0,0 +1,29 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold cart funnel
+# MAGIC Maintains `gold.daily_funnel` (carts, cart users, converted and abandoned carts and the abandonment rate per cart date) and `gold.daily_abandoned_products` (abandoned carts and quantity per cart date and product) from the bronze `shopping_cart`, `orders` and `order_items` tables. A cart is abandoned when its user never placed an order, and its product is not purchased when the user never ordered that product, as in the original reports. The first run builds the tables in full; later runs read the change data feed of the sources and rewrite only the cart dates the changes touch (for a changed order, every cart date of its user). The abandonment reports in `setup/3_create_reports` and `setup/4_create_reports` read these tables.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.funnel import ABANDONED_TARGET, TARGET, refresh_funnel
+
+dbutils.widgets.dropdown("full_refresh", "false", ["true", "false"])
+
+full_refresh = dbutils.widgets.get("full_refresh") == "true"
+
+# COMMAND ----------
+
+# Refresh the funnel from the bronze change feeds
+print(refresh_funnel(spark, full=full_refresh))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{TARGET} USING delta LOCATION '{layer_path('gold', TARGET)}'")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{ABANDONED_TARGET} USING delta LOCATION '{layer_path('gold', ABANDONED_TARGET)}'")
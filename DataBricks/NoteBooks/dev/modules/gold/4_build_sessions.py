@@ -0,0 +1,39 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold sessions
+# MAGIC Builds sessions from the timestamped silver `page_visits` and `product_views` events: a user's event more than `gap_minutes` after the previous one starts a new session. Writes `gold.sessions` (one row per session), `gold.time_on_site` (sessions, seconds and page views per user and day) and `gold.pages_per_session` (pages and duration per session per day), all partitioned by session date. Leave the dates empty to rebuild everything; otherwise only the sessions starting between them are replaced. The time-spent and pages-per-session reports in `setup/3_create_reports` read these tables.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.sessionize import (
+    PAGES_PER_SESSION_TABLE,
+    SESSION_GAP_MINUTES,
+    SESSIONS_TABLE,
+    TIME_ON_SITE_TABLE,
+    refresh_sessions,
+)
+
+dbutils.widgets.text("start_date", "")
+dbutils.widgets.text("end_date", "")
+dbutils.widgets.text("gap_minutes", str(SESSION_GAP_MINUTES))
+
+start_date = dbutils.widgets.get("start_date") or None
+end_date = dbutils.widgets.get("end_date") or None
+gap_minutes = int(dbutils.widgets.get("gap_minutes"))
+
+# COMMAND ----------
+
+# Sessionize the events of the selected dates
+print(refresh_sessions(spark, start_date, end_date, gap_minutes))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+for table in (SESSIONS_TABLE, TIME_ON_SITE_TABLE, PAGES_PER_SESSION_TABLE):
+    spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{table} USING delta LOCATION '{layer_path('gold', table)}'")
@@ -0,0 +1,28 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold order lines
+# MAGIC Maintains `gold.order_lines`, one row per order item pre-joined with its order, user, store location, product, category and coupon, partitioned by `order_date`. The first run builds it in full; later runs read the change data feed of the bronze `orders`, `order_items`, `products`, `product_categories`, `users`, `stores` and `coupons` tables and MERGE only the order items the changes touch, including the category reassignments of `setup/4_create_reports`. The sales by category, top-selling products, most used coupons and sales by region reports read this table instead of joining the sources.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.order_lines import TARGET, refresh_order_lines
+
+dbutils.widgets.dropdown("full_refresh", "false", ["true", "false"])
+
+full_refresh = dbutils.widgets.get("full_refresh") == "true"
+
+# COMMAND ----------
+
+# Refresh the order lines from the bronze change feeds
+print(refresh_order_lines(spark, full=full_refresh))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{TARGET} USING delta LOCATION '{layer_path('gold', TARGET)}'")
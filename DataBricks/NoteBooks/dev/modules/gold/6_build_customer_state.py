@@ -0,0 +1,28 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Gold customer state
+# MAGIC Maintains `gold.customer_state` (total spent, order count, first and last order date and a repeat-buyer flag per user) from the bronze `orders` table. The first run builds it in full; later runs read the change data feed of `orders` and recompute only the users whose orders were added or changed. The customer lifetime value report in `setup/4_create_reports` and the customer retention report in `setup/3_create_reports` read this table.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.config import layer_path
+from ecomm_insights.customer_state import TARGET, refresh_customer_state
+
+dbutils.widgets.dropdown("full_refresh", "false", ["true", "false"])
+
+full_refresh = dbutils.widgets.get("full_refresh") == "true"
+
+# COMMAND ----------
+
+# Refresh the customer state from the orders change feed
+print(refresh_customer_state(spark, full=full_refresh))
+
+# COMMAND ----------
+
+spark.sql("use catalog `ecomm-app-insights-dev-westus-databricks-catalog`")
+spark.sql(f"CREATE TABLE IF NOT EXISTS gold.{TARGET} USING delta LOCATION '{layer_path('gold', TARGET)}'")
@@ -0,0 +1,55 @@
+# Databricks notebook source
+# MAGIC %md
+# MAGIC ###Clustering and statistics maintenance
+# MAGIC Picks clustering columns for every bronze and silver table from the join keys and filter columns of the reports in `setup/3_create_reports` and `setup/4_create_reports`. For each table it then:
+# MAGIC
+# MAGIC - keeps Delta file statistics on those columns (raising `delta.dataSkippingNumIndexedCols` when needed) and recomputes them on Databricks Runtime,
+# MAGIC - compacts and Z-orders the table on them,
+# MAGIC - collects column statistics.
+# MAGIC
+# MAGIC File counts and the share of files an equality lookup on each column can skip are measured before and after, and appended to `_maintenance_log` in each layer. The notebook is scheduled nightly by `Terraform/DataBricks/cdp-app-maintenance-job.json`.
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.maintenance import clustering_columns, run_maintenance
+
+dbutils.widgets.multiselect("layers", "bronze", ["bronze", "silver"])
+dbutils.widgets.text("tables", "")
+dbutils.widgets.dropdown("dry_run", "false", ["true", "false"])
+
+layers = dbutils.widgets.get("layers").split(",")
+tables = [name.strip() for name in dbutils.widgets.get("tables").split(",") if name.strip()] or None
+dry_run = dbutils.widgets.get("dry_run") == "true"
+
+# COMMAND ----------
+
+# Clustering columns chosen from the report joins and filters
+for table, columns in sorted(clustering_columns().items()):
+    print(table, columns)
+
+# COMMAND ----------
+
+results = run_maintenance(spark, layers, tables, dry_run=dry_run)
+display(
+    spark.createDataFrame(
+        [
+            {
+                "layer": result["layer"],
+                "table": result["table"],
+                "columns": ",".join(result["columns"]),
+                "files_before": result["files_before"],
+                "files_after": result.get("files_after"),
+                "skip_before": str(result["skip_before"]),
+                "skip_after": str(result.get("skip_after")),
+                "errors": str(result.get("errors") or ""),
+                "skipped": str(result.get("skipped") or ""),
+            }
+            for result in results
+        ]
+    )
+)
@@ -48,193 +48,41 @@ use schema `bronze`
 
 -- COMMAND ----------
 
--- Users table
-CREATE TABLE users (
-  user_id STRING,
-  username STRING,
-  password STRING,
-  email STRING,
-  created_at DATE
-)
-USING delta
-PARTITIONED BY (created_at)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/users';
-
--- COMMAND ----------
-
--- Products table
-CREATE TABLE products (
-  product_id STRING,
-  product_name STRING,
-  product_description STRING,
-  category_id STRING,
-  price DECIMAL(10, 2),
-  created_at DATE
-)
-USING delta
-PARTITIONED BY (created_at)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/products';
-
--- COMMAND ----------
-
-DESCRIBE TABLE product_categories
-
--- COMMAND ----------
-
--- Product Categories table
-CREATE TABLE product_categories (
-  category_id STRING,
-  category_name STRING
-)
-USING delta
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/product_categories';
-
--- COMMAND ----------
-
--- Add the new column
-ALTER TABLE product_categories ADD COLUMNS (category_groupname STRING);
-
--- COMMAND ----------
-
--- Shopping Cart table
-CREATE TABLE shopping_cart (
-  cart_id STRING,
-  user_id STRING,
-  product_id STRING,
-  quantity INT,
-  added_at DATE
-)
-USING delta
-PARTITIONED BY (added_at)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/shopping_cart';
-
--- COMMAND ----------
-
--- Orders table
-CREATE TABLE orders (
-  order_id STRING,
-  user_id STRING,
-  order_date DATE,
-  total DECIMAL(10, 2),
-  status STRING,
-  tracking_number STRING,
-  shipping_date DATE
-)
-USING delta
-PARTITIONED BY (order_date)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/orders';
-
--- COMMAND ----------
-
--- Order items table
-CREATE TABLE order_items (
-  order_item_id STRING,
-  order_id STRING,
-  product_id STRING,
-  quantity INT,
-  price DECIMAL(10, 2)
-)
-USING delta
-PARTITIONED BY (order_id)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/order_items';
-
--- COMMAND ----------
-
--- Payment table
-CREATE TABLE payments (
-  payment_id STRING,
-  order_id STRING,
-  user_id STRING,
-  amount DECIMAL(10, 2),
-  payment_date DATE,
-  payment_method STRING,
-  credit_card_id STRING
-)
-USING delta
-PARTITIONED BY (payment_date)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/payments';
-
--- COMMAND ----------
-
--- Credit Cards table
-CREATE TABLE credit_cards (
-  credit_card_id STRING,
-  user_id STRING,
-  card_number STRING,
-  expiry_date DATE,
-  cvv INT
-)
-USING delta
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/credit_cards';
-
--- COMMAND ----------
-
--- Coupons table
-CREATE TABLE coupons (
-  coupon_id STRING,
-  coupon_code STRING,
-  discount DECIMAL(10, 2),
-  expiry_date DATE
-)
-USING delta
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/coupons';
-
--- COMMAND ----------
-
--- Stores table
-CREATE TABLE stores (
-  store_id STRING,
-  store_name STRING,
-  store_location STRING
-)
-USING delta
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/stores';
-
--- COMMAND ----------
-
-CREATE TABLE order_history (
-  order_id STRING,
-  user_id STRING,
-  order_date DATE,
-  order_status STRING,
-  total_amount DECIMAL(10, 2)
-)
-USING delta
-PARTITIONED BY (order_date)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/order_history';
-
--- COMMAND ----------
-
-CREATE TABLE product_views (
-  view_id STRING,
-  user_id STRING,
-  product_id STRING,
-  viewed_at DATE
-)
-USING delta
-PARTITIONED BY (viewed_at)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/product_views';
+-- MAGIC %md
+-- MAGIC The bronze tables are created from the schema registry in `ecomm_insights.schemas`, which also provides the `StructType`s of the seed generator and the CSV loaders. Tables that already exist get the registry columns they are missing, so a column is added in one place for every writer. Existing tables whose column types or partitioning differ from the registry (the event tables used to have DATE columns partitioned by themselves) are first rewritten into the registry layout by `migrate_table`; `ensure_table` refuses to continue on a mismatch.
 
 -- COMMAND ----------
 
-CREATE TABLE user_sessions (
-  session_id STRING,
-  user_id STRING,
-  session_start DATE,
-  session_end DATE
-)
-USING delta
-PARTITIONED BY (session_start, session_end)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/user_sessions';
+-- MAGIC %python
+-- MAGIC import os
+-- MAGIC import sys
+-- MAGIC
+-- MAGIC sys.path.append(os.path.abspath(".."))
+-- MAGIC
+-- MAGIC from ecomm_insights.schemas import TABLES, create_table_ddl, ensure_table, migrate_table
+-- MAGIC
+-- MAGIC for table in TABLES:
+-- MAGIC     print(create_table_ddl(table), end="\n\n")
+-- MAGIC     # Event tables created with DATE columns partitioned by them get TIMESTAMPs and generated date partitions
+-- MAGIC     migrated = migrate_table(spark, table)
+-- MAGIC     if migrated:
+-- MAGIC         print(f"-- rewrote {table}: {'; '.join(migrated)}", end="\n\n")
+-- MAGIC     added = ensure_table(spark, table)
+-- MAGIC     if added:
+-- MAGIC         print(f"-- added to {table}: {', '.join(added)}", end="\n\n")
+-- MAGIC
+-- MAGIC from ecomm_insights.pii import PII_COLUMNS, tokenize_table
+-- MAGIC
+-- MAGIC # Tables loaded before tokenization still hold clear PII (and an INT cvv); tokens already in place are kept
+-- MAGIC for table in PII_COLUMNS:
+-- MAGIC     print(tokenize_table(spark, table))
 
 -- COMMAND ----------
 
-CREATE TABLE page_visits (
-  visit_id STRING,
-  user_id STRING,
-  page_url STRING,
-  visited_at DATE
-)
-USING delta
-PARTITIONED BY (visited_at)
-LOCATION 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/page_visits';
+-- MAGIC %python
+-- MAGIC from ecomm_insights.config import layer_path
+-- MAGIC from ecomm_insights.relayout import LAYOUTS, apply_layout
+-- MAGIC
+-- MAGIC # Cluster order items on their join key instead of one partition per order; a table still
+-- MAGIC # PARTITIONED BY (order_id) cannot be Z-ordered on it and is rewritten unpartitioned first
+-- MAGIC print(apply_layout(spark, layer_path("bronze", "order_items"), LAYOUTS["order_items"]["zorder"]))
@@ -3,377 +3,143 @@
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.user_name(), fake.password(), fake.email(), fake.date_between(start_date='-1y', end_date='today')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["user_id", "username", "password", "email", "created_at"])
-
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("created_at").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/users")
+# MAGIC %md
+# MAGIC ###Synthetic seed data
+# MAGIC The bronze tables are generated on the executors in chunks of `chunk_rows` rows. Every chunk is seeded from `seed`, the table name and the chunk position, so the same widgets always produce the same data no matter how many workers the cluster has. Each chunk reaches Spark as Arrow record batches of `batch_rows` rows (`mapInArrow`), so rows are never pickled one by one and executor memory stays bounded by one batch.
+# MAGIC
+# MAGIC Table sizes follow a TPC-style `scale_factor` (`SF1`, `SF10`, `SF100`, or fractions such as `0.01`). SF1 has 100,000 users; every other table is sized from its parent: 5 orders per user, 3 items and 1 payment per order, 2 cart rows and 1 credit card per user, and a catalog of 0.2 products per user. `SF0.01` reproduces the old 1,000-user toy dataset.
+# MAGIC
+# MAGIC Foreign keys (`orders.user_id`, `order_items.order_id`/`product_id`, `payments.order_id`, `products.category_id`, ...) point at rows of the parent tables generated with the same seed and scale factor, so every join in the reports matches. Users and products are drawn with Zipf skew (`user_skew`, `product_skew`; `0` is uniform) to reproduce heavy users and hot products. Set `referential` to `false` to get the old unmatched random keys.
+# MAGIC
+# MAGIC `users.password`, `credit_cards.card_number` and `credit_cards.cvv` are replaced by keyed HMAC-SHA256 tokens (`ecomm_insights.pii`) in the same pass that writes them, by the seed and the CSV loads alike, so clear values never reach bronze. Equal values get equal tokens, so joins on them still work. The key is the `pii-token-key` secret of the `ecomm-app-insights` scope. `pii_method` `pandas` hashes Arrow batches in a pandas UDF and reports the throughput of every column; `native` computes the same tokens with Spark's `sha2` but puts key-derived literals in the query plan.
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType, DecimalType
-from faker import Faker
 import datetime
+import os
+import sys
 
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.catch_phrase(), fake.text(), fake.uuid4(), fake.pydecimal(left_digits=5, right_digits=2, positive=True), fake.date_between(start_date='-1y', end_date='today')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["product_id", "product_name", "product_description", "category_id", "price", "created_at"])
-
-df = df.withColumn("price", df["price"].cast(DecimalType(10, 2)))
-
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("created_at").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/products")
-
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType
-from faker import Faker
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.catch_phrase()) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["category_id", "category_name"])
-
-# Write to Delta table
-df.write.format("delta").mode("append").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/product_categories")
-
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, IntegerType, DateType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.uuid4(), fake.uuid4(), fake.random_int(min=1, max=10), fake.date_between(start_date='-1y', end_date='today')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["cart_id", "user_id", "product_id", "quantity", "added_at"])
-
-df = df.withColumn("quantity", df["quantity"].cast(IntegerType()))
-
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("added_at").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/shopping_cart")
-
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType, DecimalType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.uuid4(), fake.date_between(start_date='-1y', end_date='today'), fake.pydecimal(left_digits=5, right_digits=2, positive=True), fake.random_element(elements=('Processing', 'Shipped', 'Delivered')), fake.uuid4(), fake.date_between(start_date='-1y', end_date='today')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["order_id", "user_id", "order_date", "total", "status", "tracking_number", "shipping_date"])
-
-df = df.withColumn("total", df["total"].cast(DecimalType(10, 2)))
-
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("order_date").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/orders")
-
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, IntegerType, DecimalType
-from faker import Faker
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.uuid4(), fake.uuid4(), fake.random_int(min=1, max=10), fake.pydecimal(left_digits=5, right_digits=2, positive=True)) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["order_item_id", "order_id", "product_id", "quantity", "price"])
-
-df = df.withColumn("quantity", df["quantity"].cast(IntegerType()))
-
-df = df.withColumn("price", df["price"].cast(DecimalType(10, 2)))
-
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("order_id").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/order_items")
-
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType, DecimalType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.uuid4(), fake.uuid4(), fake.pydecimal(left_digits=5, right_digits=2, positive=True), fake.date_between(start_date='-1y', end_date='today'), fake.random_element(elements=('Credit Card', 'Debit Card', 'PayPal')), fake.credit_card_number(card_type=None)) for _ in range(1000)]
+sys.path.append(os.path.abspath(".."))
 
-# Create DataFrame
-df = spark.createDataFrame(data, ["payment_id", "order_id", "user_id", "amount", "payment_date", "payment_method", "credit_card_id"])
+from ecomm_insights.seed_generator import (
+    DEFAULT_BATCH_ROWS,
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_PRODUCT_SKEW,
+    DEFAULT_SEED,
+    DEFAULT_USER_SKEW,
+    table_row_counts,
+)
+from ecomm_insights.session import ship_package
 
-df = df.withColumn("amount", df["amount"].cast(DecimalType(10, 2)))
+dbutils.widgets.combobox("scale_factor", "SF0.01", ["SF0.01", "SF1", "SF10", "SF100"])
+dbutils.widgets.text("seed", str(DEFAULT_SEED))
+dbutils.widgets.text("chunk_rows", str(DEFAULT_CHUNK_ROWS))
+dbutils.widgets.text("batch_rows", str(DEFAULT_BATCH_ROWS))
+dbutils.widgets.text("as_of", datetime.date.today().isoformat())
+dbutils.widgets.text("user_skew", str(DEFAULT_USER_SKEW))
+dbutils.widgets.text("product_skew", str(DEFAULT_PRODUCT_SKEW))
+dbutils.widgets.dropdown("referential", "true", ["true", "false"])
 
-# Write to Delta table
-df.write.format("delta").mode("append").partitionBy("payment_date").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/payments")
+row_counts = table_row_counts(dbutils.widgets.get("scale_factor"))
+seed = int(dbutils.widgets.get("seed"))
+chunk_rows = int(dbutils.widgets.get("chunk_rows"))
+as_of = datetime.date.fromisoformat(dbutils.widgets.get("as_of"))
+options = {
+    "user_skew": float(dbutils.widgets.get("user_skew")),
+    "product_skew": float(dbutils.widgets.get("product_skew")),
+    "referential": dbutils.widgets.get("referential") == "true",
+    "batch_rows": int(dbutils.widgets.get("batch_rows")),
+}
 
-# COMMAND ----------
-
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType, IntegerType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
+# Make the generator importable inside executor tasks
+ship_package(spark)
 
-# Generate 1000 records
-data = [(fake.uuid4(), fake.uuid4(), fake.credit_card_number(card_type=None), fake.date_between(start_date='today', end_date='+5y'), fake.random_int(min=100, max=999)) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["credit_card_id", "user_id", "card_number", "expiry_date", "cvv"])
-
-# Write to Delta table
-df.write.format("delta").mode("append").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/credit_cards")
+print(row_counts)
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType, DateType, DecimalType
-from faker import Faker
-import datetime
-
-# Initialize Faker
-fake = Faker()
-
-# Generate 1000 records
-data = [(fake.uuid4(), fake.lexify(text='????????', letters='ABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890'), fake.pydecimal(left_digits=2, right_digits=2, positive=True), fake.date_between(start_date='today', end_date='+1y')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["coupon_id", "coupon_code", "discount", "expiry_date"])
-
-df = df.withColumn("discount", df["discount"].cast(DecimalType(10, 2)))
-
-# Write to Delta table
-df.write.format("delta").mode("append").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/coupons")
+# MAGIC %md
+# MAGIC ###Query metrics
+# MAGIC `enable_query_metrics` records the duration, files, bytes and partitions read, shuffle, spill and task skew of every query this notebook runs. The load queries are tagged with their task name (`seed:<table>`, `csv:<table>`); the records are appended to `gold/_query_metrics` after the load.
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import lit, rand
-from pyspark.sql.types import StringType
-from faker import Faker
-
-# Initialize Faker
-fake = Faker()
+from ecomm_insights.query_metrics import create_summary_view, enable_query_metrics
 
-# Generate 1000 records
-data = [(fake.uuid4(), fake.company(), fake.address().replace('\n', ', ')) for _ in range(1000)]
-
-# Create DataFrame
-df = spark.createDataFrame(data, ["store_id", "store_name", "store_location"])
-
-# Write to Delta table
-df.write.format("delta").mode("append").save("abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/stores")
+query_metrics = enable_query_metrics(spark)
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, DateType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/users/Ecommerce_Users.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("user_id", StringType(), True),
-    StructField("username", StringType(), True),
-    StructField("password", StringType(), True),
-    StructField("email", StringType(), True),
-    StructField("created_at", DateType(), True)
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
-
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/users"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").partitionBy("created_at").save(delta_table_path)
-
-
+# MAGIC %md
+# MAGIC ###CSV loads
+# MAGIC Each loader lists the CSV files under `abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/<entity>/` and compares them with the `_ingest_manifest` Delta table on path, size and modification time. `load_mode` selects how new or changed files are written:
+# MAGIC
+# MAGIC - `merge`: upsert their rows on the table key (default)
+# MAGIC - `append`: append their rows
+# MAGIC - `full`: re-read every file and overwrite the table, as the loaders used to
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, DecimalType, DateType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/products/Ecommerce_Products.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("product_id", StringType(), True),
-    StructField("product_name", StringType(), True),
-    StructField("product_description", StringType(), True),
-    StructField("category_id", StringType(), True),
-    StructField("price", DecimalType(10, 2), True),
-    StructField("created_at", DateType(), True)
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
+from ecomm_insights.ingest import MODES
 
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/products"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").partitionBy("created_at").save(delta_table_path)
+from ecomm_insights.pii import DEFAULT_METHOD, METHODS
 
+dbutils.widgets.dropdown("load_mode", "merge", list(MODES))
+dbutils.widgets.dropdown("pii_method", DEFAULT_METHOD, list(METHODS))
 
+load_mode = dbutils.widgets.get("load_mode")
+pii_method = dbutils.widgets.get("pii_method")
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/categories/Ecommerce_Categories.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("category_id", StringType(), True),
-    StructField("category_name", StringType(), True),
-    StructField("category_groupname", StringType(), True)  # Including the additional column to load it but will not use it in the table
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
-
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/product_categories"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").save(delta_table_path)
+# MAGIC %md
+# MAGIC ###Parallel load
+# MAGIC Every generated table and every CSV load is a task of one dependency graph (`ecomm_insights.loader`). The generated tables do not depend on each other, so they run concurrently on a pool of `max_workers` driver threads sharing this SparkSession, each in its own scheduler pool. A CSV load waits only for the generation of its own table, since both write the same Delta table. Failed tasks are retried `retries` times, and the tasks that depend on them are skipped.
+# MAGIC
+# MAGIC `Terraform/DataBricks/cdp-app-create-multitask-job.json` runs the same graph as a Databricks multi-task job through `setup/load_table`.
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DateType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/shopping_cart/Ecommerce_Shopping_Cart.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("cart_id", StringType(), True),
-    StructField("user_id", StringType(), True),
-    StructField("product_id", StringType(), True),
-    StructField("quantity", IntegerType(), True),
-    StructField("added_at", DateType(), True)
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
-
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/shopping_cart"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").partitionBy("added_at").save(delta_table_path)
-
+from ecomm_insights.loader import load_tasks
+from ecomm_insights.orchestrator import DEFAULT_MAX_WORKERS, DEFAULT_RETRIES, run_tasks, summary
 
+dbutils.widgets.text("max_workers", str(DEFAULT_MAX_WORKERS))
+dbutils.widgets.text("retries", str(DEFAULT_RETRIES))
 
+tasks = load_tasks(spark, row_counts, seed, chunk_rows, as_of, load_mode, pii_method=pii_method, **options)
+results = run_tasks(
+    tasks, spark, max_workers=int(dbutils.widgets.get("max_workers")), retries=int(dbutils.widgets.get("retries"))
+)
+print(f"{query_metrics.flush()} queries recorded")
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, DecimalType, DateType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/orders/Ecommerce_Orders.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("order_id", StringType(), True),
-    StructField("user_id", StringType(), True),
-    StructField("order_date", DateType(), True),
-    StructField("total", DecimalType(10, 2), True),
-    StructField("status", StringType(), True),
-    StructField("tracking_number", StringType(), True),
-    StructField("shipping_date", DateType(), True)
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
-
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/orders"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").partitionBy("order_date").save(delta_table_path)
-
-
+# Slowest and most expensive load tasks today
+display(
+    create_summary_view(spark, name="query_metrics_summary", temporary=True)
+    .where("run_date = current_date()")
+    .orderBy("time_rank")
+)
 
 # COMMAND ----------
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DecimalType
-
-# Define the ADLS file path for the CSV file
-file_path = 'abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/data/order_items/Ecommerce_Order_Items.csv'
-
-# Define the schema explicitly to avoid conflicts
-schema = StructType([
-    StructField("order_item_id", StringType(), True),
-    StructField("order_id", StringType(), True),
-    StructField("product_id", StringType(), True),
-    StructField("quantity", IntegerType(), True),
-    StructField("price", DecimalType(10, 2), True)
-])
-
-# Load the CSV file into a DataFrame with the defined schema
-df = spark.read.schema(schema).csv(file_path, header=True)
-
-# Define the Delta table path
-delta_table_path = "abfss://bronze@ecommappinsightsdevadls.dfs.core.windows.net/order_items"
-
-# Write the DataFrame to the Delta table
-df.write.format("delta").mode("overwrite").partitionBy("order_id").save(delta_table_path)
+# Per-table timings; wall_seconds close to slowest_seconds means the loads overlapped
+display(
+    spark.createDataFrame(
+        [(result.name, result.status, result.attempts, result.seconds, result.error) for result in results],
+        "task STRING, status STRING, attempts INT, seconds DOUBLE, error STRING",
+    )
+)
+# Tokenization throughput per PII column, measured inside the load itself
+pii = [
+    (result.name, column, stats["rows"], stats["seconds"], stats["rows_per_s"])
+    for result in results
+    if isinstance(result.result, dict)
+    for column, stats in result.result.get("pii", {}).items()
+]
+if pii:
+    display(spark.createDataFrame(pii, "task STRING, column STRING, rows LONG, seconds DOUBLE, rows_per_s DOUBLE"))
+run = summary(results)
+print(run)
+if run["failed"] or run["skipped"]:
+    raise RuntimeError(f"Load tasks failed: {run['failed']}, skipped: {run['skipped']}")
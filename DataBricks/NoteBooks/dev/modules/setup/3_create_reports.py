@@ -1,6 +1,10 @@
 # Databricks notebook source
 # MAGIC %md
 # MAGIC Sales Reports: These reports provide insights into total sales, sales by product category, sales by region, daily or monthly sales, etc. They help in understanding which products are performing well and which are not.
+# MAGIC
+# MAGIC The total, category, daily and monthly reports read the `gold.daily_sales` and `gold.daily_category_sales` aggregates maintained by `gold/1_build_sales_aggregates`; run it first to pick up new orders.
+# MAGIC
+# MAGIC Approximate versions of the distinct-count and top-N reports, answered from per-day sketches, are in `gold/2_build_sketches`.
 
 # COMMAND ----------
 
@@ -9,8 +13,32 @@
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC The reports read the deduplicated, compacted silver tables built by `silver/1_build_silver`.
+
+# COMMAND ----------
+
 # MAGIC %sql
-# MAGIC use schema `bronze`
+# MAGIC use schema `silver`
+
+# COMMAND ----------
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.dimensions import DimensionCache
+
+# products, product_categories and stores are read once and broadcast to the report joins below;
+# dimensions.refresh() reloads the ones whose silver table has a new version since
+dimensions = DimensionCache(spark)
+print(dimensions.register("silver"))
+
+from ecomm_insights.query_metrics import create_summary_view, enable_query_metrics
+
+# Record duration, bytes read, pruning, shuffle, spill and skew of every report query; flushed at the end
+query_metrics = enable_query_metrics(spark)
 
 # COMMAND ----------
 
@@ -31,8 +59,8 @@
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT SUM(oi.price * oi.quantity) AS total_sales
-# MAGIC FROM order_items oi;
+# MAGIC SELECT SUM(total_sales) AS total_sales
+# MAGIC FROM gold.daily_sales;
 
 # COMMAND ----------
 
@@ -42,26 +70,23 @@
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT pc.category_name, SUM(oi.price * oi.quantity) AS total_sales
-# MAGIC FROM order_items oi
-# MAGIC JOIN products p ON oi.product_id = p.product_id
-# MAGIC JOIN product_categories pc ON p.category_id = pc.category_id
-# MAGIC GROUP BY pc.category_name;
+# MAGIC SELECT category_name, SUM(total_sales) AS total_sales
+# MAGIC FROM gold.daily_category_sales
+# MAGIC WHERE category_id IS NOT NULL
+# MAGIC GROUP BY category_name;
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC ###Sales by Region Report: This report gives the total sales amount for each store location (assuming store location is equivalent to region).
+# MAGIC ###Sales by Region Report: This report gives the total sales amount for each store location (assuming store location is equivalent to region), from the pre-joined `gold.order_lines` (maintained by `gold/5_build_order_lines`).
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT s.store_location, SUM(oi.price * oi.quantity) AS total_sales
-# MAGIC FROM order_items oi
-# MAGIC JOIN orders o ON oi.order_id = o.order_id
-# MAGIC JOIN users u ON o.user_id = u.user_id
-# MAGIC JOIN stores s ON u.user_id = s.store_id
-# MAGIC GROUP BY s.store_location;
+# MAGIC SELECT store_location, SUM(sales) AS total_sales
+# MAGIC FROM gold.order_lines
+# MAGIC WHERE store_location IS NOT NULL AND username IS NOT NULL
+# MAGIC GROUP BY store_location;
 
 # COMMAND ----------
 
@@ -71,11 +96,9 @@
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT DATE(o.order_date) AS sale_date, SUM(oi.price * oi.quantity) AS total_sales
-# MAGIC FROM order_items oi
-# MAGIC JOIN orders o ON oi.order_id = o.order_id
-# MAGIC GROUP BY DATE(o.order_date)
-# MAGIC ORDER BY DATE(o.order_date) DESC;
+# MAGIC SELECT order_date AS sale_date, total_sales
+# MAGIC FROM gold.daily_sales
+# MAGIC ORDER BY order_date DESC;
 
 # COMMAND ----------
 
@@ -85,11 +108,34 @@
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT CONCAT(EXTRACT(YEAR FROM o.order_date), '-', LPAD(EXTRACT(MONTH FROM o.order_date), 2, '0')) AS sale_month, SUM(oi.price * oi.quantity) AS total_sales
-# MAGIC FROM order_items oi
-# MAGIC JOIN orders o ON oi.order_id = o.order_id
-# MAGIC GROUP BY CONCAT(EXTRACT(YEAR FROM o.order_date), '-', LPAD(EXTRACT(MONTH FROM o.order_date), 2, '0'))
-# MAGIC ORDER BY CONCAT(EXTRACT(YEAR FROM o.order_date), '-', LPAD(EXTRACT(MONTH FROM o.order_date), 2, '0')) DESC;
+# MAGIC SELECT DATE_FORMAT(order_date, 'yyyy-MM') AS sale_month, SUM(total_sales) AS total_sales
+# MAGIC FROM gold.daily_sales
+# MAGIC GROUP BY DATE_FORMAT(order_date, 'yyyy-MM')
+# MAGIC ORDER BY sale_month DESC;
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Date-window sales reports
+# MAGIC The sales trend, daily and monthly sales reports restricted to `window_start`..`window_end` (the last 7 days by default). The window is applied to the raw `order_date` column, so Delta reads only the date partitions in it; the period grouping uses `DATE_TRUNC` after the filter. Each run checks the executed plan and fails if a scan of a date-partitioned table read more partitions than the window has days.
+
+# COMMAND ----------
+
+from ecomm_insights.report_windows import GRAINS, last_days, run_window_report
+
+default_start, default_end = last_days(7)
+dbutils.widgets.text("window_start", default_start.isoformat())
+dbutils.widgets.text("window_end", default_end.isoformat())
+dbutils.widgets.dropdown("grain", "report", ["report", *GRAINS])
+
+window_start = dbutils.widgets.get("window_start")
+window_end = dbutils.widgets.get("window_end")
+grain = None if dbutils.widgets.get("grain") == "report" else dbutils.widgets.get("grain")
+
+for name in ("Sales Reports", "Daily Sales Report", "Monthly Sales Report"):
+    result, scans = run_window_report(spark, name, window_start, window_end, grain)
+    print(name, [(scan["node"], scan["partitions"], scan["pruned"]) for scan in scans])
+    display(result)
 
 # COMMAND ----------
 
@@ -124,27 +170,31 @@
 
 # MAGIC %md
 # MAGIC ###Products Added to Cart But Not Purchased Report: This report gives the products that were added to the cart but not purchased.
+# MAGIC It reads `gold.daily_abandoned_products`, maintained by `gold/3_build_funnel`; a cart counts as not purchased when its user never ordered the product.
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT p.product_id, p.product_name
-# MAGIC FROM shopping_cart sc
-# MAGIC LEFT JOIN orders o ON sc.user_id = o.user_id AND sc.product_id = o.product_id
-# MAGIC JOIN products p ON sc.product_id = p.product_id
-# MAGIC WHERE o.order_id IS NULL;
+# MAGIC SELECT p.product_id, p.product_name,
+# MAGIC        SUM(a.abandoned_carts) AS abandoned_carts,
+# MAGIC        SUM(a.abandoned_quantity) AS abandoned_quantity
+# MAGIC FROM gold.daily_abandoned_products a
+# MAGIC JOIN products p ON a.product_id = p.product_id
+# MAGIC GROUP BY p.product_id, p.product_name
+# MAGIC ORDER BY abandoned_carts DESC;
 
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC ###Time Spent on the Website Report: This report gives the time spent on the website. You can use the user_sessions table to track this.
+# MAGIC ###Time Spent on the Website Report: This report gives the time spent on the website.
+# MAGIC It reads `gold.time_on_site`, built by `gold/4_build_sessions` from the timestamped page visits and product views.
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT us.user_id, SUM(DATEDIFF(MINUTE, us.session_start, us.session_end)) as total_time_spent
-# MAGIC FROM user_sessions us
-# MAGIC GROUP BY us.user_id;
+# MAGIC SELECT user_id, SUM(seconds) / 60 AS total_time_spent
+# MAGIC FROM gold.time_on_site
+# MAGIC GROUP BY user_id;
 
 # COMMAND ----------
 
@@ -161,6 +211,18 @@
 
 # COMMAND ----------
 
+# MAGIC %md
+# MAGIC ###Pages per Session Report: This report gives the number of pages and the time per session for each day.
+
+# COMMAND ----------
+
+# MAGIC %sql
+# MAGIC SELECT session_date, sessions, avg_pages, median_pages, p90_pages, avg_seconds / 60 AS avg_minutes
+# MAGIC FROM gold.pages_per_session
+# MAGIC ORDER BY session_date DESC;
+
+# COMMAND ----------
+
 # MAGIC %md
 # MAGIC Inventory Reports: These reports provide information about the stock levels of different products. They can help in identifying which products are about to run out of stock and which products are overstocked.
 
@@ -231,16 +293,15 @@
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Customer Retention Reports: These reports analyze the retention rate of customers, i.e., the percentage of customers who make repeat purchases. They can help in understanding customer loyalty and identifying ways to improve customer retention.
+# MAGIC Customer Retention Reports: These reports analyze the retention rate of customers, i.e., the percentage of customers who make repeat purchases. They can help in understanding customer loyalty and identifying ways to improve customer retention. The order counts come from `gold.customer_state`, which `gold/6_build_customer_state` keeps current from the orders change feed.
 
 # COMMAND ----------
 
 # MAGIC %sql
-# MAGIC SELECT user_id, 
-# MAGIC        COUNT(DISTINCT order_id) AS number_of_orders
-# MAGIC FROM order_history
-# MAGIC GROUP BY user_id
-# MAGIC HAVING COUNT(DISTINCT order_id) > 1;
+# MAGIC SELECT user_id,
+# MAGIC        order_count AS number_of_orders
+# MAGIC FROM gold.customer_state
+# MAGIC WHERE repeat_buyer;
 
 # COMMAND ----------
 
@@ -271,3 +332,30 @@
 # MAGIC        DATEDIFF(day, order_date, shipping_date) AS fulfillment_days
 # MAGIC FROM order_history 
 # MAGIC JOIN shipping ON order_history.order_id = shipping.order_id;
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC Dashboards re-run the reports above many times between table updates. `ResultCache` keeps each report result keyed on its SQL and the Delta versions of the tables it reads, so a repeated run costs a version lookup until one of those tables changes. Any report of this notebook or `4_create_reports` can be run through it by name.
+
+# COMMAND ----------
+
+from ecomm_insights.result_cache import ResultCache
+
+results = ResultCache(spark)
+for name in ("Daily Sales Report", "Customer Lifetime Value (CLV)"):
+    with query_metrics.tag(name):
+        display(results.report(name))
+results.flush()
+print(results.stats())
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Query metrics
+# MAGIC Every query of this notebook was recorded by `enable_query_metrics`. `%sql` cells are tagged with their statement, queries inside `query_metrics.tag(name)` with `name`. The records are appended to `gold/_query_metrics`; `gold.query_metrics_summary` ranks the tags of each day by time (`time_rank`) and by bytes read and shuffled (`cost_rank`).
+
+# COMMAND ----------
+
+print(f"{query_metrics.flush()} queries recorded")
+display(create_summary_view(spark).where("run_date = current_date()").orderBy("time_rank"))
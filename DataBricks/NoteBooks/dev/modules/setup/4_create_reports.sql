@@ -7,6 +7,25 @@ use schema `bronze`
 
 -- COMMAND ----------
 
+-- MAGIC %python
+-- MAGIC import os
+-- MAGIC import sys
+-- MAGIC
+-- MAGIC sys.path.append(os.path.abspath(".."))
+-- MAGIC
+-- MAGIC from ecomm_insights.dimensions import DimensionCache
+-- MAGIC
+-- MAGIC # products, product_categories and stores are read once and broadcast to the report joins below
+-- MAGIC dimensions = DimensionCache(spark)
+-- MAGIC print(dimensions.register("bronze"))
+-- MAGIC
+-- MAGIC from ecomm_insights.query_metrics import create_summary_view, enable_query_metrics
+-- MAGIC
+-- MAGIC # Record duration, bytes read, pruning, shuffle, spill and skew of every report query; flushed at the end
+-- MAGIC query_metrics = enable_query_metrics(spark)
+
+-- COMMAND ----------
+
 SHOW TABLES IN bronze
 
 -- COMMAND ----------
@@ -28,61 +47,29 @@ ORDER BY created_at;
 
 -- MAGIC %md
 -- MAGIC ###Sales by Product Category
--- MAGIC This report shows the total sales amount for each product category.
+-- MAGIC This report shows the total sales amount for each product category, from `gold.order_lines` (maintained by `gold/5_build_order_lines`).
 
 -- COMMAND ----------
 
 SELECT
-  pc.category_name,
-  SUM(oi.price * oi.quantity) AS total_sales
-FROM order_items oi
-JOIN products p ON oi.product_id = p.product_id
-JOIN product_categories pc ON p.category_id = pc.category_id
-GROUP BY pc.category_name
+  category_name,
+  SUM(sales) AS total_sales
+FROM gold.order_lines
+WHERE category_name IS NOT NULL
+GROUP BY category_name
 ORDER BY total_sales DESC;
 
 -- COMMAND ----------
 
--- Creating a temporary table for a random category
-CREATE OR REPLACE TEMP VIEW random_category AS
-SELECT category_id
-FROM product_categories
-ORDER BY RAND()
-LIMIT 1;
-
-
--- COMMAND ----------
-
--- Creating a temporary table for random product IDs
-CREATE OR REPLACE TEMP VIEW random_products AS
-SELECT product_id
-FROM products
-ORDER BY RAND()
-LIMIT 150;
-
-
--- COMMAND ----------
-
--- Create a view with updated category_id for selected product_ids
-CREATE OR REPLACE TEMP VIEW updated_products AS
-SELECT
-  p.product_id,
-  rc.category_id
-FROM
-  products p
-JOIN
-  random_products rp
-  ON p.product_id = rp.product_id
-CROSS JOIN
-  random_category rc;
-
--- Update the products table using the updated_products view
-MERGE INTO products AS p
-USING updated_products AS u
-ON p.product_id = u.product_id
-WHEN MATCHED THEN
-UPDATE SET
-  p.category_id = u.category_id;
+-- MAGIC %python
+-- MAGIC from ecomm_insights.config import layer_path
+-- MAGIC from ecomm_insights.reassign import reassign, sample_values
+-- MAGIC
+-- MAGIC # Move 150 random products into one random category
+-- MAGIC random_category = sample_values(spark.table("product_categories"), "category_id", 1)
+-- MAGIC print(reassign(spark, layer_path("bronze", "products"), "product_id", "category_id", random_category, 150))
+-- MAGIC # Reload the cached products dimension at the new version
+-- MAGIC print(dimensions.refresh())
 
 
 -- COMMAND ----------
@@ -111,65 +98,15 @@ FROM product_categories pc
 
 -- COMMAND ----------
 
--- Creating a temporary view for random product IDs
-CREATE OR REPLACE TEMP VIEW random_products AS
-SELECT product_id
-FROM products
-ORDER BY RAND()
-LIMIT 5;
-
-
--- COMMAND ----------
-
-select * from random_products
-
--- COMMAND ----------
-
--- Creating a temporary view with row numbers for random product IDs
-CREATE OR REPLACE TEMP VIEW random_products_with_row_num AS
-SELECT product_id, ROW_NUMBER() OVER (ORDER BY product_id) AS row_num
-FROM random_products;
-
--- Creating a temporary view with row numbers for order items to be updated
-CREATE OR REPLACE TEMP VIEW order_items_with_row_num AS
-SELECT order_item_id, ROW_NUMBER() OVER (ORDER BY order_item_id) AS row_num
-FROM order_items
-ORDER BY RAND()
-LIMIT 5;
-
-
--- COMMAND ----------
-
-select * from random_products_with_row_num
-
--- COMMAND ----------
-
-select * from order_items_with_row_num
-
--- COMMAND ----------
-
--- Creating a temporary view to map random product IDs to order item IDs
-CREATE OR REPLACE TEMP VIEW order_items_to_update AS
-SELECT 
-  oi.order_item_id,
-  rp.product_id
-FROM 
-  order_items_with_row_num oi
-JOIN
-  random_products_with_row_num rp
-ON
-  oi.row_num = rp.row_num;
-
-
--- COMMAND ----------
-
--- Updating the order_items table using the order_items_to_update view
-MERGE INTO order_items AS oi
-USING order_items_to_update AS ou
-ON oi.order_item_id = ou.order_item_id
-WHEN MATCHED THEN
-UPDATE SET
-  oi.product_id = ou.product_id;
+-- MAGIC %python
+-- MAGIC # Point 5 random order items at 5 random products
+-- MAGIC random_products = sample_values(spark.table("products"), "product_id", 5)
+-- MAGIC print(reassign(spark, layer_path("bronze", "order_items"), "order_item_id", "product_id", random_products, 5))
+-- MAGIC
+-- MAGIC from ecomm_insights.order_lines import refresh_order_lines
+-- MAGIC
+-- MAGIC # MERGE the reassigned products and order items into gold.order_lines
+-- MAGIC print(refresh_order_lines(spark))
 
 
 -- COMMAND ----------
@@ -181,11 +118,11 @@ UPDATE SET
 -- COMMAND ----------
 
 SELECT
-  p.product_name,
-  SUM(oi.quantity) AS total_quantity
-FROM order_items oi
-JOIN products p ON oi.product_id = p.product_id
-GROUP BY p.product_name
+  product_name,
+  SUM(quantity) AS total_quantity
+FROM gold.order_lines
+WHERE product_name IS NOT NULL
+GROUP BY product_name
 ORDER BY total_quantity DESC
 LIMIT 10;
 
@@ -193,17 +130,16 @@ LIMIT 10;
 
 -- MAGIC %md
 -- MAGIC ###Customer Lifetime Value (CLV)
--- MAGIC This report calculates the total amount spent by each customer.
+-- MAGIC This report calculates the total amount spent by each customer, from the per-user totals of `gold.customer_state` (maintained by `gold/6_build_customer_state`).
 
 -- COMMAND ----------
 
 SELECT
   u.user_id,
   u.username,
-  SUM(o.total) AS total_spent
+  c.total_spent
 FROM users u
-JOIN orders o ON u.user_id = o.user_id
-GROUP BY u.user_id, u.username
+JOIN gold.customer_state c ON u.user_id = c.user_id
 ORDER BY total_spent DESC;
 
 -- COMMAND ----------
@@ -236,6 +172,29 @@ ORDER BY order_date;
 
 -- COMMAND ----------
 
+-- MAGIC %md
+-- MAGIC ###Date-window growth and revenue
+-- MAGIC User Growth Over Time and Revenue Over Time restricted to `window_start`..`window_end` (the last 7 days by default). The window filters the raw `created_at`/`order_date` partition columns, so only the partitions in it are read; the run fails if the executed plan read more.
+
+-- COMMAND ----------
+
+-- MAGIC %python
+-- MAGIC from ecomm_insights.report_windows import GRAINS, last_days, run_window_report
+-- MAGIC
+-- MAGIC default_start, default_end = last_days(7)
+-- MAGIC dbutils.widgets.text("window_start", default_start.isoformat())
+-- MAGIC dbutils.widgets.text("window_end", default_end.isoformat())
+-- MAGIC dbutils.widgets.dropdown("grain", "day", list(GRAINS))
+-- MAGIC
+-- MAGIC for name in ("User Growth Over Time", "Revenue Over Time"):
+-- MAGIC     result, scans = run_window_report(
+-- MAGIC         spark, name, dbutils.widgets.get("window_start"), dbutils.widgets.get("window_end"), dbutils.widgets.get("grain")
+-- MAGIC     )
+-- MAGIC     print(name, [(scan["node"], scan["partitions"], scan["pruned"]) for scan in scans])
+-- MAGIC     display(result)
+
+-- COMMAND ----------
+
 -- MAGIC %md
 -- MAGIC ###Product Views by User
 -- MAGIC This report shows the number of times each user viewed products.
@@ -279,33 +238,34 @@ ORDER BY total_views DESC;
 -- COMMAND ----------
 
 SELECT
-  c.coupon_code,
-  COUNT(o.order_id) AS usage_count,
-  SUM(c.discount) AS total_discount
-FROM orders o
-JOIN order_items oi ON o.order_id = oi.order_id
-JOIN products p ON oi.product_id = p.product_id
-JOIN coupons c ON p.product_id = c.coupon_id
-GROUP BY c.coupon_code
+  coupon_code,
+  COUNT(order_id) AS usage_count,
+  SUM(coupon_discount) AS total_discount
+FROM gold.order_lines
+WHERE coupon_code IS NOT NULL
+GROUP BY coupon_code
 ORDER BY usage_count DESC, total_discount DESC;
 
 -- COMMAND ----------
 
 -- MAGIC %md
 -- MAGIC ###Shopping Cart Abandonment Rate
--- MAGIC This report calculates the shopping cart abandonment rate.
+-- MAGIC This report calculates the shopping cart abandonment rate from `gold.daily_funnel`, maintained by `gold/3_build_funnel`. A cart is abandoned when its user never placed an order; `gold/2_build_sketches` estimates the same rate per user instead of per cart.
+
+-- COMMAND ----------
+
+SELECT
+  SUM(abandoned_carts) / SUM(carts) * 100 AS abandonment_rate
+FROM gold.daily_funnel;
+
+-- COMMAND ----------
+
+-- MAGIC %md
+-- MAGIC ###Query metrics
+-- MAGIC Appends the metrics of the report queries above to `gold/_query_metrics` and lists today's slowest and most expensive ones from `gold.query_metrics_summary`.
 
 -- COMMAND ----------
 
 -- MAGIC %python
--- MAGIC WITH carts AS (
--- MAGIC   SELECT DISTINCT cart_id, user_id FROM shopping_cart
--- MAGIC ),
--- MAGIC carts_with_orders AS (
--- MAGIC   SELECT DISTINCT sc.cart_id
--- MAGIC   FROM shopping_cart sc
--- MAGIC   JOIN orders o ON sc.user_id = o.user_id
--- MAGIC )
--- MAGIC SELECT
--- MAGIC   (SELECT COUNT(*) FROM carts WHERE cart_id NOT IN (SELECT cart_id FROM carts_with_orders)) / (SELECT COUNT(*) FROM carts) * 100 AS abandonment_rate;
--- MAGIC
+-- MAGIC print(f"{query_metrics.flush()} queries recorded")
+-- MAGIC display(create_summary_view(spark).where("run_date = current_date()").orderBy("time_rank"))
@@ -0,0 +1,68 @@
+# Databricks notebook source
+# MAGIC %pip install faker
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ###Load one bronze table
+# MAGIC Runs a single task of the load graph in `2_seed_data`: `step` `seed` generates `table` on the executors and appends it to its Delta table, `csv` loads its new and changed CSV files; PII columns are tokenized either way. Used by the tasks of `Terraform/DataBricks/cdp-app-create-multitask-job.json`, which declares the same dependencies as `ecomm_insights.loader`; every task of one job run must get the same `as_of`.
+
+# COMMAND ----------
+
+import datetime
+import os
+import sys
+
+sys.path.append(os.path.abspath(".."))
+
+from ecomm_insights.ingest import MODES, SOURCES, ingest_csv
+from ecomm_insights.loader import seed_table
+from ecomm_insights.pii import DEFAULT_METHOD, METHODS
+from ecomm_insights.seed_generator import (
+    DEFAULT_CHUNK_ROWS,
+    DEFAULT_PRODUCT_SKEW,
+    DEFAULT_SEED,
+    DEFAULT_USER_SKEW,
+    TABLES,
+    table_row_counts,
+)
+from ecomm_insights.session import ship_package
+
+dbutils.widgets.dropdown("step", "seed", ["seed", "csv"])
+dbutils.widgets.dropdown("table", "users", sorted(set(TABLES) | set(SOURCES)))
+dbutils.widgets.combobox("scale_factor", "SF0.01", ["SF0.01", "SF1", "SF10", "SF100"])
+dbutils.widgets.text("seed", str(DEFAULT_SEED))
+dbutils.widgets.text("chunk_rows", str(DEFAULT_CHUNK_ROWS))
+dbutils.widgets.text("as_of", datetime.date.today().isoformat())
+# Same value for every attempt of a job run, so a retried seed append is not committed twice
+dbutils.widgets.text("txn_version", "")
+dbutils.widgets.text("user_skew", str(DEFAULT_USER_SKEW))
+dbutils.widgets.text("product_skew", str(DEFAULT_PRODUCT_SKEW))
+dbutils.widgets.dropdown("referential", "true", ["true", "false"])
+dbutils.widgets.dropdown("load_mode", "merge", list(MODES))
+dbutils.widgets.dropdown("pii_method", DEFAULT_METHOD, list(METHODS))
+
+step = dbutils.widgets.get("step")
+table = dbutils.widgets.get("table")
+
+# COMMAND ----------
+
+if step == "seed":
+    # Make the generator importable inside executor tasks
+    ship_package(spark)
+    result = seed_table(
+        spark,
+        table,
+        table_row_counts(dbutils.widgets.get("scale_factor")),
+        int(dbutils.widgets.get("seed")),
+        int(dbutils.widgets.get("chunk_rows")),
+        datetime.date.fromisoformat(dbutils.widgets.get("as_of")),
+        dbutils.widgets.get("pii_method"),
+        int(dbutils.widgets.get("txn_version") or 0) or None,
+        user_skew=float(dbutils.widgets.get("user_skew")),
+        product_skew=float(dbutils.widgets.get("product_skew")),
+        referential=dbutils.widgets.get("referential") == "true",
+    )
+else:
+    result = ingest_csv(spark, table, dbutils.widgets.get("load_mode"), pii_method=dbutils.widgets.get("pii_method"))
+print(result)
@@ -0,0 +1,43 @@
+"""Local-mode Spark session shared by the smoke tests.
+
+Run from ``DataBricks/NoteBooks/dev/modules`` with ``python -m pytest tests``.
+Delta Lake is used when its jars are given in ``$ECOMM_SPARK_JARS`` (see
+``ecomm_insights.session``); tests that write Delta tables take the ``delta``
+fixture and are skipped without them.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ecomm_insights.session import SPARK_JARS_ENV, get_spark, ship_package  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def spark():
+    from pyspark.sql import SparkSession
+
+    if os.environ.get(SPARK_JARS_ENV):
+        session = get_spark("ecomm-insights-tests", "local[2]")
+    else:
+        session = (
+            SparkSession.builder.appName("ecomm-insights-tests")
+            .master("local[2]")
+            .config("spark.ui.showConsoleProgress", "false")
+            .config("spark.sql.shuffle.partitions", "4")
+            .getOrCreate()
+        )
+    # UDFs of the package run in the Python workers
+    ship_package(session)
+    yield session
+    session.stop()
+
+
+@pytest.fixture
+def delta(spark):
+    """The session, when it can read and write Delta tables."""
+    if "DeltaSparkSessionExtension" not in spark.conf.get("spark.sql.extensions", ""):
+        pytest.skip(f"Delta Lake jars are not available; set ${SPARK_JARS_ENV}")
+    return spark
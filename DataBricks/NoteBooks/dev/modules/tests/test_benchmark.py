@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from ecomm_insights import benchmark, session
+from ecomm_insights.benchmark import compare, run_report
+from ecomm_insights.report_catalog import Report
+
+
+def _result(name="Daily Sales Report", status="ok", wall_s=1.0, files_read=4, bytes_read=1000, shuffle_bytes=0):
+    return {
+        "name": name,
+        "status": status,
+        "wall_s": wall_s,
+        "files_read": files_read,
+        "bytes_read": bytes_read,
+        "shuffle_bytes": shuffle_bytes,
+        "error": None if status == "ok" else "boom",
+    }
+
+
+@pytest.fixture
+def sales(spark, tmp_path):
+    spark.sql("CREATE DATABASE IF NOT EXISTS benchmark_smoke")
+    spark.range(200).selectExpr("CAST(id % 5 AS INT) AS day", "id * 1.5 AS total").write.mode("overwrite").partitionBy(
+        "day"
+    ).parquet(str(tmp_path / "sales"))
+    spark.sql(f"CREATE TABLE benchmark_smoke.sales USING parquet LOCATION '{tmp_path / 'sales'}'")
+    spark.sql("MSCK REPAIR TABLE benchmark_smoke.sales")
+    yield Report("Sales by day", "SELECT day, SUM(total) AS total FROM sales GROUP BY day", "smoke", "benchmark_smoke")
+    spark.sql("DROP DATABASE benchmark_smoke CASCADE")
+    spark.catalog.setCurrentDatabase("default")
+
+
+def test_run_report_records_timings_and_scan_metrics(spark, sales):
+    result = run_report(spark, sales, repeat=2)
+
+    assert result["status"] == "ok", result
+    assert result["rows"] == 5
+    assert result["files_read"] >= 5
+    assert result["bytes_read"] > 0
+    assert result["shuffle_bytes"] > 0
+    assert result["median_s"] >= result["wall_s"] > 0
+
+
+def test_run_report_returns_errors_instead_of_raising(spark, sales):
+    broken = Report("Broken", "SELECT missing FROM sales", "smoke", "benchmark_smoke")
+
+    result = run_report(spark, broken, repeat=1)
+
+    assert result["status"] == "error"
+    assert "missing" in result["error"]
+
+
+def test_compare_flags_slower_and_larger_reports(spark, sales):
+    measured = run_report(spark, sales, repeat=1)
+    baseline = {"results": [{**measured, "bytes_read": measured["bytes_read"] // 2}]}
+
+    [regression] = compare([measured], baseline)
+
+    assert regression["name"] == "Sales by day"
+    assert regression["reason"].startswith("bytes_read")
+    assert compare([measured], {"results": [measured]}) == []
+
+
+def test_compare_ignores_timer_noise_and_new_reports():
+    baseline = {"results": [_result(wall_s=0.01), _result("Failing", status="error")]}
+
+    assert compare([_result(wall_s=0.05), _result("Failing"), _result("New report")], baseline) == []
+    reasons = [entry["reason"] for entry in compare([_result(wall_s=2.0, files_read=9)], baseline)]
+    assert reasons == ["wall time 0.010s -> 2.000s", "files_read 4 -> 9"]
+    assert compare([_result(status="error")], baseline)[0]["reason"] == "now failing: boom"
+
+
+def test_main_exit_codes_against_a_baseline(monkeypatch, tmp_path):
+    document = {"scale_factor": "SF0.01", "cache_dimensions": False, "results": [_result(bytes_read=5000)]}
+    monkeypatch.setattr(session, "get_spark", lambda app_name: None)
+    monkeypatch.setattr(benchmark, "run_benchmark", lambda *args, **kwargs: document)
+    baseline = tmp_path / "baseline.json"
+    arguments = ["--baseline", str(baseline)]
+
+    assert benchmark.main(arguments) == 0
+    assert json.loads(baseline.read_text())["results"][0]["bytes_read"] == 5000
+    assert benchmark.main(arguments) == 0
+
+    baseline.write_text(json.dumps({**document, "results": [_result(bytes_read=1000)]}))
+    assert benchmark.main(arguments) == 1
+
+    baseline.write_text(json.dumps({**document, "cache_dimensions": True}))
+    assert benchmark.main(arguments) == 2
+    baseline.write_text(json.dumps({**document, "scale_factor": "SF1"}))
+    assert benchmark.main(arguments) == 2
@@ -0,0 +1,51 @@
+import pytest
+
+from ecomm_insights.query_metrics import QueryMetrics, create_summary_view
+
+
+@pytest.fixture
+def query_metrics(spark, tmp_path):
+    recorder = QueryMetrics(spark, str(tmp_path / "_query_metrics")).enable()
+    recorder.collect()
+    yield recorder
+    recorder.disable()
+
+
+def test_records_tag_only_when_a_job_description_is_set(spark, query_metrics):
+    spark.range(100).selectExpr("id % 3 AS k").groupBy("k").count().collect()
+    with query_metrics.tag("smoke report"):
+        spark.range(10).collect()
+
+    rows = query_metrics.collect()
+
+    assert [row["tag"] for row in rows] == [None, "smoke report"]
+    assert all(row["function"] == "collectToPython" and row["status"] == "succeeded" for row in rows)
+    assert all(row["execution_id"] is not None for row in rows)
+    assert rows[0]["shuffle_bytes"] > 0
+
+
+def test_records_partition_pruning_of_scans(spark, query_metrics, tmp_path):
+    path = str(tmp_path / "events")
+    spark.range(40).selectExpr("id", "CAST(id % 4 AS INT) AS day").write.partitionBy("day").parquet(path)
+    query_metrics.collect()
+
+    spark.read.parquet(path).where("day = 1").collect()
+    spark.read.parquet(path).where("id = 1").collect()
+
+    pruned, full = query_metrics.collect()
+    assert (pruned["scans"], pruned["pruned_scans"], pruned["partitions_read"]) == (1, 1, 1)
+    assert (full["scans"], full["pruned_scans"], full["partitions_read"]) == (1, 0, 4)
+    assert pruned["bytes_read"] < full["bytes_read"]
+
+
+def test_flush_appends_records_and_summary_falls_back_to_function(delta, query_metrics):
+    delta.range(5).collect()
+    with query_metrics.tag("smoke report"):
+        delta.range(5).collect()
+
+    assert query_metrics.flush() == 2
+    # The append of the flush itself is not recorded
+    assert query_metrics.flush() == 0
+
+    summary = create_summary_view(delta, query_metrics.path, "query_metrics_smoke", temporary=True)
+    assert sorted(row["tag"] for row in summary.collect()) == ["collectToPython", "smoke report"]
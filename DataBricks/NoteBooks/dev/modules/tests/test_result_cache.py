@@ -0,0 +1,47 @@
+import pytest
+
+from ecomm_insights.report_catalog import table_references
+from ecomm_insights.result_cache import plan_tables
+
+SHADOWING_CTE = """
+WITH user_sessions AS (
+  SELECT DISTINCT user_id FROM user_sessions
+),
+users_with_orders AS (
+  SELECT DISTINCT user_id FROM orders
+)
+SELECT (SELECT COUNT(*) FROM users_with_orders) / (SELECT COUNT(*) FROM user_sessions) AS conversion_rate
+"""
+
+
+@pytest.fixture
+def tables(spark, tmp_path):
+    spark.sql("CREATE DATABASE IF NOT EXISTS result_cache_smoke")
+    spark.catalog.setCurrentDatabase("result_cache_smoke")
+    for name in ("user_sessions", "orders", "products"):
+        spark.range(5).selectExpr("id AS user_id", "id AS product_id").write.saveAsTable(name)
+    spark.range(3).write.parquet(str(tmp_path / "dimension"))
+    spark.read.parquet(str(tmp_path / "dimension")).createOrReplaceTempView("dimension")
+    yield
+    spark.catalog.dropTempView("dimension")
+    spark.sql("DROP DATABASE result_cache_smoke CASCADE")
+    spark.catalog.setCurrentDatabase("default")
+
+
+def test_plan_tables_resolves_shadowing_ctes_comma_joins_and_views(spark, tables, tmp_path):
+    def names(sql):
+        return [name.rsplit(".", 1)[-1].strip("`") for name in plan_tables(spark, sql)]
+
+    assert names(SHADOWING_CTE) == ["orders", "user_sessions"]
+    assert names("SELECT * FROM orders o, products p WHERE o.user_id = p.user_id") == ["orders", "products"]
+    assert plan_tables(spark, "SELECT * FROM dimension") == [f"delta.`file:{tmp_path / 'dimension'}`"]
+    assert plan_tables(spark, "SELECT 1") == []
+
+
+def test_table_references_keep_shadowed_tables_and_comma_joins():
+    assert table_references(SHADOWING_CTE) == [("user_sessions", None), ("orders", None)]
+    assert table_references("SELECT * FROM orders o, products AS p JOIN users u ON p.id = u.id") == [
+        ("orders", "o"),
+        ("products", "p"),
+        ("users", "u"),
+    ]